@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import time
+
+import pandas as pd
+
+from model_registry import DEFAULT_REGISTRY_DIR, load_current_models
+from sentiment import SentimentAnalyzer
+from ticket_data import iter_tickets
+
+# Bulk (headless) classification of historical tickets.
+# Reads CSV / JSONL / Parquet in fixed-size chunks, vectorizes each chunk once and runs
+# both classifiers on the shared sparse matrix, appending results as it goes. The models
+# are the model registry's current version (or model_artifacts/ / the pickles without one).
+#
+# Usage:
+#   python batch_classify.py tickets.csv classified.csv
+#   python batch_classify.py export.jsonl classified.jsonl --chunk-size 5000 --id-column ticket_id
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def _file_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    if ext == '.csv':
+        return 'csv'
+    if ext in ('.parquet', '.pq'):
+        return 'parquet'
+    raise ValueError(f"Unsupported file type '{ext}' (expected .csv, .jsonl or .parquet)")
+
+
+def iter_ticket_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield the input file as DataFrames of at most `chunk_size` rows"""
+    if _file_format(path) == 'parquet':
+        yield from iter_tickets(path, chunk_size=chunk_size)
+        return
+    if _file_format(path) == 'jsonl':
+        reader = pd.read_json(path, lines=True, chunksize=chunk_size, dtype=False)
+    else:
+        reader = pd.read_csv(path, chunksize=chunk_size)
+    with reader:
+        for chunk in reader:
+            yield chunk
+
+
+def classify_chunk(chunk, vectorizer, dept_model, urgency_model, text_column='ticket_text', id_column=None,
+                   sentiment_analyzer=None):
+    """Vectorize a chunk once and score it with both classifiers (and the sentiment lexicon, if given)"""
+    if text_column not in chunk.columns:
+        raise KeyError(f"Column '{text_column}' not found. Columns: {chunk.columns.tolist()}")
+
+    texts = chunk[text_column].fillna('').astype(str)
+    X = vectorizer.transform(texts)
+
+    out = pd.DataFrame(index=chunk.index)
+    if id_column:
+        out[id_column] = chunk[id_column]
+    out['department'] = dept_model.predict(X)
+    out['urgency'] = urgency_model.predict(X)
+    if sentiment_analyzer is not None:
+        scores, labels = sentiment_analyzer.score_batch(texts.tolist())
+        out['sentiment'] = labels
+        out['sentiment_score'] = scores.round(3)
+    return out
+
+
+class ResultWriter:
+    """Appends classified chunks to a CSV or JSONL file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.format = _file_format(path)
+        if self.format == 'parquet':
+            raise ValueError("Results are written as .csv or .jsonl")
+        self.rows_written = 0
+        self._fh = open(path, 'w', encoding='utf-8', newline='')
+
+    def write(self, df):
+        if self.format == 'csv':
+            df.to_csv(self._fh, header=self.rows_written == 0, index=False)
+        else:
+            for record in df.to_dict(orient='records'):
+                self._fh.write(json.dumps(record, default=str) + '\n')
+        self._fh.flush()
+        self.rows_written += len(df)
+
+    def close(self):
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run_batch(input_path, output_path, chunk_size=DEFAULT_CHUNK_SIZE, text_column='ticket_text',
+              id_column=None, models=None, sentiment_analyzer=None, verbose=True):
+    """
+    Streams `input_path` through the saved models and writes predictions to
+    `output_path`. Only one chunk is held in memory at a time.
+    Returns a dict with row count, elapsed seconds and tickets/second.
+    """
+    vectorizer, dept_model, urgency_model = models or load_current_models()[1]
+
+    start = time.perf_counter()
+    with ResultWriter(output_path) as writer:
+        for i, chunk in enumerate(iter_ticket_chunks(input_path, chunk_size)):
+            result = classify_chunk(chunk, vectorizer, dept_model, urgency_model,
+                                    text_column=text_column, id_column=id_column,
+                                    sentiment_analyzer=sentiment_analyzer)
+            writer.write(result)
+
+            if verbose:
+                elapsed = time.perf_counter() - start
+                rate = writer.rows_written / elapsed if elapsed > 0 else 0.0
+                print(f"   Chunk {i + 1}: {writer.rows_written} tickets ({rate:,.0f} tickets/s)")
+
+        total = writer.rows_written
+
+    elapsed = time.perf_counter() - start
+    return {
+        "tickets": total,
+        "seconds": round(elapsed, 3),
+        "tickets_per_second": round(total / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-classify tickets with the saved ML models.")
+    parser.add_argument('input', help="Input .csv or .jsonl file")
+    parser.add_argument('output', help="Output .csv or .jsonl file")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"Rows per chunk (default: {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument('--text-column', default='ticket_text', help="Column holding the ticket text")
+    parser.add_argument('--id-column', default=None, help="Optional column copied through to the output")
+    parser.add_argument('--sentiment', action='store_true', help="Also add sentiment / sentiment_score columns")
+    parser.add_argument('--registry', default=DEFAULT_REGISTRY_DIR,
+                        help="Model registry whose current version is used")
+    args = parser.parse_args()
+
+    if args.chunk_size <= 0:
+        parser.error("--chunk-size must be positive")
+
+    print("⏳ Loading models...")
+    version, models = load_current_models(args.registry)
+    print(f"   Model version: {version or 'unversioned (model_artifacts / pickles)'}")
+
+    print(f"⏳ Classifying '{args.input}' in chunks of {args.chunk_size}...")
+    stats = run_batch(args.input, args.output, chunk_size=args.chunk_size,
+                      text_column=args.text_column, id_column=args.id_column, models=models,
+                      sentiment_analyzer=SentimentAnalyzer() if args.sentiment else None)
+
+    print(f"\n✅ Classified {stats['tickets']} tickets in {stats['seconds']:.2f}s "
+          f"({stats['tickets_per_second']:,.0f} tickets/s)")
+    print(f"Results written to '{args.output}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import sklearn
+
+from fast_inference import FastTicketClassifier
+from llm_module import parse_llm_output
+from llm_stub_server import STUB_REPLY
+from model_artifacts import DEFAULT_ARTIFACTS_DIR, _sample_texts, read_manifest
+from model_registry import DEFAULT_REGISTRY_DIR, ModelRegistry, load_current_models
+from sentiment import SentimentAnalyzer
+from ticket_pipeline import STANDARD, classify_texts, export_to_json, load_pickled_models, process_ticket
+
+# Reproducible latency / throughput benchmarks for every stage of the hybrid pipeline.
+#
+# Each stage is timed over a fixed sample of tickets (tickets.parquet / tickets.csv, or
+# built-in examples) at several batch sizes, after a warm-up. Results report p50 / p95 /
+# p99 per call and tickets/s, tagged with the model version (the model registry's current
+# one, as served by the app and the service, else model_artifacts/), and can be written as JSON
+# and compared against an earlier run to catch regressions. --startup also times cold
+# imports of the modules app.py loads at start, each in a fresh interpreter.
+#
+# Usage:
+#   python benchmarks.py --json bench.json
+#   python benchmarks.py --startup               # + cold import times
+#   python benchmarks.py --compare bench.json --tolerance 0.2   # exit code 1 on a p50 regression
+
+DEFAULT_BATCH_SIZES = (1, 32, 256)
+# What app.py imports at start (plotly / the Gemini SDK are measured to show they stay lazy)
+STARTUP_MODULES = ("metrics", "llm_module", "ticket_pipeline", "fast_inference", "plotly.express",
+                   "google.generativeai")
+_IMPORT_TIMER = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+
+
+def stub_llm(ticket_text, template=None):
+    """Stands in for process_ticket_with_llm: a canned reply, no network"""
+    return STUB_REPLY
+
+
+def _percentiles(samples_ms):
+    p50, p95, p99 = np.percentile(samples_ms, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 4), "p95_ms": round(float(p95), 4), "p99_ms": round(float(p99), 4)}
+
+
+def time_stage(fn, batches, batch_size=1, warmup=3):
+    """Runs fn(batch) for each batch (after `warmup` calls) and summarizes the timings"""
+    for batch in batches[:warmup]:
+        fn(batch)
+    samples = []
+    start = time.perf_counter()
+    for batch in batches:
+        t0 = time.perf_counter()
+        fn(batch)
+        samples.append((time.perf_counter() - t0) * 1000)
+    seconds = time.perf_counter() - start
+    return dict(_percentiles(samples), calls=len(samples),
+                tickets_per_second=round(batch_size * len(batches) / seconds, 1) if seconds > 0 else None)
+
+
+def _batches(texts, batch_size, n_calls):
+    """`n_calls` batches of `batch_size` tickets, cycling through `texts`"""
+    return [[texts[(i * batch_size + j) % len(texts)] for j in range(batch_size)] for i in range(n_calls)]
+
+
+def run_benchmarks(texts, batch_sizes=DEFAULT_BATCH_SIZES, n_calls=200, load_repeats=5, verbose=True):
+    results = []
+
+    def record(stage, batch_size, stats):
+        results.append(dict(stage=stage, batch_size=batch_size, **stats))
+        if verbose:
+            print(f"   {stage:<20} batch {batch_size:>4}: p50 {stats['p50_ms']:9.3f} ms | "
+                  f"p95 {stats['p95_ms']:9.3f} ms | p99 {stats['p99_ms']:9.3f} ms | "
+                  f"{stats['tickets_per_second']:>12,.0f} tickets/s")
+
+    # Model loading (each call is one full load)
+    if verbose:
+        print("⏳ Model loading...")
+    loaders = [("load_models", lambda _: load_current_models())]
+    if os.path.exists('tfidf_vectorizer.pkl'):
+        loaders.append(("load_pickled_models", lambda _: load_pickled_models()))
+    for stage, loader in loaders:
+        record(stage, 1, time_stage(loader, [[None]] * load_repeats, warmup=1))
+
+    _, models = load_current_models()
+    vectorizer, dept_model, urgency_model = models
+    analyzer = SentimentAnalyzer()
+    try:
+        fast_classifier = FastTicketClassifier(*models)
+    except ValueError:
+        fast_classifier = None
+    sample_result = {"dept": "Technical issue", "urgency": "Urgent", "confidence": 87.5, "urgency_confidence": 91.2,
+                     "mode": STANDARD, "sentiment": "Negative", "sentiment_score": -0.61, "summary": "x" * 200,
+                     "response": "y" * 600, "original_text": texts[0], "ticket_id": "TKT-BENCH"}
+
+    for batch_size in batch_sizes:
+        if verbose:
+            print(f"⏳ Batch size {batch_size}...")
+        calls = max(20, n_calls // batch_size) if batch_size > 1 else n_calls
+        batches = _batches(texts, batch_size, calls)
+        X_batches = [vectorizer.transform(b) for b in batches[:8]]
+        X_cycle = (X_batches * (calls // len(X_batches) + 1))[:calls]
+
+        record("vectorize", batch_size, time_stage(vectorizer.transform, batches, batch_size))
+        record("predict_department", batch_size, time_stage(dept_model.predict, X_cycle, batch_size))
+        record("predict_urgency", batch_size, time_stage(urgency_model.predict, X_cycle, batch_size))
+        record("classify_texts", batch_size, time_stage(lambda b: classify_texts(b, models), batches, batch_size))
+        record("sentiment_batch", batch_size, time_stage(analyzer.score_batch, batches, batch_size))
+        if batch_size == 1:
+            # Stages that only exist per ticket
+            singles = [b[0] for b in batches]
+            record("sentiment", 1, time_stage(lambda b: analyzer.score(b), singles))
+            record("parse_llm_output", 1, time_stage(lambda _: parse_llm_output(STUB_REPLY), [[0]] * calls))
+            record("export_to_json", 1, time_stage(lambda _: export_to_json(sample_result), [[0]] * calls))
+            record("end_to_end", 1, time_stage(
+                lambda b: process_ticket(b[0], models, llm_fn=stub_llm), batches))
+            if fast_classifier is not None:
+                record("fast_classify", 1, time_stage(lambda b: fast_classifier.classify(b[0]), batches))
+    return results
+
+
+def time_imports(modules=STARTUP_MODULES, repeats=5):
+    """Cold import time of each module (fresh interpreter per run); modules not installed are skipped"""
+    results = []
+    for module in modules:
+        samples = []
+        for _ in range(repeats):
+            proc = subprocess.run([sys.executable, "-W", "ignore", "-c", _IMPORT_TIMER.format(module=module)],
+                                  capture_output=True, text=True)
+            if proc.returncode != 0:
+                break
+            samples.append(float(proc.stdout.strip().splitlines()[-1]) * 1000)
+        if samples:
+            results.append(dict(_percentiles(samples), stage=f"import {module}", batch_size=1, calls=len(samples),
+                                tickets_per_second=None))
+    return results
+
+
+def environment():
+    registry = ModelRegistry(DEFAULT_REGISTRY_DIR)
+    version = registry.current_version()
+    try:
+        manifest = read_manifest(registry.version_dir(version) if version else DEFAULT_ARTIFACTS_DIR)
+        model_version, featurizer = manifest.get('model_version'), manifest.get('featurizer')
+    except FileNotFoundError:
+        model_version, featurizer = version, None
+    return {
+        "timestamp": datetime.datetime.now().isoformat(),
+        "model_version": model_version,
+        "featurizer": featurizer,
+        "python": platform.python_version(),
+        "sklearn": sklearn.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(current, baseline, tolerance=0.2, min_delta_ms=0.05):
+    """
+    Stages whose p50 got slower than the baseline by more than `tolerance` (0.2 = 20%)
+    and by at least `min_delta_ms` (so timer noise on µs-scale stages is ignored).
+    Returns a list of (stage, batch_size, baseline_p50, current_p50).
+    """
+    previous = {(r['stage'], r['batch_size']): r for r in baseline['results']}
+    regressions = []
+    for r in current['results']:
+        old = previous.get((r['stage'], r['batch_size']))
+        if (old and r['p50_ms'] > old['p50_ms'] * (1 + tolerance)
+                and r['p50_ms'] - old['p50_ms'] >= min_delta_ms):
+            regressions.append((r['stage'], r['batch_size'], old['p50_ms'], r['p50_ms']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every stage of the hybrid ticket pipeline")
+    parser.add_argument('--batch-sizes', default=",".join(map(str, DEFAULT_BATCH_SIZES)),
+                        help="Comma-separated batch sizes")
+    parser.add_argument('--calls', type=int, default=200, help="Timed calls per stage (fewer for big batches)")
+    parser.add_argument('--samples', type=int, default=2000, help="Tickets to sample from the dataset")
+    parser.add_argument('--json', default=None, help="Write the results to this JSON file")
+    parser.add_argument('--compare', default=None, help="Baseline JSON from an earlier run")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed p50 slowdown vs. the baseline")
+    parser.add_argument('--startup', action='store_true', help="Also time cold imports of the app's modules")
+    args = parser.parse_args()
+
+    texts = [t for t in _sample_texts(args.samples) if t] or ["My internet is not working."]
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+
+    report = {"environment": environment(), "samples": len(texts), "results": []}
+    print(f"📏 Benchmarking model version {report['environment']['model_version']} on {len(texts)} tickets")
+    report["results"] = run_benchmarks(texts, batch_sizes=batch_sizes, n_calls=args.calls)
+    if args.startup:
+        print("⏳ Cold imports...")
+        for r in time_imports():
+            report["results"].append(r)
+            print(f"   {r['stage']:<32} p50 {r['p50_ms']:9.1f} ms | p95 {r['p95_ms']:9.1f} ms")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, indent=2)
+        print(f"\n✅ Results written to '{args.json}'")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as fh:
+            baseline = json.load(fh)
+        regressions = compare(report, baseline, args.tolerance)
+        print(f"\n🔍 Compared with model version {baseline['environment'].get('model_version')} "
+              f"({args.compare})")
+        for stage, batch_size, old, new in regressions:
+            print(f"❌ {stage} (batch {batch_size}): p50 {old:.3f} ms -> {new:.3f} ms")
+        if regressions:
+            raise SystemExit(1)
+        print(f"✅ No stage slower than {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,31 @@
+import argparse
+import os
+import resource
+import time
+
 import pandas as pd
 
-# 1. Load the raw Kaggle dataset
-file_path = 'customer_support_tickets.csv'
+from ticket_data import is_parquet
 
-try:
-    df = pd.read_csv(file_path)
-    print("✅ Raw data loaded successfully.")
-    print(f"Original shape: {df.shape}")
-except FileNotFoundError:
-    print(f"❌ Error: '{file_path}' not found. Please download it from Kaggle and rename it.")
-    exit()
+# ETL: raw Kaggle export -> clean ticket dataset.
+# The raw file is streamed in chunks, reading only the three columns we need (labels as
+# categoricals); every chunk is cleaned and appended to the output, so memory stays
+# bounded by --chunk-size whatever the input size. The default output is Parquet
+# (columnar + compressed, so later steps read only the columns they need); an output
+# name ending in .csv keeps the old CSV format.
+#
+# Usage:
+#   python clean_data.py                                   # customer_support_tickets.csv -> tickets.parquet
+#   python clean_data.py --output tickets.csv --chunk-size 200000
 
-# 2. Select and Rename Columns
-# We map the Kaggle column names to our project's standard names
+# Kaggle column names -> our project's standard names
 column_mapping = {
     'Ticket Description': 'ticket_text',
     'Ticket Type': 'department',
     'Ticket Priority': 'urgency'
 }
 
-# Verify columns exist before proceeding
-if not set(column_mapping.keys()).issubset(df.columns):
-    print(f"❌ Error: The file does not have the expected columns: {list(column_mapping.keys())}")
-    print(f"Columns found: {df.columns.tolist()}")
-    exit()
-
-# Keep only necessary columns and rename them
-df_clean = df[column_mapping.keys()].rename(columns=column_mapping)
-
-# 3. Clean the Data
-# Remove rows where the text is empty (if any)
-df_clean.dropna(subset=['ticket_text'], inplace=True)
-
-# Standardize Urgency levels
-# The dataset has 'Critical', 'High', 'Normal', 'Low'. 
+# The dataset has 'Critical', 'High', 'Normal', 'Low'.
 # Let's simplify this for our model: 'Critical'/'High' -> Urgent, others -> Normal
 urgency_mapping = {
     'Critical': 'Urgent',
@@ -41,19 +33,138 @@ urgency_mapping = {
     'Normal': 'Normal',
     'Low': 'Normal'
 }
-df_clean['urgency'] = df_clean['urgency'].map(urgency_mapping)
-
-# 4. Save the processed data
-# We save it as 'tickets.csv' which is the standard name our next steps will look for
-df_clean.to_csv('tickets.csv', index=False)
-
-print("\n✅ Data Cleaning Complete!")
-print(f"Final data saved to 'tickets.csv' with shape: {df_clean.shape}")
-print("\nSample Data (First 5 rows):")
-print(df_clean.head())
-
-# Optional: Print distribution to see how balanced the data is
-print("\nDepartment Distribution:")
-print(df_clean['department'].value_counts())
-print("\nUrgency Distribution:")
-print(df_clean['urgency'].value_counts())
+
+
+def clean_chunk(df):
+    """Renames the columns, drops rows without text and maps urgency to Urgent / Normal"""
+    df = df.rename(columns=column_mapping)[list(column_mapping.values())]
+    # Remove rows where the text is empty (if any)
+    df = df.dropna(subset=['ticket_text'])
+    df['urgency'] = df['urgency'].map(urgency_mapping).astype('category')
+    df['department'] = df['department'].astype('category')
+    return df
+
+
+class _ParquetSink:
+    """Appends chunks to one Parquet file (labels stored dictionary-encoded)"""
+
+    def __init__(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        self.schema = pa.schema([
+            ('ticket_text', pa.string()),
+            ('department', pa.dictionary(pa.int32(), pa.string())),
+            ('urgency', pa.dictionary(pa.int32(), pa.string())),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+
+    def write(self, df):
+        self.writer.write_table(self._pa.Table.from_pandas(df, schema=self.schema, preserve_index=False))
+
+    def close(self):
+        self.writer.close()
+
+
+class _CSVSink:
+    def __init__(self, path):
+        self.path = path
+        self.first = True
+
+    def write(self, df):
+        df.to_csv(self.path, mode='w' if self.first else 'a', header=self.first, index=False)
+        self.first = False
+
+    def close(self):
+        if self.first:  # no rows: still write the header
+            pd.DataFrame(columns=list(column_mapping.values())).to_csv(self.path, index=False)
+
+
+def run_etl(input_path, output_path, chunk_size=100_000):
+    """Streams `input_path` through clean_chunk into `output_path`. Returns a report dict."""
+    start = time.perf_counter()
+    reader = pd.read_csv(input_path, usecols=list(column_mapping),
+                         dtype={'Ticket Description': 'string', 'Ticket Type': 'category',
+                                'Ticket Priority': 'category'},
+                         chunksize=chunk_size)
+    sink = _ParquetSink(output_path) if is_parquet(output_path) else _CSVSink(output_path)
+    rows_in = rows_out = 0
+    departments, urgencies = pd.Series(dtype='int64'), pd.Series(dtype='int64')
+    sample = None
+    try:
+        for chunk in reader:
+            rows_in += len(chunk)
+            clean = clean_chunk(chunk)
+            rows_out += len(clean)
+            departments = departments.add(clean['department'].value_counts(), fill_value=0)
+            urgencies = urgencies.add(clean['urgency'].value_counts(), fill_value=0)
+            if sample is None:
+                sample = clean.head()
+            sink.write(clean)
+    finally:
+        sink.close()
+
+    seconds = time.perf_counter() - start
+    input_mb = os.path.getsize(input_path) / 1e6
+    return {
+        "rows_in": rows_in,
+        "rows_out": rows_out,
+        "seconds": round(seconds, 2),
+        "input_mb": round(input_mb, 1),
+        "output_mb": round(os.path.getsize(output_path) / 1e6, 1),
+        "mb_per_second": round(input_mb / seconds, 1) if seconds > 0 else None,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "departments": departments.astype(int).sort_values(ascending=False),
+        "urgencies": urgencies.astype(int).sort_values(ascending=False),
+        "sample": sample,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean the raw Kaggle export into the ticket dataset.")
+    parser.add_argument('--input', default='customer_support_tickets.csv', help="Raw Kaggle CSV")
+    parser.add_argument('--output', default='tickets.parquet', help="tickets.parquet (default) or tickets.csv")
+    parser.add_argument('--chunk-size', type=int, default=100_000, help="Rows per chunk")
+    args = parser.parse_args()
+
+    # 1. Check the raw Kaggle dataset
+    try:
+        columns = pd.read_csv(args.input, nrows=0).columns
+        print("✅ Raw data found.")
+    except FileNotFoundError:
+        print(f"❌ Error: '{args.input}' not found. Please download it from Kaggle and rename it.")
+        exit()
+
+    # 2. Verify columns exist before proceeding
+    if not set(column_mapping.keys()).issubset(columns):
+        print(f"❌ Error: The file does not have the expected columns: {list(column_mapping.keys())}")
+        print(f"Columns found: {columns.tolist()}")
+        exit()
+
+    # 3. Clean the data chunk by chunk and save it
+    if is_parquet(args.output):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print("❌ Error: Parquet output needs pyarrow (pip install pyarrow), or use --output tickets.csv")
+            exit()
+    print(f"⏳ Cleaning '{args.input}' in chunks of {args.chunk_size} rows...")
+    report = run_etl(args.input, args.output, chunk_size=args.chunk_size)
+
+    print("\n✅ Data Cleaning Complete!")
+    print(f"Final data saved to '{args.output}': {report['rows_out']} of {report['rows_in']} rows kept")
+    print(f"⏱️ {report['seconds']}s for {report['input_mb']} MB ({report['mb_per_second']} MB/s) | "
+          f"peak memory {report['peak_rss_mb']} MB | output {report['output_mb']} MB")
+    print("\nSample Data (First 5 rows):")
+    print(report['sample'])
+
+    # Optional: Print distribution to see how balanced the data is
+    print("\nDepartment Distribution:")
+    print(report['departments'])
+    print("\nUrgency Distribution:")
+    print(report['urgencies'])
+
+
+if __name__ == "__main__":
+    main()
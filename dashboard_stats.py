@@ -0,0 +1,190 @@
+import datetime
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+import pandas as pd
+
+from ticket_data import default_tickets_path, iter_tickets, read_columns
+
+# Materialized aggregates for the manager dashboard.
+# Counts per department, per urgency and per day are kept in a small SQLite file and
+# updated incrementally: +1 for every processed ticket, and a one-off (re)count when
+# the ticket dataset changes. Reading the dashboard is a handful of lookups on tables whose
+# size depends on the number of departments / days kept, not on the number of tickets.
+
+DEFAULT_DB_PATH = 'dashboard_stats.db'
+RETENTION_DAYS = 90
+PROCESSED = 'processed'  # source name for tickets handled by the app / service
+DATASET = 'dataset'      # source name for the ingested ticket dataset
+
+
+def _day(when=None):
+    if when is None:
+        return datetime.date.today().isoformat()
+    if isinstance(when, (int, float)):
+        when = datetime.datetime.fromtimestamp(when)
+    return when.strftime('%Y-%m-%d')
+
+
+class DashboardStats:
+    """Per-source counters by department, urgency and day. Safe to share between threads."""
+
+    def __init__(self, path=DEFAULT_DB_PATH, retention_days=RETENTION_DAYS):
+        self.path = path
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS counts (
+                source TEXT NOT NULL,
+                dimension TEXT NOT NULL,
+                key TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (source, dimension, key)
+            );
+            CREATE TABLE IF NOT EXISTS daily (
+                source TEXT NOT NULL,
+                day TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (source, day)
+            );
+            CREATE INDEX IF NOT EXISTS idx_daily_day ON daily (day);
+            CREATE TABLE IF NOT EXISTS sources (
+                source TEXT PRIMARY KEY,
+                signature TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    # --- Writes ---
+
+    def _add(self, source, total, departments, urgencies, days):
+        rows = [(source, 'total', 'all', total)]
+        rows += [(source, 'department', k, n) for k, n in departments.items()]
+        rows += [(source, 'urgency', k, n) for k, n in urgencies.items()]
+        self._conn.executemany("""
+            INSERT INTO counts (source, dimension, key, count) VALUES (?, ?, ?, ?)
+            ON CONFLICT (source, dimension, key) DO UPDATE SET count = count + excluded.count
+        """, rows)
+        self._conn.executemany("""
+            INSERT INTO daily (source, day, count) VALUES (?, ?, ?)
+            ON CONFLICT (source, day) DO UPDATE SET count = count + excluded.count
+        """, [(source, day, n) for day, n in days.items()])
+
+    def record(self, department, urgency, when=None, source=PROCESSED):
+        self.record_many([(department, urgency, when)], source=source)
+
+    def record_many(self, tickets, source=PROCESSED):
+        """Counts (department, urgency, when) tuples; `when` is a datetime, epoch seconds or None (now)"""
+        departments, urgencies, days = Counter(), Counter(), Counter()
+        total = 0
+        for department, urgency, when in tickets:
+            total += 1
+            departments[str(department)] += 1
+            urgencies[str(urgency)] += 1
+            days[_day(when)] += 1
+        with self._lock:
+            self._add(source, total, departments, urgencies, days)
+            cutoff = _day(datetime.date.today() - datetime.timedelta(days=self.retention_days))
+            self._conn.execute("DELETE FROM daily WHERE day < ?", (cutoff,))
+            self._conn.commit()
+
+    def ingest_file(self, path=None, source=DATASET, timestamp_column='created_at', chunk_size=100_000):
+        """
+        Replaces the counts of `source` with a fresh count of `path`, streamed in chunks.
+        Skipped (returns False) when the file hasn't changed since the last ingest.
+        Rows are bucketed by day only if the file has a `timestamp_column`.
+        """
+        path = path or default_tickets_path()
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        signature = f"{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}"
+        row = self._conn.execute("SELECT signature FROM sources WHERE source = ?", (source,)).fetchone()
+        if row is not None and row[0] == signature:
+            return False
+
+        columns = set(read_columns(path))
+        usecols = [c for c in ('department', 'urgency', timestamp_column) if c in columns]
+        departments, urgencies, days = Counter(), Counter(), Counter()
+        total = 0
+        for chunk in iter_tickets(path, columns=usecols, chunk_size=chunk_size):
+            total += len(chunk)
+            if 'department' in chunk:
+                departments.update(chunk['department'].dropna().astype(str).value_counts().to_dict())
+            if 'urgency' in chunk:
+                urgencies.update(chunk['urgency'].dropna().astype(str).value_counts().to_dict())
+            if timestamp_column in chunk:
+                stamps = pd.to_datetime(chunk[timestamp_column], errors='coerce').dropna()
+                days.update(stamps.dt.strftime('%Y-%m-%d').value_counts().to_dict())
+
+        with self._lock:
+            self._conn.execute("DELETE FROM counts WHERE source = ?", (source,))
+            self._conn.execute("DELETE FROM daily WHERE source = ?", (source,))
+            self._add(source, total, departments, urgencies, days)
+            self._conn.execute("INSERT OR REPLACE INTO sources (source, signature, updated_at) VALUES (?, ?, ?)",
+                               (source, signature, time.time()))
+            self._conn.commit()
+        return True
+
+    def clear(self, source=None):
+        with self._lock:
+            for table in ('counts', 'daily', 'sources'):
+                if source is None:
+                    self._conn.execute(f"DELETE FROM {table}")
+                else:
+                    self._conn.execute(f"DELETE FROM {table} WHERE source = ?", (source,))
+            self._conn.commit()
+
+    # --- Reads ---
+
+    def snapshot(self, trend_days=7, window=7):
+        """
+        Totals over all sources: {"total", "by_urgency", "by_department", "trend"}.
+        "trend" has one entry per day for the last `trend_days` days with the day's
+        count and its rolling `window`-day average; "last_week" / "previous_week" are
+        the sums of the last two `window`-day periods.
+        """
+        today = datetime.date.today()
+        span = max(trend_days + window - 1, 2 * window)
+        first = today - datetime.timedelta(days=span - 1)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT dimension, key, SUM(count) FROM counts GROUP BY dimension, key"
+            ).fetchall()
+            per_day = dict(self._conn.execute(
+                "SELECT day, SUM(count) FROM daily WHERE day >= ? GROUP BY day", (_day(first),)
+            ).fetchall())
+
+        by_dimension = {'total': {}, 'department': {}, 'urgency': {}}
+        for dimension, key, count in rows:
+            if count:
+                by_dimension.setdefault(dimension, {})[key] = count
+        by_urgency = dict(sorted(by_dimension['urgency'].items(), key=lambda kv: -kv[1]))
+        by_department = dict(sorted(by_dimension['department'].items(), key=lambda kv: -kv[1]))
+
+        counts = [per_day.get(_day(first + datetime.timedelta(days=i)), 0) for i in range(span)]
+        trend = []
+        for i in range(span - trend_days, span):
+            day = first + datetime.timedelta(days=i)
+            rolling = counts[i - window + 1:i + 1]
+            trend.append({"day": day.isoformat(), "label": day.strftime('%a'), "tickets": counts[i],
+                          "rolling_avg": round(sum(rolling) / window, 2)})
+
+        return {
+            "total": by_dimension['total'].get('all', 0),
+            "by_urgency": by_urgency,
+            "by_department": by_department,
+            "trend": trend,
+            "last_week": sum(counts[-window:]),
+            "previous_week": sum(counts[-2 * window:-window]),
+        }
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,217 @@
+import argparse
+import re
+import time
+from collections import Counter
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+from sklearn.utils import murmurhash3_32
+
+import metrics
+from featurizers import featurizer_mode
+
+# Single-ticket inference without sklearn's per-call overhead.
+# Tokenization, stop-word removal, TF-IDF weighting and L2 normalisation are done in
+# plain Python/NumPy, and both heads are scored with one product of the ticket's
+# (few) non-zero weights against the stacked [department | urgency] coefficients.
+#
+# Usage:
+#   python fast_inference.py --check        # parity + latency against the sklearn path
+#   python -m pytest tests/test_fast_inference.py   # parity on synthetic models (tfidf + hashing)
+
+DEFAULT_TOKEN_PATTERN = r"(?u)\b\w\w+\b"
+
+
+def _softmax(z):
+    z = z - z.max()
+    e = np.exp(z)
+    return e / e.sum()
+
+
+def _ovr_proba(z):
+    """Binary / one-vs-rest probabilities, as sklearn's _predict_proba_lr"""
+    p = 1.0 / (1.0 + np.exp(-z))
+    if len(p) == 1:
+        return np.array([1.0 - p[0], p[0]])
+    return p / p.sum()
+
+
+def _is_ovr(model):
+    if type(model).__name__ != 'LogisticRegression':
+        return True
+    params = model.get_params()
+    return (len(model.classes_) <= 2 or params.get('multi_class') == 'ovr'
+            or params.get('solver') == 'liblinear')
+
+
+class FastTicketClassifier:
+    """Fused featurizer + department/urgency scorer built from fitted models"""
+
+    def __init__(self, vectorizer, dept_model, urgency_model):
+        self.mode = featurizer_mode(vectorizer)
+        params = self._featurizer_params(vectorizer)
+        self.lowercase = params['lowercase']
+        self.norm = params['norm']
+        self.sublinear_tf = params['sublinear_tf']
+        self.token_re = re.compile(params['token_pattern'])
+        stop_words = params['stop_words']
+        if stop_words == 'english':
+            stop_words = ENGLISH_STOP_WORDS
+        self.stop_words = frozenset(stop_words or ())
+
+        if self.mode == 'tfidf':
+            self.vocabulary = dict(vectorizer.vocabulary_)
+            self.n_features = len(self.vocabulary)
+        else:
+            self.vocabulary = None
+            self.n_features = vectorizer.n_features
+        self.idf = np.asarray(vectorizer.idf_, dtype=np.float64) if params['use_idf'] else None
+
+        # Stacked coefficients: columns [0, n_dept) score departments, the rest urgency
+        self.dept_classes = np.asarray(dept_model.classes_)
+        self.urgency_classes = np.asarray(urgency_model.classes_)
+        self.dept_ovr = _is_ovr(dept_model)
+        self.urgency_ovr = _is_ovr(urgency_model)
+        self.n_dept_scores = dept_model.coef_.shape[0]
+        self.weights = np.ascontiguousarray(np.hstack([dept_model.coef_.T, urgency_model.coef_.T]))
+        self.bias = np.concatenate([dept_model.intercept_, urgency_model.intercept_])
+
+    @staticmethod
+    def _featurizer_params(vectorizer):
+        if featurizer_mode(vectorizer) == 'hashing':
+            params = vectorizer.get_config()
+            params.update(lowercase=True, token_pattern=DEFAULT_TOKEN_PATTERN)
+        else:
+            params = vectorizer.get_params()
+            if (params['analyzer'] != 'word' or params['tokenizer'] is not None
+                    or params['preprocessor'] is not None or params['strip_accents'] is not None
+                    or params['binary']):
+                raise ValueError("FastTicketClassifier only supports plain word analyzers")
+        if tuple(params['ngram_range']) != (1, 1):
+            raise ValueError("FastTicketClassifier only supports unigram features")
+        return params
+
+    @classmethod
+    def from_artifacts(cls, artifacts_dir=None):
+        from model_artifacts import DEFAULT_ARTIFACTS_DIR, load_artifacts
+        return cls(*load_artifacts(artifacts_dir or DEFAULT_ARTIFACTS_DIR))
+
+    def _feature_index(self, token):
+        if self.vocabulary is not None:
+            return self.vocabulary.get(token)
+        return abs(murmurhash3_32(token, seed=0)) % self.n_features
+
+    def vectorize(self, text):
+        """Returns (feature indices, TF-IDF weights), sorted by index, L2-normalised"""
+        if self.lowercase:
+            text = text.lower()
+        counts = Counter()
+        for token in self.token_re.findall(text):
+            if token in self.stop_words:
+                continue
+            index = self._feature_index(token)
+            if index is not None:
+                counts[index] += 1
+        if not counts:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        indices = np.fromiter(sorted(counts), dtype=np.int64, count=len(counts))
+        values = np.fromiter((counts[i] for i in indices), dtype=np.float64, count=len(counts))
+        if self.sublinear_tf:
+            values = np.log(values) + 1.0
+        if self.idf is not None:
+            values *= self.idf[indices]
+        if self.norm == 'l2':
+            values /= np.sqrt(np.dot(values, values))
+        elif self.norm == 'l1':
+            values /= np.abs(values).sum()
+        return indices, values
+
+    def to_sparse(self, indices, values):
+        """The vector as a 1 x n_features CSR matrix (same as vectorizer.transform([text]))"""
+        return sp.csr_matrix((values, indices, [0, len(indices)]), shape=(1, self.n_features))
+
+    def classify(self, text, return_vector=False):
+        """
+        Department + urgency labels, confidences and full probability vectors for one
+        ticket (same keys as ticket_pipeline.classify_texts plus "dept_proba"/"urgency_proba").
+        """
+        with metrics.span("vectorize"):
+            indices, values = self.vectorize(text)
+        with metrics.span("predict"):  # both heads in one product
+            scores = values @ self.weights[indices] + self.bias
+            dept_scores, urgency_scores = scores[:self.n_dept_scores], scores[self.n_dept_scores:]
+            dept_proba = _ovr_proba(dept_scores) if self.dept_ovr else _softmax(dept_scores)
+            urgency_proba = _ovr_proba(urgency_scores) if self.urgency_ovr else _softmax(urgency_scores)
+        d, u = int(dept_proba.argmax()), int(urgency_proba.argmax())
+
+        result = {
+            "department": str(self.dept_classes[d]),
+            "urgency": str(self.urgency_classes[u]),
+            "dept_confidence": round(float(dept_proba[d]), 4),
+            "urgency_confidence": round(float(urgency_proba[u]), 4),
+            "dept_proba": dept_proba,
+            "urgency_proba": urgency_proba,
+        }
+        if return_vector:
+            return result, self.to_sparse(indices, values)
+        return result
+
+
+def check_parity(models, texts, atol=1e-10):
+    """
+    Compares FastTicketClassifier with the sklearn path (transform + predict_proba)
+    on `texts`. Returns (mismatched labels, max probability difference).
+    """
+    engine = FastTicketClassifier(*models)
+    vectorizer, dept_model, urgency_model = models
+    X = vectorizer.transform(texts)
+    ref_dept, ref_urgency = dept_model.predict_proba(X), urgency_model.predict_proba(X)
+    ref_dept_labels, ref_urgency_labels = dept_model.predict(X), urgency_model.predict(X)
+
+    mismatches, max_diff = 0, 0.0
+    for i, text in enumerate(texts):
+        result = engine.classify(text)
+        if result['department'] != ref_dept_labels[i] or result['urgency'] != ref_urgency_labels[i]:
+            mismatches += 1
+        max_diff = max(max_diff,
+                       float(np.abs(result['dept_proba'] - ref_dept[i]).max()),
+                       float(np.abs(result['urgency_proba'] - ref_urgency[i]).max()))
+    return mismatches, max_diff
+
+
+def _time_per_ticket(fn, texts, repeats=3):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for text in texts:
+            fn(text)
+        best = min(best, (time.perf_counter() - start) / len(texts))
+    return best * 1e6
+
+
+if __name__ == "__main__":
+    from model_artifacts import _sample_texts
+    from model_registry import load_current_models
+    from ticket_pipeline import classify_texts
+
+    parser = argparse.ArgumentParser(description="Check the fast inference engine against sklearn")
+    parser.add_argument('--check', action='store_true', help="Run the parity check and latency comparison")
+    args = parser.parse_args()
+
+    _, models = load_current_models()
+    texts = _sample_texts()
+    engine = FastTicketClassifier(*models)
+
+    mismatches, max_diff = check_parity(models, texts)
+    status = "✅" if mismatches == 0 and max_diff < 1e-10 else "❌"
+    print(f"{status} Parity on {len(texts)} tickets: {mismatches} label mismatches, "
+          f"max probability difference {max_diff:.2e}")
+
+    fast_us = _time_per_ticket(engine.classify, texts)
+    sklearn_us = _time_per_ticket(lambda t: classify_texts([t], models), texts)
+    print(f"⏱️ Fast engine: {fast_us:.1f} µs/ticket | sklearn path: {sklearn_us:.1f} µs/ticket "
+          f"({sklearn_us / fast_us:.0f}x)")
+    if status == "❌":
+        raise SystemExit(1)
@@ -0,0 +1,118 @@
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+# Text featurization modes, selectable per model version (train_models.py --featurizer).
+#
+#   tfidf    TfidfVectorizer(max_features=5000, stop_words='english'): learns and keeps a vocabulary
+#   hashing  feature hashing (no vocabulary) with optional IDF reweighting; the only state is
+#            the IDF vector, which can be accumulated chunk by chunk with partial_fit
+#
+# The fitted featurizer is saved with the models (pickle and model_artifacts manifest),
+# so training and app.py always use the same configuration.
+
+FEATURIZERS = ('tfidf', 'hashing')
+
+DEFAULT_HASHING_CONFIG = {
+    "n_features": 2 ** 16,
+    "stop_words": "english",
+    "ngram_range": (1, 1),
+    "use_idf": True,
+    "smooth_idf": True,
+    "sublinear_tf": False,
+    "norm": "l2",
+}
+
+
+class HashingTfidfVectorizer:
+    """
+    Hashing-trick equivalent of TfidfVectorizer: tokens are hashed into `n_features`
+    columns instead of looked up in a vocabulary. IDF weights follow TfidfTransformer.
+    """
+
+    def __init__(self, n_features=2 ** 16, stop_words='english', ngram_range=(1, 1), use_idf=True,
+                 smooth_idf=True, sublinear_tf=False, norm='l2'):
+        self.n_features = n_features
+        self.stop_words = stop_words
+        self.ngram_range = tuple(ngram_range)
+        self.use_idf = use_idf
+        self.smooth_idf = smooth_idf
+        self.sublinear_tf = sublinear_tf
+        self.norm = norm
+        self.document_frequency_ = np.zeros(n_features, dtype=np.int64)
+        self.n_documents_ = 0
+        self.idf_ = None
+
+    @property
+    def hasher(self):
+        if getattr(self, '_hasher', None) is None:
+            self._hasher = HashingVectorizer(n_features=self.n_features, stop_words=self.stop_words,
+                                             ngram_range=self.ngram_range, alternate_sign=False, norm=None)
+        return self._hasher
+
+    def get_config(self):
+        return {
+            "n_features": self.n_features,
+            "stop_words": self.stop_words,
+            "ngram_range": list(self.ngram_range),
+            "use_idf": self.use_idf,
+            "smooth_idf": self.smooth_idf,
+            "sublinear_tf": self.sublinear_tf,
+            "norm": self.norm,
+        }
+
+    def partial_fit(self, texts):
+        """Adds the document frequencies of `texts`; call finalize() (or fit) to update idf_"""
+        if self.use_idf:
+            X = self.hasher.transform(texts)
+            X.sum_duplicates()
+            self.document_frequency_ += np.bincount(X.indices, minlength=self.n_features)
+            self.n_documents_ += X.shape[0]
+        return self
+
+    def finalize(self):
+        if self.use_idf:
+            n, df = self.n_documents_, self.document_frequency_
+            if self.smooth_idf:
+                n, df = n + 1, df + 1
+            self.idf_ = np.log(n / np.maximum(df, 1)) + 1.0
+        return self
+
+    def fit(self, texts, y=None):
+        self.document_frequency_ = np.zeros(self.n_features, dtype=np.int64)
+        self.n_documents_ = 0
+        return self.partial_fit(texts).finalize()
+
+    def transform(self, texts):
+        X = self.hasher.transform(texts)
+        X.sum_duplicates()
+        if self.sublinear_tf:
+            np.log(X.data, X.data)
+            X.data += 1
+        if self.use_idf:
+            if self.idf_ is None:
+                raise ValueError("HashingTfidfVectorizer is not fitted (no IDF weights yet)")
+            X.data *= self.idf_[X.indices]
+        if self.norm:
+            X = normalize(X, norm=self.norm, copy=False)
+        return X
+
+    def fit_transform(self, texts, y=None):
+        return self.fit(texts).transform(texts)
+
+
+def build_featurizer(mode='tfidf', **overrides):
+    """Unfitted featurizer for `mode` ('tfidf' or 'hashing')"""
+    if mode == 'tfidf':
+        params = dict(max_features=5000, stop_words='english')
+        params.update(overrides)
+        return TfidfVectorizer(**params)
+    if mode == 'hashing':
+        params = dict(DEFAULT_HASHING_CONFIG)
+        params.update(overrides)
+        return HashingTfidfVectorizer(**params)
+    raise ValueError(f"Unknown featurizer '{mode}' (expected one of {FEATURIZERS})")
+
+
+def featurizer_mode(featurizer):
+    return 'hashing' if isinstance(featurizer, HashingTfidfVectorizer) else 'tfidf'
@@ -0,0 +1,451 @@
+import argparse
+import copy
+import json
+import sqlite3
+import threading
+import time
+import warnings
+
+import numpy as np
+from sklearn.exceptions import ConvergenceWarning
+
+from model_registry import DEFAULT_REGISTRY_DIR, ModelRegistry
+from ticket_data import iter_tickets
+from ticket_store import text_hash
+
+# Agent corrections -> labelled examples -> incremental model updates with guardrails.
+#
+# app.py records a labelled example whenever an agent corrects the routing:
+#
+#   priority_override   "Force Urgent" / "Force Normal"   -> urgency label
+#   escalate            "Escalate"                         -> urgency = Urgent
+#   edit_response       department chosen in the editor   -> department label
+#
+# A ticket counts once per head: recording it again (same ticket id, or the same text
+# processed again) keeps one row, the newest label.
+#
+# OnlineUpdater.run() (scheduled with `update --every`) folds the examples recorded since
+# the last run into the registry's current models: SGD models continue with partial_fit,
+# LogisticRegression restarts from its current weights (warm_start) for a few iterations.
+# The vectorizer is kept, so no re-vectorizing of the corpus. Each update trains on the new
+# feedback (corrections weighted up) plus a replay sample REPLAY_RATIO times its size drawn
+# from a fixed pool of training rows, so the cost grows with the feedback, not the corpus,
+# and the models don't drift toward the few corrected tickets.
+#
+# Guardrails: the updated models are published to the registry, but only promoted if no
+# head loses more than `max_drop` accuracy on a fixed held-out pool; otherwise the update
+# is recorded as rolled back and the current version keeps serving. The rejected examples
+# are tried again together with new feedback, up to ROLLED_BACK_RETRIES more times;
+# after that they are dropped, so a burst of bad labels can't stall the updates for good.
+# Every 5th feedback example is held out too: once enough of them arrive after a
+# promotion, the next run rolls the registry back if the promoted version does worse on
+# them than its parent.
+#
+# Usage:
+#   python feedback_learning.py init --data tickets.parquet        # one pass: replay + held-out pools
+#   python feedback_learning.py update [--every 3600] [--min-feedback 20]
+#   python feedback_learning.py status
+
+DEFAULT_DB_PATH = 'feedback.db'
+HEADS = ('department', 'urgency')
+PRIORITY_OVERRIDE, ESCALATE, EDIT_RESPONSE = "priority_override", "escalate", "edit_response"
+URGENT, NORMAL = "Urgent", "Normal"
+
+REPLAY_POOL_SIZE = 20_000
+HOLDOUT_POOL_SIZE = 2_000
+REPLAY_RATIO = 10          # replayed training rows per feedback example in an update
+MIN_REPLAY = 200
+CORRECTION_WEIGHT = 3.0    # sample weight of a correction (label != prediction); confirmations get 1
+HOLDOUT_FEEDBACK_EVERY = 5
+MIN_FEEDBACK = 20
+MIN_FEEDBACK_CHECK = 20    # held-out feedback examples needed to judge a promoted update
+MAX_ACCURACY_DROP = 0.005
+ROLLED_BACK_RETRIES = 2    # times rejected feedback is retried (with newer feedback) before it's dropped
+WARM_START_MAX_ITER = 30
+SGD_EPOCHS = 5
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS feedback (
+        id INTEGER PRIMARY KEY,
+        created_at REAL NOT NULL,
+        ticket_id TEXT,
+        ticket_text TEXT NOT NULL,
+        head TEXT NOT NULL,
+        label TEXT NOT NULL,
+        predicted TEXT,
+        source TEXT NOT NULL,
+        model_version TEXT,
+        text_hash TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_feedback_ticket_id ON feedback (ticket_id, head);
+
+    -- Training rows for replay and the held-out pool (filled once by init)
+    CREATE TABLE IF NOT EXISTS examples (
+        id INTEGER PRIMARY KEY,
+        split TEXT NOT NULL,
+        ticket_text TEXT NOT NULL,
+        department TEXT NOT NULL,
+        urgency TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_examples_split ON examples (split);
+
+    CREATE TABLE IF NOT EXISTS updates (
+        id INTEGER PRIMARY KEY,
+        created_at REAL NOT NULL,
+        base_version TEXT,
+        new_version TEXT,
+        last_feedback_id INTEGER NOT NULL,
+        n_feedback INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        report TEXT
+    );
+"""
+PROMOTED, ROLLED_BACK, REVERTED, SKIPPED = "promoted", "rolled_back", "reverted", "skipped"
+
+
+class FeedbackStore:
+    """Labelled examples from agents, the replay / held-out pools and the update log (SQLite)"""
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        if "text_hash" not in {row[1] for row in self._conn.execute("PRAGMA table_info(feedback)")}:
+            self._conn.execute("ALTER TABLE feedback ADD COLUMN text_hash TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_feedback_text_hash ON feedback (text_hash, head)")
+
+    def record(self, ticket_text, head, label, predicted=None, source=EDIT_RESPONSE, ticket_id=None,
+               model_version=None):
+        """
+        Logs one labelled example (`head` is "department" or "urgency"); returns its id.
+        An earlier example of the same ticket (id or normalized text) and head is replaced,
+        or kept as is if it has the same label.
+        """
+        if head not in HEADS:
+            raise ValueError(f"'head' must be one of {HEADS}")
+        digest = text_hash(ticket_text)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                previous = self._conn.execute(
+                    "SELECT id, label FROM feedback WHERE head = ? AND (text_hash = ? OR ticket_id = ?) "
+                    "ORDER BY id DESC", (head, digest, ticket_id)
+                ).fetchall()
+                if previous and previous[0][1] == label:
+                    feedback_id = previous[0][0]
+                else:
+                    if previous:
+                        self._conn.execute(f"DELETE FROM feedback WHERE id IN ({', '.join('?' * len(previous))})",
+                                           [row[0] for row in previous])
+                    feedback_id = self._conn.execute(
+                        "INSERT INTO feedback (created_at, ticket_id, ticket_text, head, label, predicted, source, "
+                        "model_version, text_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (time.time(), ticket_id, ticket_text, head, label, predicted, source, model_version, digest),
+                    ).lastrowid
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return feedback_id
+
+    def feedback(self, after_id=0, holdout=None):
+        """Feedback rows with id > after_id; holdout=True / False: only the held-out / training ones"""
+        sql = "SELECT id, ticket_text, head, label, predicted, source FROM feedback WHERE id > ?"
+        if holdout is not None:
+            sql += f" AND id % {HOLDOUT_FEEDBACK_EVERY} {'=' if holdout else '!='} 0"
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY id", (after_id,)).fetchall()
+        return [dict(zip(("id", "ticket_text", "head", "label", "predicted", "source"), row)) for row in rows]
+
+    def last_feedback_id(self):
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM feedback").fetchone()[0]
+
+    def add_examples(self, rows, split):
+        """rows: (ticket_text, department, urgency) tuples"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT INTO examples (split, ticket_text, department, urgency) VALUES (?, ?, ?, ?)",
+                                   [(split, *row) for row in rows])
+            self._conn.execute("COMMIT")
+
+    def examples(self, split, limit=None):
+        """{"ticket_text", "department", "urgency"} columns (lists) of a pool ('replay' / 'holdout')"""
+        sql = "SELECT ticket_text, department, urgency FROM examples WHERE split = ?"
+        params = (split,)
+        if limit is not None:
+            sql += " ORDER BY RANDOM() LIMIT ?"
+            params += (limit,)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return dict(zip(("ticket_text", "department", "urgency"), map(list, zip(*rows)))) if rows else None
+
+    def count_examples(self, split):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM examples WHERE split = ?", (split,)).fetchone()[0]
+
+    def log_update(self, base_version, new_version, last_feedback_id, n_feedback, status, report):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO updates (created_at, base_version, new_version, last_feedback_id, n_feedback, status, "
+                "report) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), base_version, new_version, last_feedback_id, n_feedback, status, json.dumps(report)),
+            )
+
+    def updates(self, limit=20):
+        """Newest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, created_at, base_version, new_version, last_feedback_id, n_feedback, status, report "
+                "FROM updates ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        columns = ("id", "created_at", "base_version", "new_version", "last_feedback_id", "n_feedback", "status",
+                   "report")
+        return [dict(zip(columns, row[:-1] + (json.loads(row[-1]) if row[-1] else None,))) for row in rows]
+
+    def counts(self):
+        """Feedback examples per (head, source), plus how many were corrections"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT head, source, COUNT(*), SUM(predicted IS NOT NULL AND label != predicted) "
+                "FROM feedback GROUP BY head, source"
+            ).fetchall()
+        return [{"head": h, "source": s, "examples": n, "corrections": c or 0} for h, s, n, c in rows]
+
+    def close(self):
+        self._conn.close()
+
+
+def build_example_pools(store, path=None, replay_size=REPLAY_POOL_SIZE, holdout_size=HOLDOUT_POOL_SIZE, seed=42,
+                        chunk_size=100_000):
+    """
+    Fills the replay and held-out pools with reservoir samples of the clean dataset, in one
+    chunked pass (rows go to one pool or the other, never both). Returns the pool sizes.
+    """
+    rng = np.random.default_rng(seed)
+    size = replay_size + holdout_size
+    reservoir, seen = [], 0
+    for chunk in iter_tickets(path, columns=['ticket_text', *HEADS], chunk_size=chunk_size):
+        chunk = chunk.dropna()
+        for row in zip(chunk['ticket_text'].astype(str), chunk['department'], chunk['urgency']):
+            seen += 1
+            if len(reservoir) < size:
+                reservoir.append(row)
+            else:
+                j = rng.integers(seen)
+                if j < size:
+                    reservoir[j] = row
+    order = rng.permutation(len(reservoir))
+    holdout = [reservoir[i] for i in order[:min(holdout_size, len(reservoir) // 5)]]
+    replay = [reservoir[i] for i in order[len(holdout):]]
+    store.add_examples(replay, 'replay')
+    store.add_examples(holdout, 'holdout')
+    return len(replay), len(holdout)
+
+
+def _accuracy(model, X, y):
+    return float(np.mean(model.predict(X) == np.asarray(y, dtype=object))) if len(y) else None
+
+
+def incremental_fit(model, X, y, sample_weight):
+    """
+    Copy of `model` updated with (X, y): partial_fit for SGD models, a warm start from the
+    current weights for LogisticRegression. Labels outside model.classes_ must be removed first.
+    """
+    model = copy.deepcopy(model)
+    model.coef_, model.intercept_ = np.array(model.coef_), np.array(model.intercept_)  # writable (not mmapped)
+    if hasattr(model, 'partial_fit'):
+        for _ in range(SGD_EPOCHS):
+            model.partial_fit(X, y, classes=model.classes_, sample_weight=sample_weight)
+    else:
+        if set(np.unique(np.asarray(y, dtype=object))) != set(model.classes_):
+            raise ValueError("The update sample must contain every class of the model")
+        model.set_params(warm_start=True, max_iter=WARM_START_MAX_ITER)
+        with warnings.catch_warnings():  # stopping early is the point: stay close to the current weights
+            warnings.simplefilter('ignore', ConvergenceWarning)
+            model.fit(X, y, sample_weight=sample_weight)
+    return model
+
+
+class OnlineUpdater:
+    """Applies the feedback collected since the last run to the registry's current version"""
+
+    def __init__(self, registry=None, store=None, max_drop=MAX_ACCURACY_DROP, min_feedback=MIN_FEEDBACK, seed=None):
+        self.registry = registry or ModelRegistry()
+        self.store = store or FeedbackStore()
+        self.max_drop = max_drop
+        self.min_feedback = min_feedback
+        self.rng = np.random.default_rng(seed)
+
+    def _update_sample(self, head, model, feedback):
+        """(texts, labels, weights): the head's feedback plus a replay sample covering every class"""
+        feedback = [f for f in feedback if f['head'] == head and f['label'] in set(model.classes_)]
+        if not feedback:
+            return None
+        replay = self.store.examples('replay', limit=max(MIN_REPLAY, REPLAY_RATIO * len(feedback))) or \
+            {"ticket_text": [], head: []}
+        texts = [f['ticket_text'] for f in feedback] + replay['ticket_text']
+        labels = [f['label'] for f in feedback] + replay[head]
+        weights = [CORRECTION_WEIGHT if f['predicted'] is not None and f['label'] != f['predicted'] else 1.0
+                   for f in feedback] + [1.0] * len(replay['ticket_text'])
+        missing = set(model.classes_) - set(labels)
+        if missing:  # classes absent from the sample: one pool row each (a warm start would drop them)
+            pool = self.store.examples('replay')
+            for cls in missing:
+                if pool is not None and cls in pool[head]:
+                    i = pool[head].index(cls)
+                    texts.append(pool['ticket_text'][i])
+                    labels.append(cls)
+                    weights.append(1.0)
+        return texts, labels, np.array(weights)
+
+    def _feedback_accuracy(self, models, feedback):
+        vectorizer = models[0]
+        result = {}
+        for head, model in zip(HEADS, models[1:]):
+            rows = [f for f in feedback if f['head'] == head]
+            if rows:
+                X = vectorizer.transform([f['ticket_text'] for f in rows])
+                result[head] = (_accuracy(model, X, [f['label'] for f in rows]), len(rows))
+        return result
+
+    def check_last_update(self):
+        """
+        Rolls the registry back if the version promoted by the last update does worse than
+        its parent on the feedback held out since then. Returns the reverted version or None.
+        """
+        last = next((u for u in self.store.updates(limit=5) if u['status'] in (PROMOTED, REVERTED)), None)
+        if last is None or last['status'] != PROMOTED or self.registry.current_version() != last['new_version']:
+            return None
+        holdout = self.store.feedback(after_id=last['last_feedback_id'], holdout=True)
+        new = self._feedback_accuracy(self.registry.load(last['new_version']), holdout)
+        old = self._feedback_accuracy(self.registry.load(last['base_version']), holdout)
+        for head, (accuracy, n) in new.items():
+            if n >= MIN_FEEDBACK_CHECK and accuracy < old[head][0] - self.max_drop:
+                self.registry.promote(last['base_version'])
+                report = {"head": head, "held_out_feedback": n, "accuracy": accuracy, "parent_accuracy": old[head][0]}
+                self.store.log_update(last['new_version'], last['base_version'], last['last_feedback_id'], 0,
+                                      REVERTED, report)
+                return last['new_version']
+        return None
+
+    def _feedback_start(self):
+        """
+        (after_id, retry): feedback with a larger id goes into the next update. After a
+        rolled-back run, its start is kept (retry + 1) until ROLLED_BACK_RETRIES is reached.
+        """
+        updates = self.store.updates(limit=1)
+        if not updates:
+            return 0, 0
+        last = updates[0]
+        report = last['report'] or {}
+        if last['status'] == ROLLED_BACK and report.get('retry', 0) < ROLLED_BACK_RETRIES and 'after_id' in report:
+            return report['after_id'], report.get('retry', 0) + 1
+        return last['last_feedback_id'], 0
+
+    def run(self):
+        """One scheduled update; returns {"status", "base_version", "new_version", "n_feedback", ...}"""
+        start = time.perf_counter()
+        reverted = self.check_last_update()
+        base_version = self.registry.current_version()
+        if base_version is None:
+            raise ValueError("No current model version in the registry (train_models.py --registry --promote)")
+        if self.store.count_examples('holdout') == 0:
+            raise ValueError("No held-out pool yet (python feedback_learning.py init)")
+
+        after_id, retry = self._feedback_start()
+        last_id = self.store.last_feedback_id()
+        feedback = self.store.feedback(after_id=after_id, holdout=False)
+        report = {"status": SKIPPED, "base_version": base_version, "new_version": None, "n_feedback": len(feedback),
+                  "reverted": reverted, "after_id": after_id, "retry": retry}
+        if len(feedback) < self.min_feedback:
+            report["reason"] = f"{len(feedback)} new examples (< {self.min_feedback})"
+            return report  # not logged: the examples wait for the next run
+        if retry and last_id <= self.store.updates(limit=1)[0]['last_feedback_id']:
+            report["reason"] = "no new feedback since the rolled-back update"
+            return report
+
+        vectorizer, *models = self.registry.load(base_version)
+        holdout = self.store.examples('holdout')
+        X_holdout = vectorizer.transform(holdout['ticket_text'])
+        updated, report["heads"] = list(models), {}
+        for i, (head, model) in enumerate(zip(HEADS, models)):
+            sample = self._update_sample(head, model, feedback)
+            if sample is None:
+                continue
+            texts, labels, weights = sample
+            updated[i] = incremental_fit(model, vectorizer.transform(texts), labels, weights)
+            before, after = _accuracy(model, X_holdout, holdout[head]), _accuracy(updated[i], X_holdout, holdout[head])
+            report["heads"][head] = {"examples": len(texts), "holdout_before": before, "holdout_after": after}
+
+        regressed = [h for h, r in report["heads"].items() if r["holdout_after"] < r["holdout_before"] - self.max_drop]
+        if not report["heads"]:
+            report["reason"] = "no usable examples (unknown labels)"
+        elif regressed:
+            report.update(status=ROLLED_BACK, reason=f"held-out accuracy dropped: {', '.join(regressed)}")
+        else:
+            new_version = f"{base_version.split('+')[0]}+fb{last_id}"
+            self.registry.publish(vectorizer, *updated, version=new_version, promote=True, metrics={
+                f"{head}_accuracy": r["holdout_after"] for head, r in report["heads"].items()
+            })
+            report.update(status=PROMOTED, new_version=new_version)
+        report["seconds"] = round(time.perf_counter() - start, 3)
+        self.store.log_update(base_version, report["new_version"], last_id, len(feedback), report["status"], report)
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental model updates from agent feedback")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH)
+    parser.add_argument('--registry', default=DEFAULT_REGISTRY_DIR)
+    sub = parser.add_subparsers(dest='command', required=True)
+    init = sub.add_parser('init', help="Sample the replay and held-out pools from the clean dataset")
+    init.add_argument('--data', default=None, help="tickets.parquet / tickets.csv (default: whichever exists)")
+    init.add_argument('--replay', type=int, default=REPLAY_POOL_SIZE)
+    init.add_argument('--holdout', type=int, default=HOLDOUT_POOL_SIZE)
+    update = sub.add_parser('update', help="Fold new feedback into the current models")
+    update.add_argument('--every', type=float, default=None, help="Keep running, one update every N seconds")
+    update.add_argument('--min-feedback', type=int, default=MIN_FEEDBACK)
+    update.add_argument('--max-drop', type=float, default=MAX_ACCURACY_DROP,
+                        help="Largest held-out accuracy loss (per head) an update may cause")
+    sub.add_parser('status', help="Feedback counts and recent updates")
+    args = parser.parse_args()
+
+    store = FeedbackStore(args.db)
+    if args.command == 'init':
+        if store.count_examples('replay') or store.count_examples('holdout'):
+            print("❌ Error: the pools already exist (delete the examples table to rebuild them).")
+            exit()
+        replay, holdout = build_example_pools(store, args.data, args.replay, args.holdout)
+        print(f"✅ Replay pool: {replay} rows | held-out pool: {holdout} rows")
+    elif args.command == 'update':
+        updater = OnlineUpdater(ModelRegistry(args.registry), store, max_drop=args.max_drop,
+                                min_feedback=args.min_feedback)
+        while True:
+            report = updater.run()
+            if report["reverted"]:
+                print(f"↩️ Reverted {report['reverted']}: worse than its parent on held-out feedback")
+            icon = {PROMOTED: "✅", ROLLED_BACK: "↩️", SKIPPED: "⏭️"}[report["status"]]
+            print(f"{icon} {report['status']}: {report['n_feedback']} examples on {report['base_version']}"
+                  + (f" -> {report['new_version']}" if report['new_version'] else "")
+                  + (f" ({report['reason']})" if report.get('reason') else ""))
+            for head, r in report.get("heads", {}).items():
+                print(f"   {head:<10} held-out accuracy {r['holdout_before']:.4f} -> {r['holdout_after']:.4f} "
+                      f"({r['examples']} training rows)")
+            if args.every is None:
+                break
+            time.sleep(args.every)
+    else:
+        for c in store.counts():
+            print(f"📝 {c['head']:<10} {c['source']:<18} {c['examples']:>6} examples, {c['corrections']} corrections")
+        for u in store.updates():
+            when = time.strftime('%Y-%m-%d %H:%M', time.localtime(u['created_at']))
+            print(f"   {when}  {u['status']:<11} {u['base_version']} -> {u['new_version']}  "
+                  f"({u['n_feedback']} examples)")
+
+
+if __name__ == "__main__":
+    main()
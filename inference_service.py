@@ -0,0 +1,199 @@
+import argparse
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+
+import metrics
+from dashboard_stats import DashboardStats
+from llm_cache import LLMCache
+from llm_module import AsyncLLMClient, HTTPBackend
+from llm_scheduler import LLMScheduler
+from model_registry import DEFAULT_REGISTRY_DIR, ModelRegistry, ModelServer
+from sentiment import SentimentAnalyzer
+from ticket_compression import DEFAULT_TOKEN_BUDGET, TicketCompressor
+from ticket_pipeline import STANDARD, PROCESSING_MODES, classify_texts, process_tickets_async
+from ticket_store import TicketStore, new_ticket_id
+
+# HTTP inference service (ASGI / FastAPI), independent of the Streamlit UI.
+#
+#   POST /classify          {"ticket_text": "..."}     -> ML routing only
+#   POST /classify/batch    {"tickets": ["...", ...]}
+#   POST /process           {"ticket_text": "...", "mode": "Standard"}  -> ML routing + LLM summary/response
+#   POST /process/batch     {"tickets": ["...", ...], "packed": true}  -> packed: many tickets per LLM request
+#   GET  /health
+#   GET  /metrics           Prometheus text format (per-stage latency histograms, error counters)
+#   GET  /metrics/summary   live p50 / p95 per stage + LLM error rate (JSON), LLM queue per priority
+#   GET  /models            served model version, registry versions / pointers, shadow-scoring report
+#
+# Models are loaded once per worker process at startup, from the model registry's current
+# version (model_registry.py) or, while it is empty, from model_artifacts/ or the pickles.
+# Each worker picks up a newly promoted version within MODEL_POLL_INTERVAL seconds without
+# dropping requests. Run with several workers to use more cores:
+#   python inference_service.py --workers 4 --port 8000
+
+MAX_BATCH_SIZE = 1000
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", "8"))
+# Point at a stub server (see llm_stub_server.py) instead of Gemini, e.g. http://127.0.0.1:8765/
+LLM_BACKEND_URL = os.environ.get("LLM_BACKEND_URL")
+# Default for /process/batch: pack the tickets into multi-ticket JSON requests
+LLM_PACKED = os.environ.get("LLM_PACKED", "0") == "1"
+# Provider quota per worker process (requests / tokens per minute). When set, LLM calls wait
+# for quota in llm_scheduler.LLMScheduler, Urgent and Negative tickets first.
+LLM_RPM = int(os.environ.get("LLM_RPM", "0"))
+LLM_TPM = int(os.environ.get("LLM_TPM", "1000000"))
+# Ticket text sent to the LLM is compressed to at most this many tokens (ticket_compression.py; 0: off)
+LLM_TOKEN_BUDGET = int(os.environ.get("LLM_TOKEN_BUDGET", str(DEFAULT_TOKEN_BUDGET)))
+MODEL_REGISTRY_DIR = os.environ.get("MODEL_REGISTRY_DIR", DEFAULT_REGISTRY_DIR)
+MODEL_POLL_INTERVAL = float(os.environ.get("MODEL_POLL_INTERVAL", "5"))
+
+state = {}
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Model swaps / load failures (model_registry) and index saves (similar_tickets) are logged;
+    # runs in every worker process, and does nothing if logging is already configured
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s")
+    state["model_server"] = ModelServer(ModelRegistry(MODEL_REGISTRY_DIR), poll_interval=MODEL_POLL_INTERVAL).start()
+    backend = HTTPBackend(LLM_BACKEND_URL) if LLM_BACKEND_URL else None
+    state["llm_scheduler"] = LLMScheduler(rpm=LLM_RPM, tpm=LLM_TPM) if LLM_RPM else None
+    state["llm_client"] = AsyncLLMClient(backend=backend, concurrency=LLM_CONCURRENCY,
+                                         scheduler=state["llm_scheduler"])
+    state["sentiment"] = SentimentAnalyzer()
+    state["cache"] = LLMCache()
+    state["dashboard_stats"] = DashboardStats()
+    state["ticket_store"] = TicketStore()
+    yield
+    state["model_server"].stop()
+    state["cache"].close()
+    state["dashboard_stats"].close()
+    state["ticket_store"].close()
+    state.clear()
+
+
+app = FastAPI(title="Hybrid Ticket AI", version="2.0.0", lifespan=lifespan)
+
+
+class TicketRequest(BaseModel):
+    ticket_text: str
+    mode: str = STANDARD
+
+
+class TicketBatchRequest(BaseModel):
+    tickets: list[str]
+    mode: str = STANDARD
+    packed: bool = LLM_PACKED
+
+
+def _check_mode(mode):
+    if mode not in PROCESSING_MODES:
+        raise HTTPException(status_code=422, detail=f"'mode' must be one of {list(PROCESSING_MODES)}")
+
+
+def _check_batch(tickets):
+    if not tickets:
+        raise HTTPException(status_code=422, detail="'tickets' must not be empty")
+    if len(tickets) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_SIZE} tickets per batch")
+
+
+@app.get("/health")
+def health():
+    server = state.get("model_server")
+    return {"status": "ok", "models_loaded": server is not None, "pid": os.getpid(),
+            "model_version": server.get().version if server is not None else None}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Stage latency histograms and error counters of this worker (Prometheus text format)"""
+    return PlainTextResponse(metrics.REGISTRY.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/metrics/summary")
+def metrics_summary():
+    """Live p50 / p95 per stage and the LLM error rate of this worker"""
+    scheduler = state.get("llm_scheduler")
+    return dict(metrics.REGISTRY.snapshot(), pid=os.getpid(),
+                llm_scheduler=scheduler.stats() if scheduler is not None else None)
+
+
+@app.get("/models")
+def models_info():
+    """Model version served by this worker, the registry's versions and pointers, shadow scoring"""
+    server = state["model_server"]
+    return {"serving": server.get().version, "pid": os.getpid(), "pointers": server.registry.pointers(),
+            "versions": server.registry.versions(), "shadow": server.shadow_report()}
+
+
+@app.post("/classify")
+def classify(request: TicketRequest):
+    served = state["model_server"].get()
+    start = time.perf_counter()
+    result, _ = served.classify(request.ticket_text)
+    state["model_server"].shadow(request.ticket_text, served, result, time.perf_counter() - start)
+    return result
+
+
+@app.post("/classify/batch")
+def classify_batch(request: TicketBatchRequest):
+    _check_batch(request.tickets)
+    served = state["model_server"].get()
+    _, results = classify_texts(request.tickets, served.models)
+    for text, result in zip(request.tickets, results):  # batched latency isn't comparable: not recorded
+        state["model_server"].shadow(text, served, result)
+    return {"results": results}
+
+
+def _record(tickets, results):
+    state["ticket_store"].add_many([dict(r, ticket_text=text) for r, text in zip(results, tickets)])
+    state["dashboard_stats"].record_many([(r["department"], r["urgency"], None) for r in results])
+
+
+async def _process(tickets, mode, packed=False):
+    # Everything blocking (models, SQLite, the similar-ticket index) runs in worker threads;
+    # the event loop only waits on them and on the LLM
+    _check_mode(mode)
+    served = state["model_server"].get()  # one version for the whole request, even if a swap happens meanwhile
+    compressor = TicketCompressor(served.models[0], LLM_TOKEN_BUDGET) if LLM_TOKEN_BUDGET else None
+    similar_index = await asyncio.to_thread(served.similar_index)  # loaded from disk on first use
+    results = await process_tickets_async(tickets, served.models, state["llm_client"], mode=mode,
+                                          cache=state["cache"], similar_index=similar_index,
+                                          packed=packed, sentiment_analyzer=state["sentiment"],
+                                          compressor=compressor)
+    for result in results:
+        result.pop("similar_match", None)
+        result["ticket_id"] = new_ticket_id()
+    await asyncio.to_thread(_record, tickets, results)
+    return results
+
+
+@app.post("/process")
+async def process(request: TicketRequest):
+    (result,) = await _process([request.ticket_text], request.mode)
+    return result
+
+
+@app.post("/process/batch")
+async def process_batch(request: TicketBatchRequest):
+    _check_batch(request.tickets)
+    return {"results": await _process(request.tickets, request.mode, request.packed)}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Hybrid Ticket AI inference service")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (each loads its own copy of the models)")
+    args = parser.parse_args()
+
+    uvicorn.run("inference_service:app", host=args.host, port=args.port, workers=args.workers)
@@ -0,0 +1,289 @@
+import json
+import sqlite3
+import threading
+import time
+import traceback
+
+import metrics
+
+# Persistent job queue + background worker pool for slow work (LLM drafting) so the UI
+# never waits on it.
+#
+# Jobs live in a SQLite table (WAL mode), so they survive a restart of the app.
+# Workers claim the most urgent job (lowest priority value, e.g. llm_scheduler.priority_for),
+# oldest first, in one IMMEDIATE transaction (safe with several worker processes on the
+# same file), run the handler and store its JSON result, retrying failed jobs up to
+# `max_attempts` times. A claim is a lease of `lease_seconds` that the worker pool renews
+# while the handler runs; a job whose lease ran out (its process died) goes back to the
+# queue, while jobs other live processes are running are left alone.
+# Every claim gets a lease token (the job's attempt count after the claim); heartbeats,
+# results and failures only count while the job is still running under that token, so a
+# worker whose lease ran out can't overwrite or requeue the run of the worker that took over.
+#
+#   status: queued -> running -> done | failed   (failed attempts below max_attempts go back to queued)
+
+DEFAULT_DB_PATH = 'jobs.db'
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY,
+        kind TEXT NOT NULL,
+        priority INTEGER NOT NULL DEFAULT 0,
+        ticket_id TEXT,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        result TEXT,
+        error TEXT,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL,
+        enqueued_at REAL,
+        lease_until REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_ticket_id ON jobs (ticket_id);
+"""
+# Added to job files created before these columns existed
+MIGRATIONS = {
+    "priority": "INTEGER NOT NULL DEFAULT 0",
+    "enqueued_at": "REAL",
+    "lease_until": "REAL",
+}
+# After the migrations
+INDEXES = """
+    DROP INDEX IF EXISTS idx_jobs_status;
+    CREATE INDEX IF NOT EXISTS idx_jobs_status_priority ON jobs (status, priority, id);
+"""
+
+COLUMNS = ("id", "kind", "priority", "ticket_id", "payload", "status", "attempts", "result", "error", "created_at",
+           "started_at", "finished_at", "enqueued_at", "lease_until")
+DEFAULT_LEASE_SECONDS = 120.0
+
+
+def _decode(row):
+    job = dict(zip(COLUMNS, row))
+    job['payload'] = json.loads(job['payload'])
+    job['result'] = json.loads(job['result']) if job['result'] is not None else None
+    return job
+
+
+class JobQueue:
+    """SQLite-backed queue of JSON jobs, most urgent (lowest priority) first, then oldest. Thread-safe."""
+
+    def __init__(self, path=DEFAULT_DB_PATH, max_attempts=3, requeue_running=True,
+                 lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, definition in MIGRATIONS.items():
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+        self._conn.executescript(INDEXES)
+        if requeue_running:
+            self.requeue_expired()
+
+    def _requeue_expired_locked(self, now):
+        # Running jobs without a lease come from a version that had none: their process is gone too
+        return self._conn.execute(
+            "UPDATE jobs SET status = ?, started_at = NULL, lease_until = NULL, enqueued_at = ? "
+            "WHERE status = ? AND (lease_until IS NULL OR lease_until < ?)",
+            (QUEUED, now, RUNNING, now),
+        ).rowcount
+
+    def requeue_expired(self):
+        """Puts running jobs whose lease ran out (their worker died) back in the queue; returns how many"""
+        with self._lock:
+            return self._requeue_expired_locked(time.time())
+
+    def heartbeat(self, leases):
+        """Renews the leases of running jobs, given as (job id, lease token) pairs; leases lost meanwhile stay lost"""
+        lease_until = time.time() + self.lease_seconds
+        rows = [(lease_until, job_id, RUNNING, lease) for job_id, lease in leases]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("UPDATE jobs SET lease_until = ? WHERE id = ? AND status = ? AND attempts = ?", rows)
+
+    def submit(self, kind, payload, ticket_id=None, priority=0):
+        """Queues a job (lower `priority` values are claimed first); returns its id"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (kind, priority, ticket_id, payload, status, created_at, enqueued_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, priority, ticket_id, json.dumps(payload), QUEUED, now, now),
+            )
+            self._wakeup.notify_all()
+            return cursor.lastrowid
+
+    def claim(self, timeout=None):
+        """
+        Marks the most urgent (then oldest) queued job as running, leased for `lease_seconds`,
+        and returns it, or None if the queue stays empty for `timeout` seconds (None: don't wait).
+        job['lease'] is the token complete(), fail() and heartbeat() need.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while True:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    now = time.time()
+                    self._requeue_expired_locked(now)
+                    row = self._conn.execute(
+                        f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE status = ? ORDER BY priority, id LIMIT 1",
+                        (QUEUED,)
+                    ).fetchone()
+                    if row is not None:
+                        self._conn.execute(
+                            "UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = ?, lease_until = ? "
+                            "WHERE id = ?",
+                            (RUNNING, now, now + self.lease_seconds, row[0]),
+                        )
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                if row is not None:
+                    job = _decode(row)
+                    job['status'], job['attempts'] = RUNNING, job['attempts'] + 1
+                    job['lease'] = job['attempts']
+                    job['started_at'], job['lease_until'] = now, now + self.lease_seconds
+                    return job
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is None or remaining <= 0:
+                    return None
+                # Woken by submit() in this process; the timeout also picks up other processes' jobs
+                self._wakeup.wait(min(remaining, 1.0))
+
+    def complete(self, job_id, lease, result):
+        """Stores the result of the run holding `lease`; False (result dropped) if the lease was lost"""
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, finished_at = ?, lease_until = NULL "
+                "WHERE id = ? AND status = ? AND attempts = ?",
+                (DONE, json.dumps(result), time.time(), job_id, RUNNING, lease),
+            ).rowcount == 1
+
+    def fail(self, job_id, lease, error):
+        """
+        Records a failed attempt of the run holding `lease`: back to the queue, or failed for good
+        after max_attempts. False (nothing recorded) if the lease was lost.
+        """
+        now = time.time()
+        with self._lock:
+            updated = self._conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts < ? THEN ? ELSE ? END, error = ?, lease_until = NULL, "
+                "finished_at = CASE WHEN attempts < ? THEN NULL ELSE ? END, enqueued_at = ? "
+                "WHERE id = ? AND status = ? AND attempts = ?",
+                (self.max_attempts, QUEUED, FAILED, error, self.max_attempts, now, now, job_id, RUNNING, lease),
+            ).rowcount == 1
+            self._wakeup.notify_all()
+            return updated
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _decode(row) if row is not None else None
+
+    def get_many(self, job_ids):
+        """{job_id: job} for the given ids (unknown ids are left out)"""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE id IN ({', '.join('?' * len(job_ids))})", job_ids
+            ).fetchall()
+        return {row[0]: _decode(row) for row in rows}
+
+    def recent(self, limit=20):
+        """Newest jobs first"""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {', '.join(COLUMNS)} FROM jobs ORDER BY id DESC LIMIT ?",
+                                      (limit,)).fetchall()
+        return [_decode(row) for row in rows]
+
+    def counts(self):
+        """{status: number of jobs}"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: 0 for status in (QUEUED, RUNNING, DONE, FAILED)} | dict(rows)
+
+    def purge(self, older_than_days=7):
+        """Deletes finished jobs older than `older_than_days`; returns how many"""
+        cutoff = time.time() - older_than_days * 86400
+        with self._lock:
+            return self._conn.execute("DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                                      (DONE, FAILED, cutoff)).rowcount
+
+    def close(self):
+        self._conn.close()
+
+
+class WorkerPool:
+    """
+    `workers` daemon threads running handlers[job['kind']](payload) for queued jobs.
+    A handler returns a JSON-serializable result; an exception counts as a failed attempt.
+    One more thread renews the leases of the running jobs.
+    """
+
+    def __init__(self, queue, handlers, workers=2, poll_interval=1.0):
+        self.queue = queue
+        self.handlers = handlers
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._running = {}  # worker thread name -> (job id, lease token)
+        self._running_lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+                         for i in range(workers)]
+        self._threads.append(threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True))
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.is_set():
+            job = self.queue.claim(timeout=self.poll_interval)
+            if job is None:
+                continue
+            # Time since the job was last (re)queued, so retries don't count their earlier attempts
+            metrics.observe("job_wait", max(0.0, job['started_at'] - (job['enqueued_at'] or job['created_at'])))
+            name = threading.current_thread().name
+            with self._running_lock:
+                self._running[name] = (job['id'], job['lease'])
+            try:
+                result = self.handlers[job['kind']](job['payload'])
+            except Exception as e:
+                recorded = self.queue.fail(job['id'], job['lease'],
+                                           f"{type(e).__name__}: {e}\n{traceback.format_exc(limit=3)}")
+            else:
+                recorded = self.queue.complete(job['id'], job['lease'], result)
+            finally:
+                with self._running_lock:
+                    self._running.pop(name, None)
+            if not recorded:  # the lease ran out and the job was requeued: the newer run's outcome counts
+                metrics.REGISTRY.inc('job_stale_results_total')
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.queue.lease_seconds / 4):
+            with self._running_lock:
+                leases = list(self._running.values())
+            try:
+                self.queue.heartbeat(leases)
+            except sqlite3.Error:
+                pass  # a busy database: the next beat comes well before the leases run out
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from llm_module import MODEL_NAME, PROMPT_TEMPLATE, build_prompt, estimate_tokens, process_ticket_with_llm
+
+# Content-addressed cache for LLM outputs.
+# Keys combine the normalized ticket text, the prompt template and the model name,
+# so changing either of the latter two never serves stale drafts.
+# Lookups go to an in-memory LRU first, then to a SQLite file (WAL) shared by all processes.
+# Expired and least recently used rows are evicted every EVICT_EVERY puts, not on each one.
+
+DEFAULT_DB_PATH = 'llm_cache.db'
+DEFAULT_TTL = 7 * 24 * 3600  # 1 week
+EVICT_EVERY = 100  # puts between evictions (the disk may hold up to this many rows over max_disk_items)
+
+
+def normalize_ticket(text):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+def make_key(ticket_text, template=PROMPT_TEMPLATE, model_name=MODEL_NAME):
+    payload = json.dumps([
+        normalize_ticket(ticket_text),
+        hashlib.sha256(template.encode('utf-8')).hexdigest(),
+        model_name,
+    ])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """
+    Two-level (memory LRU + SQLite) cache with TTL and size-based eviction.
+    Safe to share between Streamlit sessions / threads.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, ttl=DEFAULT_TTL, max_memory_items=1024, max_disk_items=100_000,
+                 evict_every=EVICT_EVERY):
+        self.path = path
+        self.ttl = ttl
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self.evict_every = evict_every
+
+        self._memory = OrderedDict()  # key -> (created_at, value, latency, prompt_tokens)
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                latency REAL NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                prompt_tokens INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        if "prompt_tokens" not in {row[1] for row in self._conn.execute("PRAGMA table_info(llm_cache)")}:
+            self._conn.execute("ALTER TABLE llm_cache ADD COLUMN prompt_tokens INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_cache (created_at)")
+        self._conn.commit()
+
+        # tokens_saved = prompt_tokens_saved + output_tokens_saved (estimates, see estimate_tokens)
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "seconds_saved": 0.0,
+            "prompt_tokens_saved": 0,
+            "output_tokens_saved": 0,
+            "tokens_saved": 0,
+        }
+
+    def _expired(self, created_at, now):
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _record_hit(self, kind, entry):
+        _, value, latency, prompt_tokens = entry
+        output_tokens = estimate_tokens(value)
+        self.stats[kind] += 1
+        self.stats["seconds_saved"] += latency
+        self.stats["prompt_tokens_saved"] += prompt_tokens
+        self.stats["output_tokens_saved"] += output_tokens
+        self.stats["tokens_saved"] += prompt_tokens + output_tokens
+
+    def get(self, key):
+        """Returns the cached value or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[0], now):
+                    self._memory.move_to_end(key)
+                    self._record_hit("memory_hits", entry)
+                    return entry[1]
+                del self._memory[key]
+
+            row = self._conn.execute(
+                "SELECT created_at, value, latency, prompt_tokens FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or self._expired(row[0], now):
+                if row is not None:
+                    self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.stats["misses"] += 1
+                return None
+
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self._remember(key, row)
+            self._record_hit("disk_hits", row)
+            return row[1]
+
+    def put(self, key, value, latency=0.0, prompt_tokens=0):
+        """Caches `value`; `latency` and `prompt_tokens` are what a hit on it saves besides the output"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, (now, value, latency, prompt_tokens))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, latency, created_at, last_access, prompt_tokens) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value, latency, now, now, prompt_tokens),
+            )
+            self._puts += 1
+            if self._puts % self.evict_every == 0:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+        count = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        if count > self.max_disk_items:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_access LIMIT ?)",
+                (count - self.max_disk_items,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def summary(self):
+        """Counters plus derived hit rate"""
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        lookups = hits + self.stats["misses"]
+        return dict(self.stats, hits=hits, lookups=lookups,
+                    hit_rate=round(hits / lookups, 3) if lookups else 0.0)
+
+    def close(self):
+        self._conn.close()
+
+
+def cached_process_ticket(ticket_text, cache, llm_fn=process_ticket_with_llm, template=PROMPT_TEMPLATE):
+    """
+    Drop-in replacement for process_ticket_with_llm that consults `cache` first.
+    Returns (ai_output, cache_hit). Error replies are never cached.
+    """
+    key = make_key(ticket_text, template)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached, True
+
+    start = time.perf_counter()
+    ai_output = llm_fn(ticket_text, template=template)
+    if not ai_output.startswith("Error connecting to AI"):
+        cache.put(key, ai_output, latency=time.perf_counter() - start,
+                  prompt_tokens=estimate_tokens(build_prompt(ticket_text, template)))
+    return ai_output, False
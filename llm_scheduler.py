@@ -0,0 +1,297 @@
+import argparse
+import asyncio
+import heapq
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+import metrics
+
+# Quota-aware, urgency-first admission of LLM requests.
+#
+# Provider quotas are per minute: requests (RPM) and tokens (TPM). Each is a token bucket
+# that refills continuously at limit / 60 per second and holds at most one minute's worth.
+# A request is admitted when both buckets can pay for it; until then it waits in one FIFO
+# per priority class, and the highest class goes first:
+#
+#   0 urgent_negative   Urgent (urgency_model) and Negative sentiment
+#   1 urgent            Urgent
+#   2 negative          Normal but Negative
+#   3 normal
+#
+# A request that has waited longer than `max_wait` seconds is served before higher
+# classes, so a steady stream of urgent tickets cannot starve the rest.
+#
+# The core (submit / dispatch) takes the time as an argument, so it can be driven by a
+# simulated clock (see simulate()). acquire() is the asyncio front end used by
+# llm_module.AsyncLLMClient(scheduler=...); acquire_blocking() serves threads, i.e. the
+# app's script runs and job workers (ticket_pipeline.draft_response(scheduler=...)).
+# A scheduler is used through one of the two, not both.
+#
+# Usage:
+#   python llm_scheduler.py --rpm 60 --tpm 40000 --tickets 300   # simulated load, waits per class
+
+PRIORITY_CLASSES = ("urgent_negative", "urgent", "negative", "normal")
+DEFAULT_RPM = 15          # Gemini free tier
+DEFAULT_TPM = 1_000_000
+DEFAULT_MAX_WAIT = 120.0
+WAIT_WINDOW = 1024        # recent waits kept per class for the percentiles
+SIMULATED_YIELDS = 8      # event-loop turns a simulated wait leaves to other tasks
+
+
+def priority_for(urgency, sentiment=None):
+    """Priority class index (0 = first) for a ticket's predicted urgency and sentiment label"""
+    urgent, negative = urgency == "Urgent", sentiment == "Negative"
+    if urgent:
+        return 0 if negative else 1
+    return 2 if negative else 3
+
+
+class TokenBucket:
+    """Refills at `per_minute` / 60 units per second, holding at most `per_minute` units"""
+
+    def __init__(self, per_minute, now=0.0):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = now
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` units are available (0 if they are now)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def consume(self, amount, now):
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+
+class SimulatedClock:
+    """Virtual time for tests: sleep() advances it instead of waiting"""
+
+    def __init__(self, start=0.0):
+        self.t = start
+
+    def now(self):
+        return self.t
+
+    def advance(self, seconds):
+        self.t += max(0.0, seconds)
+
+    async def wait(self, event, timeout):
+        """Gives the tasks just admitted a few loop iterations to run, then jumps `timeout` seconds ahead"""
+        for _ in range(SIMULATED_YIELDS):
+            await asyncio.sleep(0)
+        self.advance(timeout)
+
+
+class MonotonicClock:
+    def now(self):
+        return time.monotonic()
+
+    async def wait(self, event, timeout):
+        """Returns when `event` is set or after `timeout` seconds"""
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class Request:
+    __slots__ = ('seq', 'priority', 'tokens', 'submitted_at', 'dispatched_at', 'future')
+
+    def __init__(self, seq, priority, tokens, submitted_at):
+        self.seq = seq
+        self.priority = priority
+        self.tokens = tokens
+        self.submitted_at = submitted_at
+        self.dispatched_at = None
+        self.future = None
+
+
+class LLMScheduler:
+    """RPM + TPM token buckets in front of the LLM, with one FIFO per priority class"""
+
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, max_wait=DEFAULT_MAX_WAIT, clock=None):
+        self.clock = clock or MonotonicClock()
+        now = self.clock.now()
+        self.requests_bucket = TokenBucket(rpm, now)
+        self.tokens_bucket = TokenBucket(tpm, now)
+        self.max_wait = max_wait
+        self.queues = [deque() for _ in PRIORITY_CLASSES]
+        self.dispatched = [0] * len(PRIORITY_CLASSES)
+        self.waits = [deque(maxlen=WAIT_WINDOW) for _ in PRIORITY_CLASSES]
+        self._seq = 0
+        self._wakeup = None
+        self._dispatcher = None
+        self._loop = None
+        self._condition = threading.Condition()
+
+    # --- Core (explicit time) ---
+
+    def submit(self, tokens, priority=None, now=None):
+        """
+        Queues a request for `tokens` (prompt + expected output) tokens and returns it.
+        `priority` is a class index (see priority_for); None queues it as normal.
+        """
+        now = self.clock.now() if now is None else now
+        priority = len(self.queues) - 1 if priority is None else min(max(int(priority), 0), len(self.queues) - 1)
+        self._seq += 1
+        request = Request(self._seq, priority, tokens, now)
+        self.queues[request.priority].append(request)
+        return request
+
+    def _next(self, now):
+        heads = [q[0] for q in self.queues if q]
+        if not heads:
+            return None
+        oldest = min(heads, key=lambda r: r.seq)
+        if self.max_wait is not None and now - oldest.submitted_at >= self.max_wait:
+            return oldest
+        return heads[0]  # queues are in priority order
+
+    def dispatch(self, now=None):
+        """
+        Admits as many queued requests as the buckets allow, in priority order.
+        Returns (admitted requests, seconds until the next one can go, or None if the queue is empty).
+        """
+        now = self.clock.now() if now is None else now
+        admitted = []
+        while True:
+            request = self._next(now)
+            if request is None:
+                return admitted, None
+            wait = max(self.requests_bucket.wait_time(1, now), self.tokens_bucket.wait_time(request.tokens, now))
+            if wait > 0:
+                return admitted, wait
+            self.requests_bucket.consume(1, now)
+            self.tokens_bucket.consume(request.tokens, now)
+            self.queues[request.priority].popleft()
+            request.dispatched_at = now
+            self.dispatched[request.priority] += 1
+            self.waits[request.priority].append(now - request.submitted_at)
+            metrics.observe(f"llm_wait_{PRIORITY_CLASSES[request.priority]}", now - request.submitted_at)
+            admitted.append(request)
+
+    # --- asyncio front end ---
+
+    async def acquire(self, tokens, priority=None):
+        """Waits until the request may be sent (quota available and nothing more urgent queued)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._dispatcher.done():  # first call, or a new event loop
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._dispatcher = loop.create_task(self._dispatch_loop())
+        request = self.submit(tokens, priority)
+        request.future = loop.create_future()
+        self._wakeup.set()
+        try:
+            await request.future
+        except asyncio.CancelledError:
+            if request.dispatched_at is None:  # don't spend quota on an abandoned request
+                self.queues[request.priority].remove(request)
+            raise
+
+    async def _dispatch_loop(self):
+        while True:
+            self._wakeup.clear()
+            admitted, wait = self.dispatch()
+            for request in admitted:
+                if request.future is not None and not request.future.done():
+                    request.future.set_result(None)
+            if wait is None:
+                await self._wakeup.wait()
+            else:  # until quota is back, or a new (possibly more urgent) request arrives
+                await self.clock.wait(self._wakeup, wait)
+
+    # --- Thread front end ---
+
+    def acquire_blocking(self, tokens, priority=None):
+        """acquire() for threads: blocks until the request may be sent; returns it"""
+        with self._condition:
+            request = self.submit(tokens, priority)
+            while True:
+                admitted, wait = self.dispatch()
+                if admitted:  # possibly other threads' requests
+                    self._condition.notify_all()
+                if request.dispatched_at is not None:
+                    return request
+                self._condition.wait(wait)
+
+    def stats(self):
+        """Queue depth, admitted requests and waits (seconds) per priority class, plus bucket levels"""
+        now = self.clock.now()
+        classes = {}
+        for i, name in enumerate(PRIORITY_CLASSES):
+            waits = list(self.waits[i])
+            classes[name] = {
+                "depth": len(self.queues[i]),
+                "dispatched": self.dispatched[i],
+                "oldest_wait_s": round(now - self.queues[i][0].submitted_at, 3) if self.queues[i] else 0.0,
+                "p50_wait_s": round(float(np.percentile(waits, 50)), 3) if waits else None,
+                "p95_wait_s": round(float(np.percentile(waits, 95)), 3) if waits else None,
+            }
+        self.requests_bucket._refill(now)
+        self.tokens_bucket._refill(now)
+        return {
+            "classes": classes,
+            "requests_available": round(self.requests_bucket.level, 2),
+            "tokens_available": round(self.tokens_bucket.level),
+        }
+
+
+def simulate(arrivals, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, max_wait=DEFAULT_MAX_WAIT):
+    """
+    Discrete-event run of the scheduler on a simulated clock. `arrivals` is a list of
+    (time, tokens, priority); returns (scheduler, requests) with dispatched_at filled in.
+    """
+    scheduler = LLMScheduler(rpm, tpm, max_wait=max_wait, clock=SimulatedClock())
+    events = [(t, i, tokens, priority) for i, (t, tokens, priority) in enumerate(arrivals)]
+    heapq.heapify(events)
+    requests = []
+    now, wake_at = 0.0, None
+    while events or wake_at is not None:
+        if events and (wake_at is None or events[0][0] <= wake_at):
+            now = max(now, events[0][0])
+            while events and events[0][0] <= now:
+                _, _, tokens, priority = heapq.heappop(events)
+                requests.append(scheduler.submit(tokens, priority, now=now))
+        else:
+            now = wake_at
+        scheduler.clock.t = now
+        _, wait = scheduler.dispatch(now)
+        wake_at = None if wait is None else now + wait
+    return scheduler, requests
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate the LLM scheduler under a burst of tickets")
+    parser.add_argument('--rpm', type=int, default=60)
+    parser.add_argument('--tpm', type=int, default=40_000)
+    parser.add_argument('--tickets', type=int, default=300, help="Tickets arriving over the first minute")
+    parser.add_argument('--max-wait', type=float, default=DEFAULT_MAX_WAIT)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    arrivals = [(float(t), int(tokens), int(priority)) for t, tokens, priority in zip(
+        np.sort(rng.uniform(0, 60, args.tickets)),
+        rng.integers(200, 900, args.tickets),
+        rng.choice(len(PRIORITY_CLASSES), args.tickets, p=[0.1, 0.2, 0.2, 0.5]),
+    )]
+    scheduler, requests = simulate(arrivals, args.rpm, args.tpm, args.max_wait)
+    print(f"📬 {args.tickets} tickets in 60 s | {args.rpm} RPM, {args.tpm} TPM | "
+          f"last request sent at {max(r.dispatched_at for r in requests):.0f} s")
+    for name, s in scheduler.stats()['classes'].items():
+        waits = [r.dispatched_at - r.submitted_at for r in requests if PRIORITY_CLASSES[r.priority] == name]
+        if waits:
+            print(f"   {name:<16} {s['dispatched']:>4} requests | wait p50 {s['p50_wait_s']:7.1f} s | "
+                  f"p95 {s['p95_wait_s']:7.1f} s | max {max(waits):7.1f} s")
@@ -0,0 +1,83 @@
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llm_module import PACKED_TICKETS_END, PACKED_TICKETS_START
+
+# Local stand-in for the LLM, for exercising llm_module.HTTPBackend without network.
+# Accepts POST {"prompt": ...} and replies {"text": "SUMMARY: ... SUGGESTED RESPONSE: ..."}.
+# Packed prompts (several tickets, see llm_module.pack_tickets) get a JSON array with one
+# object per ticket; --drop-rate leaves tickets out of it to exercise the retries.
+#
+# Usage:
+#   python llm_stub_server.py --port 8765 --latency 0.2 --fail-rate 0.1 --drop-rate 0.05
+
+STUB_REPLY = """SUMMARY:
+The customer reports a problem with their service and is asking for help.
+
+SUGGESTED RESPONSE:
+Thank you for reaching out. We're sorry for the inconvenience and are looking into your issue right away."""
+STUB_SUMMARY, STUB_RESPONSE = (part.strip() for part in
+                               STUB_REPLY.replace("SUMMARY:", "").split("SUGGESTED RESPONSE:"))
+
+
+def packed_reply(prompt, drop_rate=0.0):
+    """JSON array answering every ticket of a packed prompt (minus the dropped ones)"""
+    tickets_json = prompt.split(PACKED_TICKETS_START, 1)[1].rsplit(PACKED_TICKETS_END, 1)[0]
+    return json.dumps([{"id": ticket["id"], "summary": STUB_SUMMARY, "response": STUB_RESPONSE}
+                       for ticket in json.loads(tickets_json) if random.random() >= drop_rate])
+
+
+def make_handler(latency=0.0, fail_rate=0.0, drop_rate=0.0):
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                prompt = json.loads(self.rfile.read(length) or b'{}')['prompt']
+            except (ValueError, KeyError):
+                self._reply(400, {"error": "expected JSON body with a 'prompt' field"})
+                return
+
+            if latency:
+                time.sleep(latency)
+            if fail_rate and random.random() < fail_rate:
+                self._reply(503, {"error": "stub overloaded"})
+                return
+            if PACKED_TICKETS_START in prompt:
+                self._reply(200, {"text": packed_reply(prompt, drop_rate)})
+            else:
+                self._reply(200, {"text": STUB_REPLY})
+
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return StubHandler
+
+
+def make_server(host='127.0.0.1', port=8765, latency=0.0, fail_rate=0.0, drop_rate=0.0):
+    return ThreadingHTTPServer((host, port), make_handler(latency, fail_rate, drop_rate))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stub LLM server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds to wait before replying")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument('--drop-rate', type=float, default=0.0,
+                        help="Fraction of tickets left out of packed replies")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency, args.fail_rate, args.drop_rate)
+    print(f"🧪 Stub LLM listening on http://{args.host}:{args.port}/")
+    server.serve_forever()
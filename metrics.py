@@ -0,0 +1,198 @@
+import bisect
+import os
+import threading
+import time
+from collections import deque
+
+# In-process latency / error metrics for the pipeline stages.
+#
+# Code wraps each stage in `with span("vectorize"): ...`; the duration goes into a
+# histogram per stage (fixed Prometheus-style buckets, plus a window of recent samples
+# for live p50 / p95) and an exception bumps that stage's error counter. LLM calls
+# also count requests / errors so the error rate can be shown.
+#
+# Stages (STAGES): vectorize, dept_predict / urgency_predict (sklearn path) or predict
+# (both heads, fused engine), sentiment, compress (pre-LLM ticket compression), llm_call,
+# parse_output, job_wait (queue time of background jobs); app.py adds app_imports (cold
+# start only) and app_render (each script run).
+#
+# Export: render_prometheus() (served as /metrics by inference_service.py), or a
+# FileExporter that rewrites a Prometheus textfile (node_exporter format) periodically.
+# Metrics are per process, like prometheus_client without multiprocess mode.
+
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0)
+RECENT_WINDOW = 1024  # samples kept per stage for the live percentiles
+STAGES = ("vectorize", "dept_predict", "urgency_predict", "predict", "sentiment", "compress", "llm_call",
+          "parse_output", "job_wait", "app_imports", "app_render")
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS, window=RECENT_WINDOW):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot: +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def percentiles(self, qs=(50, 95, 99)):
+        """Percentiles (seconds) over the recent window, or None when empty"""
+        if not self.recent:
+            return {q: None for q in qs}
+        values = sorted(self.recent)
+        return {q: values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))] for q in qs}
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+def _bucket_bounds(buckets):
+    return [*(repr(float(b)) for b in buckets), "+Inf"]
+
+
+class _Span:
+    """Plain class rather than @contextmanager: spans wrap µs-scale stages, so call overhead matters"""
+    __slots__ = ('registry', 'stage', 'start')
+
+    def __init__(self, registry, stage):
+        self.registry = registry
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe(self.stage, time.perf_counter() - self.start)
+        if exc_type is not None and issubclass(exc_type, Exception):
+            self.registry.inc('stage_errors_total', stage=self.stage)
+        return False
+
+
+class MetricsRegistry:
+    """Stage histograms + labelled counters. Thread-safe."""
+
+    def __init__(self, prefix='ticket'):
+        self.prefix = prefix
+        self.histograms = {}  # stage -> Histogram
+        self.counters = {}    # (name, ((label, value), ...)) -> number
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def span(self, stage):
+        """Context manager timing the block into `stage`'s histogram; exceptions count as stage errors"""
+        return _Span(self, stage)
+
+    def record_llm(self, ok):
+        self.inc('llm_requests_total')
+        if not ok:
+            self.inc('llm_errors_total')
+
+    def snapshot(self):
+        """
+        {"stages": {stage: {"count", "p50_ms", "p95_ms", "p99_ms", "mean_ms", "errors"}},
+         "llm": {"requests", "errors", "error_rate"}}
+        """
+        with self._lock:
+            stages = {}
+            for stage, h in self.histograms.items():
+                p = h.percentiles()
+                stages[stage] = {
+                    "count": h.count,
+                    "p50_ms": round(p[50] * 1000, 3),
+                    "p95_ms": round(p[95] * 1000, 3),
+                    "p99_ms": round(p[99] * 1000, 3),
+                    "mean_ms": round(h.sum / h.count * 1000, 3),
+                    "errors": self.counters.get(('stage_errors_total', (('stage', stage),)), 0),
+                }
+            requests = self.counters.get(('llm_requests_total', ()), 0)
+            errors = self.counters.get(('llm_errors_total', ()), 0)
+        return {
+            "stages": stages,
+            "llm": {"requests": requests, "errors": errors,
+                    "error_rate": round(errors / requests, 4) if requests else None},
+        }
+
+    def render_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        name = f"{self.prefix}_stage_duration_seconds"
+        lines = [f"# HELP {name} Duration of each pipeline stage.", f"# TYPE {name} histogram"]
+        with self._lock:
+            for stage, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(_bucket_bounds(h.buckets), h.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {h.sum}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {h.count}')
+
+            counter_names = sorted({counter for counter, _ in self.counters})
+            for counter in counter_names:
+                full_name = f"{self.prefix}_{counter}"
+                lines.append(f"# TYPE {full_name} counter")
+                for (n, labels), value in sorted(self.counters.items()):
+                    if n == counter:
+                        lines.append(f"{full_name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Atomically (re)writes `path` with the current metrics"""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            fh.write(self.render_prometheus())
+        os.replace(tmp, path)
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+
+class FileExporter:
+    """Background thread writing the registry to a Prometheus textfile every `interval` seconds"""
+
+    def __init__(self, path, registry=None, interval=15.0):
+        self.path = path
+        self.registry = registry or REGISTRY
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-file-exporter", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.registry.write_prometheus(self.path)
+
+    def stop(self):
+        self._stop.set()
+        self.registry.write_prometheus(self.path)
+
+
+# Process-wide default registry
+REGISTRY = MetricsRegistry()
+span = REGISTRY.span
+observe = REGISTRY.observe
+record_llm = REGISTRY.record_llm
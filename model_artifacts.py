@@ -0,0 +1,248 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+
+from featurizers import HashingTfidfVectorizer, featurizer_mode
+
+# Compact, memory-mappable model format (alternative to the joblib pickles).
+#
+#   model_artifacts/
+#     manifest.json              format version, featurizer + classifier params, class labels
+#     vocabulary.txt             one term per line, line number = feature index (tfidf featurizer only)
+#     idf.npy                    IDF weights (absent for hashing without IDF)
+#     department_coef.npy        (n_classes, n_features) coefficient matrix
+#     department_intercept.npy
+#     urgency_coef.npy
+#     urgency_intercept.npy
+#
+# The .npy arrays are opened with mmap_mode='r', so several worker processes share the
+# same physical pages and loading does no unpickling. The loader rebuilds regular
+# sklearn estimators around those arrays, so predictions are identical to the pickles.
+# Every file is checked against the manifest's SHA-256 checksums before it is used.
+#
+# Usage:
+#   python model_artifacts.py export            # from the .pkl files in the current directory
+#   python model_artifacts.py verify            # compare predictions against the pickles
+
+FORMAT_VERSION = 1
+DEFAULT_ARTIFACTS_DIR = 'model_artifacts'
+HEADS = ('department', 'urgency')
+
+# Linear classifiers the loader can rebuild from coef/intercept arrays
+ESTIMATORS = {cls.__name__: cls for cls in (LogisticRegression, SGDClassifier)}
+
+# Vectorizer settings that must be plain data to be stored in the manifest
+_VECTORIZER_PARAMS = (
+    'lowercase', 'token_pattern', 'stop_words', 'ngram_range', 'max_df', 'min_df', 'max_features',
+    'binary', 'norm', 'use_idf', 'smooth_idf', 'sublinear_tf', 'strip_accents', 'analyzer',
+)
+
+
+def _vectorizer_config(vectorizer):
+    if not isinstance(vectorizer, TfidfVectorizer):
+        raise ValueError(f"Cannot export {type(vectorizer).__name__}; expected a TfidfVectorizer")
+    if vectorizer.tokenizer is not None or vectorizer.preprocessor is not None or callable(vectorizer.analyzer):
+        raise ValueError("Vectorizers with custom tokenizer/preprocessor/analyzer callables can't be exported")
+    params = vectorizer.get_params()
+    config = {name: params[name] for name in _VECTORIZER_PARAMS}
+    if config['stop_words'] is not None and not isinstance(config['stop_words'], str):
+        config['stop_words'] = sorted(config['stop_words'])
+    config['ngram_range'] = list(config['ngram_range'])
+    config['dtype'] = np.dtype(params['dtype']).name
+    return config
+
+
+def _classifier_config(model):
+    if type(model).__name__ not in ESTIMATORS:
+        raise ValueError(f"Cannot export {type(model).__name__}; expected one of {list(ESTIMATORS)}")
+    params = {k: v for k, v in model.get_params().items() if isinstance(v, (int, float, str, bool, type(None)))}
+    return {
+        "estimator": type(model).__name__,
+        "params": params,
+        "classes": [c.item() if hasattr(c, 'item') else c for c in model.classes_],
+    }
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def export_artifacts(vectorizer, dept_model, urgency_model, out_dir=DEFAULT_ARTIFACTS_DIR, model_version=None):
+    """Writes the fitted vectorizer (tfidf or hashing featurizer) + both classifiers to `out_dir`"""
+    os.makedirs(out_dir, exist_ok=True)
+    mode = featurizer_mode(vectorizer)
+    files = []
+
+    if mode == 'tfidf':
+        terms = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+        with open(os.path.join(out_dir, 'vocabulary.txt'), 'w', encoding='utf-8') as fh:
+            fh.write("\n".join(terms))
+        files.append('vocabulary.txt')
+        n_features, featurizer_config = len(terms), _vectorizer_config(vectorizer)
+    else:
+        n_features, featurizer_config = vectorizer.n_features, vectorizer.get_config()
+
+    if vectorizer.use_idf and (mode == 'tfidf' or vectorizer.idf_ is not None):
+        np.save(os.path.join(out_dir, 'idf.npy'), np.ascontiguousarray(vectorizer.idf_))
+        files.append('idf.npy')
+
+    heads = {}
+    for name, model in zip(HEADS, (dept_model, urgency_model)):
+        np.save(os.path.join(out_dir, f'{name}_coef.npy'), np.ascontiguousarray(model.coef_))
+        np.save(os.path.join(out_dir, f'{name}_intercept.npy'), np.ascontiguousarray(model.intercept_))
+        heads[name] = _classifier_config(model)
+
+    files += [f'{h}_{part}.npy' for h in HEADS for part in ('coef', 'intercept')]
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "model_version": model_version or time.strftime('%Y%m%d%H%M%S'),
+        "featurizer": mode,
+        "n_features": n_features,
+        "vectorizer": featurizer_config,
+        "heads": heads,
+        "checksums": {f: _sha256(os.path.join(out_dir, f)) for f in files},
+    }
+    with open(os.path.join(out_dir, 'manifest.json'), 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, indent=2)
+    return manifest
+
+
+def read_manifest(artifacts_dir=DEFAULT_ARTIFACTS_DIR):
+    with open(os.path.join(artifacts_dir, 'manifest.json'), encoding='utf-8') as fh:
+        manifest = json.load(fh)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported model artifact format {manifest.get('format_version')!r} "
+                         f"(this loader reads version {FORMAT_VERSION})")
+    return manifest
+
+
+def verify_checksums(artifacts_dir=DEFAULT_ARTIFACTS_DIR, manifest=None):
+    """Files listed in the manifest that are missing or don't match their checksum (empty if intact)"""
+    manifest = manifest or read_manifest(artifacts_dir)
+    corrupted = []
+    for name, checksum in manifest["checksums"].items():
+        try:
+            if _sha256(os.path.join(artifacts_dir, name)) != checksum:
+                corrupted.append(name)
+        except FileNotFoundError:
+            corrupted.append(name)
+    return corrupted
+
+
+def _load_array(artifacts_dir, name, mmap):
+    return np.load(os.path.join(artifacts_dir, name), mmap_mode='r' if mmap else None)
+
+
+def _build_vectorizer(manifest, artifacts_dir, mmap):
+    if manifest["featurizer"] == 'hashing':
+        vectorizer = HashingTfidfVectorizer(**manifest["vectorizer"])
+        if 'idf.npy' in manifest["checksums"]:
+            vectorizer.idf_ = _load_array(artifacts_dir, 'idf.npy', mmap)
+        return vectorizer
+
+    config = dict(manifest["vectorizer"])
+    config['ngram_range'] = tuple(config['ngram_range'])
+    config['dtype'] = np.dtype(config['dtype']).type
+    vectorizer = TfidfVectorizer(**config)
+
+    with open(os.path.join(artifacts_dir, 'vocabulary.txt'), encoding='utf-8') as fh:
+        terms = fh.read().split("\n")
+    vectorizer.vocabulary_ = {term: i for i, term in enumerate(terms)}
+    vectorizer.fixed_vocabulary_ = False
+    vectorizer.idf_ = _load_array(artifacts_dir, 'idf.npy', mmap)
+    return vectorizer
+
+
+def _build_classifier(head, config, artifacts_dir, mmap):
+    if config.get("estimator") not in ESTIMATORS:
+        raise ValueError(f"Manifest has no supported estimator for the {head} head ({config.get('estimator')!r}); "
+                         f"re-export with 'python model_artifacts.py export'")
+    estimator = ESTIMATORS[config["estimator"]]
+    valid = estimator().get_params()
+    model = estimator(**{k: v for k, v in config["params"].items() if k in valid})
+    model.coef_ = _load_array(artifacts_dir, f'{head}_coef.npy', mmap)
+    model.intercept_ = _load_array(artifacts_dir, f'{head}_intercept.npy', mmap)
+    model.classes_ = np.array(config["classes"], dtype=object)
+    model.n_features_in_ = model.coef_.shape[1]
+    return model
+
+
+def load_artifacts(artifacts_dir=DEFAULT_ARTIFACTS_DIR, mmap=True, verify=True):
+    """
+    Loads (vectorizer, dept_model, urgency_model) from `artifacts_dir`.
+    With mmap=True the weight arrays are memory-mapped read-only.
+    Raises ValueError if a file fails its checksum (verify=False skips the check,
+    for callers that just verified the directory themselves).
+    """
+    manifest = read_manifest(artifacts_dir)
+    if verify:
+        corrupted = verify_checksums(artifacts_dir, manifest)
+        if corrupted:
+            raise ValueError(f"Model artifacts in '{artifacts_dir}' failed their checksums: {', '.join(corrupted)}")
+    vectorizer = _build_vectorizer(manifest, artifacts_dir, mmap)
+    dept_model, urgency_model = (
+        _build_classifier(head, manifest["heads"][head], artifacts_dir, mmap) for head in HEADS
+    )
+    return vectorizer, dept_model, urgency_model
+
+
+def verify_artifacts(texts, pickled_models, artifacts_dir=DEFAULT_ARTIFACTS_DIR):
+    """True if labels and probabilities from the artifacts equal the pickles' exactly"""
+    loaded = load_artifacts(artifacts_dir)
+    X_ref = pickled_models[0].transform(texts)
+    X_new = loaded[0].transform(texts)
+    if (X_ref != X_new).nnz:
+        return False
+    for ref, new in zip(pickled_models[1:], loaded[1:]):
+        if not np.array_equal(ref.predict(X_ref), new.predict(X_new)):
+            return False
+        if not np.array_equal(ref.predict_proba(X_ref), new.predict_proba(X_new)):
+            return False
+    return True
+
+
+def _sample_texts(limit=2000):
+    try:
+        from ticket_data import read_tickets
+        return read_tickets(columns=['ticket_text'], nrows=limit)['ticket_text'].fillna('').tolist()
+    except (FileNotFoundError, ValueError):
+        return [
+            "My internet is not working and I am very angry! I pay too much for this.",
+            "I was charged twice on my last invoice, please refund the duplicate payment.",
+            "How do I cancel my subscription?",
+            "The product stopped working after the latest update.",
+        ]
+
+
+if __name__ == "__main__":
+    from ticket_pipeline import load_pickled_models
+
+    parser = argparse.ArgumentParser(description="Export / verify memory-mappable model artifacts")
+    parser.add_argument('command', choices=['export', 'verify'])
+    parser.add_argument('--out', default=DEFAULT_ARTIFACTS_DIR, help="Artifacts directory")
+    args = parser.parse_args()
+
+    pickled = load_pickled_models()
+    if args.command == 'export':
+        manifest = export_artifacts(*pickled, out_dir=args.out)
+        print(f"✅ Exported model version {manifest['model_version']} to '{args.out}/'")
+
+    texts = _sample_texts()
+    start = time.perf_counter()
+    load_artifacts(args.out)
+    print(f"⏱️ Artifact load time: {(time.perf_counter() - start) * 1000:.1f} ms")
+    if verify_artifacts(texts, pickled, args.out):
+        print(f"✅ Predictions identical to the pickles on {len(texts)} tickets")
+    else:
+        print("❌ Predictions differ from the pickles!")
+        raise SystemExit(1)
@@ -0,0 +1,423 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+import metrics
+from fast_inference import FastTicketClassifier
+from model_artifacts import export_artifacts, load_artifacts, read_manifest, verify_checksums
+from similar_tickets import DEFAULT_INDEX_PATH, SimilarTicketIndex
+from ticket_pipeline import classify_texts, load_models, load_pickled_models
+
+# Versioned model registry + hot-reloading model server.
+#
+#   model_registry/
+#     versions/<version>/   model_artifacts format (manifest.json with checksums) + metrics.json
+#     pointers.json         {"current", "previous", "candidate", "updated_at"}
+#
+# A version is exported into a temporary directory and renamed into place, and
+# pointers.json is rewritten with os.replace, so readers only ever see complete versions
+# and a consistent set of pointers.
+#
+# ModelServer serves the current version. A watcher thread polls the pointers; a newly
+# promoted version is loaded, checksum-verified and warmed up in the background, then
+# swapped in with one reference assignment. Requests hold on to the ServedModels they
+# started with, so in-flight requests finish on the old version and none wait for the load.
+# A "candidate" version scores the same traffic in shadow mode (a background thread, a
+# bounded queue that drops rather than blocks) and reports agreement and latency only.
+# A version that fails to load is retried with exponential backoff (RETRY_BASE_SECONDS,
+# doubling up to RETRY_MAX_SECONDS), so a transient error doesn't rule it out for good.
+# The watcher reports through the "model_registry" logger.
+#
+# Usage:
+#   python model_registry.py list
+#   python model_registry.py publish --version v2 --promote   # the .pkl files in the current directory
+#   python model_registry.py promote v2
+#   python model_registry.py rollback
+#   python model_registry.py candidate v3                     # shadow-score v3 (--clear to stop)
+
+DEFAULT_REGISTRY_DIR = 'model_registry'
+POLL_INTERVAL = 5.0
+SHADOW_QUEUE_SIZE = 1000
+SHADOW_WINDOW = 1024  # recent latencies kept for the shadow report
+FEATURIZER_FILES = ('vocabulary.txt', 'idf.npy')
+WARMUP_TEXTS = ("My internet is not working.", "I was charged twice for my subscription, please refund me.")
+RETRY_BASE_SECONDS = 30.0
+RETRY_MAX_SECONDS = 600.0
+
+log = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    def __init__(self, root=DEFAULT_REGISTRY_DIR):
+        self.root = root
+        self.versions_dir = os.path.join(root, 'versions')
+        self.pointers_path = os.path.join(root, 'pointers.json')
+        self._lock = threading.Lock()
+
+    def version_dir(self, version):
+        return os.path.join(self.versions_dir, version)
+
+    # --- Versions ---
+
+    def publish(self, vectorizer, dept_model, urgency_model, version=None, metrics=None, promote=False):
+        """Adds a version (artifacts + `metrics`, e.g. held-out accuracies); returns its name"""
+        version = version or time.strftime('%Y%m%d%H%M%S')
+        final_dir = self.version_dir(version)
+        if os.path.exists(final_dir):
+            raise ValueError(f"Model version {version!r} already exists")
+        tmp_dir = os.path.join(self.versions_dir, f".tmp-{version}-{os.getpid()}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        export_artifacts(vectorizer, dept_model, urgency_model, out_dir=tmp_dir, model_version=version)
+        with open(os.path.join(tmp_dir, 'metrics.json'), 'w', encoding='utf-8') as fh:
+            json.dump({"published_at": time.time(), "metrics": metrics or {}}, fh, indent=2)
+        os.rename(tmp_dir, final_dir)
+        if promote:
+            self.promote(version)
+        return version
+
+    def versions(self):
+        """Published versions, oldest first: {"version", "published_at", "featurizer", "metrics"}"""
+        if not os.path.isdir(self.versions_dir):
+            return []
+        versions = []
+        for version in os.listdir(self.versions_dir):
+            if version.startswith('.'):
+                continue
+            info = {"version": version, "published_at": None, "metrics": {}}
+            try:
+                with open(os.path.join(self.version_dir(version), 'metrics.json'), encoding='utf-8') as fh:
+                    info.update(json.load(fh))
+                info["featurizer"] = read_manifest(self.version_dir(version))["featurizer"]
+            except (OSError, ValueError, KeyError):
+                continue
+            versions.append(info)
+        return sorted(versions, key=lambda v: v["published_at"] or 0)
+
+    def verify(self, version):
+        """Files of `version` whose checksum doesn't match its manifest (empty if intact)"""
+        return verify_checksums(self.version_dir(version))
+
+    def featurizer_key(self, version):
+        """Short id of the version's featurizer: versions that share it (e.g. online updates) share its feature space"""
+        manifest = read_manifest(self.version_dir(version))
+        files = {name: checksum for name, checksum in manifest["checksums"].items() if name in FEATURIZER_FILES}
+        blob = json.dumps([manifest["featurizer"], manifest["vectorizer"], files], sort_keys=True)
+        return hashlib.sha256(blob.encode('utf-8')).hexdigest()[:12]
+
+    def load(self, version):
+        """(vectorizer, dept_model, urgency_model) of a verified version (weights memory-mapped)"""
+        corrupted = self.verify(version)
+        if corrupted:
+            raise ValueError(f"Model version {version!r} failed its checksums: {', '.join(corrupted)}")
+        return load_artifacts(self.version_dir(version), verify=False)
+
+    # --- Pointers ---
+
+    def pointers(self):
+        try:
+            with open(self.pointers_path, encoding='utf-8') as fh:
+                return json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return {"current": None, "previous": None, "candidate": None}
+
+    def _write_pointers(self, pointers):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = f"{self.pointers_path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            json.dump(dict(pointers, updated_at=time.time()), fh, indent=2)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.pointers_path)
+
+    def current_version(self):
+        return self.pointers().get("current")
+
+    def promote(self, version):
+        """Makes `version` the one served (after checking it); the old one becomes "previous" """
+        if self.verify(version):
+            raise ValueError(f"Model version {version!r} failed its checksums")
+        with self._lock:
+            pointers = self.pointers()
+            if pointers.get("current") != version:
+                pointers["previous"], pointers["current"] = pointers.get("current"), version
+            if pointers.get("candidate") == version:
+                pointers["candidate"] = None
+            self._write_pointers(pointers)
+
+    def rollback(self):
+        """Serves the previous version again; returns it"""
+        previous = self.pointers().get("previous")
+        if previous is None:
+            raise ValueError("No previous model version to roll back to")
+        self.promote(previous)
+        return previous
+
+    def set_candidate(self, version):
+        """Version to shadow-score live traffic with (None to stop)"""
+        if version is not None and self.verify(version):
+            raise ValueError(f"Model version {version!r} failed its checksums")
+        with self._lock:
+            self._write_pointers(dict(self.pointers(), candidate=version))
+
+
+class ServedModels:
+    """One loaded model version: the sklearn models, the fused classifier and its similar-ticket index"""
+
+    def __init__(self, version, models, featurizer_key=None):
+        self.version = version
+        self.models = models
+        self.featurizer_key = featurizer_key
+        self.loaded_at = time.time()
+        try:
+            self.fast_classifier = FastTicketClassifier(*models)
+        except ValueError:
+            self.fast_classifier = None
+        self._similar_index = None
+        self._lock = threading.Lock()
+
+    def classify(self, ticket_text):
+        """(classification, vector) for one ticket, through the fused engine when supported"""
+        if self.fast_classifier is not None:
+            classification, vector = self.fast_classifier.classify(ticket_text, return_vector=True)
+            classification.pop("dept_proba")
+            classification.pop("urgency_proba")
+            return classification, vector
+        vector, (classification,) = classify_texts([ticket_text], self.models)
+        return classification, vector
+
+    def similar_index(self):
+        """Near-duplicate index in this version's feature space (one file per featurizer)"""
+        with self._lock:
+            if self._similar_index is None:
+                key = self.featurizer_key
+                path = DEFAULT_INDEX_PATH if key is None else f"similar_tickets-{key}.pkl"
+                self._similar_index = SimilarTicketIndex.load(self.models[0], path=path)
+            return self._similar_index
+
+
+class ShadowStats:
+    """Shadow scoring counters; updated by request threads (drops) and the shadow thread (scores)"""
+
+    def __init__(self, candidate=None):
+        self.candidate = candidate
+        self.scored = 0
+        self.dropped = 0
+        self.agree = {"department": 0, "urgency": 0}
+        self.primary_ms = deque(maxlen=SHADOW_WINDOW)
+        self.candidate_ms = deque(maxlen=SHADOW_WINDOW)
+        self._lock = threading.Lock()
+
+    def record_drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    def record_score(self, primary, shadow, primary_seconds, candidate_seconds):
+        with self._lock:
+            self.candidate_ms.append(candidate_seconds * 1000)
+            if primary_seconds is not None:
+                self.primary_ms.append(primary_seconds * 1000)
+            self.scored += 1
+            for head in ("department", "urgency"):
+                self.agree[head] += shadow[head] == primary[head]
+
+    def report(self, active_version=None):
+        def pct(values, q):
+            return round(float(np.percentile(values, q)), 3) if values else None
+
+        with self._lock:
+            scored, dropped, agree = self.scored, self.dropped, dict(self.agree)
+            primary_ms, candidate_ms = list(self.primary_ms), list(self.candidate_ms)
+        return {
+            "active": active_version,
+            "candidate": self.candidate,
+            "scored": scored,
+            "dropped": dropped,
+            "department_agreement": round(agree["department"] / scored, 4) if scored else None,
+            "urgency_agreement": round(agree["urgency"] / scored, 4) if scored else None,
+            "primary_p50_ms": pct(primary_ms, 50),
+            "candidate_p50_ms": pct(candidate_ms, 50),
+            "candidate_p95_ms": pct(candidate_ms, 95),
+        }
+
+
+def load_current_models(root=DEFAULT_REGISTRY_DIR):
+    """
+    (version, models) of the registry's current version, or (None, load_models()) while it
+    has none: what ModelServer would serve, for one-shot tools (batch_classify, benchmarks)
+    """
+    registry = ModelRegistry(root)
+    version = registry.current_version()
+    if version is None:
+        return None, load_models()
+    return version, registry.load(version)
+
+
+class ModelServer:
+    """
+    Serves the registry's current version (or, while the registry is empty, the models
+    load_models() finds) and hot-swaps to newly promoted versions.
+    """
+
+    def __init__(self, registry=None, poll_interval=POLL_INTERVAL, shadow_queue_size=SHADOW_QUEUE_SIZE):
+        self.registry = registry or ModelRegistry()
+        self.poll_interval = poll_interval
+        current = self.registry.current_version()
+        self.active = self._load(current) if current else ServedModels(None, load_models())
+        self.candidate = None
+        self.shadow_stats = ShadowStats()
+        self._failed = {}  # version -> (failed attempts, monotonic time of the next attempt)
+        self._shadow_queue = queue.Queue(maxsize=shadow_queue_size)
+        self._stop = threading.Event()
+        self._threads = [threading.Thread(target=self._watch, name="model-watcher", daemon=True),
+                         threading.Thread(target=self._shadow_loop, name="model-shadow", daemon=True)]
+
+    def start(self):
+        self.refresh()
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def get(self):
+        """The ServedModels to use for one request (keep it for the whole request)"""
+        return self.active
+
+    def _load(self, version):
+        served = ServedModels(version, self.registry.load(version), self.registry.featurizer_key(version))
+        for text in WARMUP_TEXTS:  # first-call costs (page faults on the mmap, lazy init) paid here
+            served.classify(text)
+        return served
+
+    def _due(self, version, now):
+        """False while a version that failed to load waits for its next attempt"""
+        return version not in self._failed or now >= self._failed[version][1]
+
+    def _load_failed(self, version, now):
+        """Schedules the next attempt at `version`; returns the delay in seconds"""
+        attempts = self._failed.get(version, (0, now))[0] + 1
+        delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+        self._failed[version] = (attempts, now + delay)
+        return delay
+
+    def refresh(self):
+        """Loads and swaps in the current / candidate versions if the pointers changed"""
+        pointers = self.registry.pointers()
+        current, candidate = pointers.get("current"), pointers.get("candidate")
+        now = time.monotonic()
+        if current and current != self.active.version and self._due(current, now):
+            try:
+                served = self._load(current)
+            except Exception as e:
+                delay = self._load_failed(current, now)
+                log.error("Model version %s not loaded (retrying in %.0f s), still serving %s: %s",
+                          current, delay, self.active.version, e)
+            else:
+                self._failed.pop(current, None)
+                self.active = served
+                metrics.REGISTRY.inc('model_swaps_total')
+                log.info("Now serving model version %s", current)
+
+        served_candidate = self.candidate.version if self.candidate is not None else None
+        if candidate != served_candidate and self._due(candidate, now):
+            try:
+                self.candidate = self._load(candidate) if candidate else None
+            except Exception as e:
+                delay = self._load_failed(candidate, now)
+                log.error("Shadow candidate %s not loaded (retrying in %.0f s): %s", candidate, delay, e)
+            else:
+                self._failed.pop(candidate, None)
+                self.shadow_stats = ShadowStats(candidate)
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception:  # keep watching; the served version is unaffected
+                log.exception("Model registry check failed")
+
+    # --- Shadow scoring ---
+
+    def shadow(self, ticket_text, served, classification, latency=None):
+        """
+        Queues a request served by `served` (its classification and, if known, latency in seconds)
+        for scoring by the candidate. Never blocks; drops the request when the queue is full.
+        """
+        candidate = self.candidate
+        if candidate is None or candidate.version == served.version:
+            return
+        try:
+            self._shadow_queue.put_nowait((ticket_text, classification, latency, self.shadow_stats))
+        except queue.Full:
+            self.shadow_stats.record_drop()
+
+    def _shadow_loop(self):
+        while not self._stop.is_set():
+            try:
+                ticket_text, primary, latency, stats = self._shadow_queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            candidate = self.candidate
+            if candidate is None or stats is not self.shadow_stats:  # candidate changed meanwhile
+                continue
+            start = time.perf_counter()
+            try:
+                shadow, _ = candidate.classify(ticket_text)
+            except Exception:
+                metrics.REGISTRY.inc('shadow_errors_total')
+                continue
+            stats.record_score(primary, shadow, latency, time.perf_counter() - start)
+
+    def shadow_report(self):
+        return self.shadow_stats.report(self.active.version)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Versioned model registry")
+    parser.add_argument('--root', default=DEFAULT_REGISTRY_DIR)
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list', help="Published versions and the pointers")
+    publish = sub.add_parser('publish', help="Publish the .pkl models of the current directory")
+    publish.add_argument('--version', default=None)
+    publish.add_argument('--promote', action='store_true')
+    sub.add_parser('promote', help="Serve a version").add_argument('version')
+    sub.add_parser('rollback', help="Serve the previous version again")
+    candidate = sub.add_parser('candidate', help="Shadow-score a version")
+    candidate.add_argument('version', nargs='?')
+    candidate.add_argument('--clear', action='store_true')
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.root)
+    if args.command == 'publish':
+        version = registry.publish(*load_pickled_models(), version=args.version, promote=args.promote)
+        print(f"✅ Published model version {version}" + (" (now serving)" if args.promote else ""))
+    elif args.command == 'promote':
+        registry.promote(args.version)
+        print(f"✅ Serving model version {args.version}")
+    elif args.command == 'rollback':
+        print(f"↩️ Rolled back to model version {registry.rollback()}")
+    elif args.command == 'candidate':
+        registry.set_candidate(None if args.clear else args.version)
+        print("✅ Shadow scoring " + ("stopped" if args.clear else f"with {args.version}"))
+
+    pointers = registry.pointers()
+    print(f"\n📦 Current: {pointers.get('current')} | previous: {pointers.get('previous')} | "
+          f"candidate: {pointers.get('candidate')}")
+    for v in registry.versions():
+        published = time.strftime('%Y-%m-%d %H:%M', time.localtime(v['published_at'])) if v['published_at'] else "?"
+        scores = ", ".join(f"{k} {val:.3f}" for k, val in v['metrics'].items())
+        print(f"   {v['version']:<20} {v.get('featurizer', '?'):<8} {published}  {scores}")
+
+
+if __name__ == "__main__":
+    main()
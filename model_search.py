@@ -0,0 +1,207 @@
+import itertools
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import train_test_split
+
+from featurizers import build_featurizer
+
+# Parallel model selection for train_models.py --search.
+#
+# Every featurizer setting is fitted once in the parent process and its train/test
+# matrices are written as raw CSR arrays (.npy) to a scratch directory. Worker
+# processes memory-map those arrays instead of receiving a pickled copy, then fit
+# and score one classifier setting for both heads. Each candidate reports fit time,
+# per-ticket inference latency (featurizer + both heads) and macro-F1.
+#
+# Latencies measured in the pool compete with the other workers for CPU, so they are
+# only kept for reference ("pool_latency_ms"). After the pool, the best candidates are
+# refitted and timed one at a time in the parent ("latency_ms"), best macro-F1 first,
+# until one fits the latency budget.
+
+LABELS = ('department', 'urgency')
+
+FEATURIZER_GRID = [
+    {"mode": "tfidf", "max_features": 5000},
+    {"mode": "tfidf", "max_features": 20000, "ngram_range": (1, 2)},
+    {"mode": "tfidf", "max_features": 5000, "sublinear_tf": True},
+    {"mode": "hashing", "n_features": 2 ** 16},
+    {"mode": "hashing", "n_features": 2 ** 18, "ngram_range": (1, 2)},
+]
+
+CLASSIFIER_GRID = [
+    {"estimator": "LogisticRegression", "C": 0.1},
+    {"estimator": "LogisticRegression", "C": 1.0},
+    {"estimator": "LogisticRegression", "C": 10.0},
+    {"estimator": "SGDClassifier", "alpha": 1e-5},
+    {"estimator": "SGDClassifier", "alpha": 1e-4},
+]
+
+
+def build_classifier(config):
+    params = {k: v for k, v in config.items() if k != 'estimator'}
+    if config['estimator'] == 'LogisticRegression':
+        return LogisticRegression(max_iter=1000, **params)
+    return SGDClassifier(loss='log_loss', random_state=42, **params)
+
+
+def _build_featurizer(config):
+    params = {k: v for k, v in config.items() if k != 'mode'}
+    return build_featurizer(config['mode'], **params)
+
+
+def _median_ms(fn, items):
+    times = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        times.append((time.perf_counter() - start) * 1000)
+    return float(np.median(times))
+
+
+# --- Shared matrices (parent writes, workers memory-map) ---
+
+def _save_csr(directory, name, X):
+    X = X.tocsr()
+    for part in ('data', 'indices', 'indptr'):
+        np.save(os.path.join(directory, f'{name}_{part}.npy'), getattr(X, part))
+    np.save(os.path.join(directory, f'{name}_shape.npy'), np.array(X.shape))
+
+
+def _load_csr(directory, name):
+    parts = [np.load(os.path.join(directory, f'{name}_{part}.npy'), mmap_mode='r')
+             for part in ('data', 'indices', 'indptr')]
+    shape = tuple(np.load(os.path.join(directory, f'{name}_shape.npy')))
+    return sp.csr_matrix(tuple(parts), shape=shape, copy=False)
+
+
+_worker_dir = None
+
+
+def _init_worker(shared_dir):
+    global _worker_dir
+    _worker_dir = shared_dir
+
+
+def _fit_heads(directory, featurizer_id, classifier_config):
+    """Fits one classifier setting for both heads; returns ({label: model}, X_test, fit seconds)"""
+    X_train = _load_csr(directory, f'f{featurizer_id}_train')
+    models, fit_seconds = {}, 0.0
+    for label in LABELS:
+        y_train = np.load(os.path.join(directory, f'y_{label}_train.npy'), mmap_mode='r')
+        models[label] = build_classifier(classifier_config)
+        start = time.perf_counter()
+        models[label].fit(X_train, y_train)
+        fit_seconds += time.perf_counter() - start
+    return models, _load_csr(directory, f'f{featurizer_id}_test'), fit_seconds
+
+
+def _predict_ms(models, X_test, n_latency_samples=100):
+    """Median per-ticket predict_proba time of both heads"""
+    rows = [X_test[i] for i in range(min(n_latency_samples, X_test.shape[0]))]
+    return sum(_median_ms(model.predict_proba, rows) for model in models.values())
+
+
+def _evaluate_candidate(featurizer_id, classifier_config):
+    """Runs in a worker: fit + score one classifier setting on one featurizer's matrices"""
+    models, X_test, fit_seconds = _fit_heads(_worker_dir, featurizer_id, classifier_config)
+    result = {"fit_seconds": round(fit_seconds, 3), "predict_ms": _predict_ms(models, X_test)}
+    for label, model in models.items():
+        y_test = np.load(os.path.join(_worker_dir, f'y_{label}_test.npy'), mmap_mode='r')
+        predictions = model.predict(X_test)
+        result[f"{label}_macro_f1"] = round(f1_score(y_test, predictions, average='macro'), 4)
+        result[f"{label}_accuracy"] = round(accuracy_score(y_test, predictions), 4)
+    return result
+
+
+def candidate_grid(n_iter=None, seed=42):
+    """All (featurizer, classifier) settings, or a random sample of `n_iter` of them"""
+    grid = list(itertools.product(range(len(FEATURIZER_GRID)), CLASSIFIER_GRID))
+    if n_iter is not None and n_iter < len(grid):
+        grid = random.Random(seed).sample(grid, n_iter)
+    return grid
+
+
+def _measure_serially(shared_dir, grid_results, transform_ms, latency_budget_ms=None, verbose=True):
+    """
+    Times candidates one at a time, best macro-F1 first, until one is within the budget
+    (without a budget: just the best). Sets their "latency_ms"; the others keep None.
+    """
+    for f, result in sorted(grid_results, key=lambda item: (-item[1]['macro_f1'], item[1]['pool_latency_ms'])):
+        models, X_test, _ = _fit_heads(shared_dir, f, result['classifier'])
+        result['latency_ms'] = round(transform_ms[f] + _predict_ms(models, X_test), 4)
+        if verbose:
+            print(f"   {result['latency_ms']:.3f} ms/ticket measured alone | macro-F1 {result['macro_f1']:.3f} | "
+                  f"{result['featurizer']} + {result['classifier']}")
+        if latency_budget_ms is None or result['latency_ms'] <= latency_budget_ms:
+            return
+
+
+def run_search(df, n_jobs=None, n_iter=None, latency_budget_ms=None, verbose=True):
+    """
+    Evaluates the candidate grid in a process pool.
+    Returns one dict per candidate, including "macro_f1" (mean over both heads),
+    "pool_latency_ms" (featurizer + both heads, median per ticket, timed in the busy pool)
+    and "latency_ms" (the same, timed alone afterwards; None for the candidates that
+    didn't need it, see _measure_serially).
+    """
+    texts = df['ticket_text'].astype(str).to_numpy()
+    train_idx, test_idx = train_test_split(np.arange(len(df)), test_size=0.2, random_state=42)
+    grid = candidate_grid(n_iter)
+    featurizer_ids = sorted({f for f, _ in grid})
+
+    with tempfile.TemporaryDirectory(prefix='model_search_') as shared_dir:
+        for label in LABELS:
+            _, y = np.unique(df[label].astype(str).to_numpy(), return_inverse=True)  # integer class codes
+            np.save(os.path.join(shared_dir, f'y_{label}_train.npy'), y[train_idx])
+            np.save(os.path.join(shared_dir, f'y_{label}_test.npy'), y[test_idx])
+
+        transform_ms = {}
+        for f in featurizer_ids:
+            if verbose:
+                print(f"⏳ Featurizing with {FEATURIZER_GRID[f]}...")
+            featurizer = _build_featurizer(FEATURIZER_GRID[f])
+            _save_csr(shared_dir, f'f{f}_train', featurizer.fit_transform(texts[train_idx]))
+            _save_csr(shared_dir, f'f{f}_test', featurizer.transform(texts[test_idx]))
+            transform_ms[f] = _median_ms(lambda t: featurizer.transform([t]), texts[test_idx][:100])
+
+        if verbose:
+            print(f"⏳ Evaluating {len(grid)} candidates on {n_jobs or os.cpu_count()} processes...")
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(shared_dir,)) as pool:
+            futures = [pool.submit(_evaluate_candidate, f, clf) for f, clf in grid]
+            results = []
+            for (f, clf), future in zip(grid, futures):
+                result = future.result()
+                result.update(
+                    featurizer=FEATURIZER_GRID[f],
+                    classifier=clf,
+                    pool_latency_ms=round(transform_ms[f] + result.pop("predict_ms"), 4),
+                    latency_ms=None,
+                    macro_f1=round(np.mean([result[f"{label}_macro_f1"] for label in LABELS]), 4),
+                )
+                results.append(result)
+                if verbose:
+                    print(f"   macro-F1 {result['macro_f1']:.3f} | {result['pool_latency_ms']:.3f} ms/ticket in pool | "
+                          f"fit {result['fit_seconds']:.1f}s | {FEATURIZER_GRID[f]} + {clf}")
+
+        if verbose:
+            print("⏳ Timing the best candidates one at a time...")
+        _measure_serially(shared_dir, [(f, r) for (f, _), r in zip(grid, results)], transform_ms,
+                          latency_budget_ms, verbose)
+    return results
+
+
+def select_best(results, latency_budget_ms=None):
+    """Highest macro-F1 among candidates timed alone within the latency budget (None if none qualify)"""
+    eligible = [r for r in results if r['latency_ms'] is not None
+                and (latency_budget_ms is None or r['latency_ms'] <= latency_budget_ms)]
+    if not eligible:
+        return None
+    return max(eligible, key=lambda r: (r['macro_f1'], -r['latency_ms']))
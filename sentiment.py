@@ -0,0 +1,206 @@
+import argparse
+import math
+import re
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+# Lexicon-based sentiment scoring.
+#
+# A weighted lexicon (single words, "prefix*" wildcards and multi-word phrases) is
+# compiled once into hash lookups, so each ticket is scored in one pass over its tokens
+# and the cost per token does not depend on how many entries the lexicon has. Terms
+# only match whole tokens ("hate" does not fire on "whatever"), and a negation word
+# ("not", "never", "don't", ...) flips terms in the next few tokens of the same clause.
+#
+# Batches are scored together: every ticket becomes a row of sparse term counts
+# (plain and negated columns) and one sparse product with the weights scores them all.
+#
+# Usage:
+#   python sentiment.py --benchmark        # throughput vs. lexicon size
+
+DEFAULT_LEXICON = {
+    # negative
+    "angry": -2.5, "frustrated": -2.0, "frustrating": -2.0, "terrible": -3.0, "worst": -3.0,
+    "hate": -3.0, "hated": -3.0, "furious": -3.0, "disappointed": -2.0, "disappointing": -2.0,
+    "awful": -3.0, "horrible": -3.0, "useless": -2.5, "unacceptable": -3.0, "ridiculous": -2.0,
+    "annoyed": -2.0, "annoying": -2.0, "upset": -2.0, "broken": -1.5, "fail*": -1.5, "scam": -3.0,
+    "waste": -2.0, "poor": -1.5, "bad": -2.0, "sucks": -2.5, "complain*": -1.5,
+    "rip off": -3.0, "fed up": -2.5, "not working": -1.5,
+    # positive
+    "thank*": 2.0, "appreciate*": 2.0, "great": 2.0, "excellent": 3.0, "love": 3.0, "loved": 3.0,
+    "happy": 2.0, "pleased": 2.0, "awesome": 3.0, "amazing": 3.0, "helpful": 2.0, "glad": 2.0,
+    "perfect": 3.0, "good": 1.5, "satisfied": 2.0, "wonderful": 3.0, "quick": 1.0, "resolved": 1.5,
+}
+
+NEGATIONS = frozenset([
+    "not", "no", "never", "none", "nobody", "nothing", "neither", "nor", "without", "hardly", "barely",
+    "cannot", "cant", "dont", "doesnt", "didnt", "isnt", "wasnt", "arent", "werent", "wont", "wouldnt",
+    "shouldnt", "couldnt", "havent", "hasnt", "hadnt", "aint",
+])
+NEGATION_SCALE = -0.74  # a negated term counts as -0.74 x its weight (as in VADER)
+NEGATION_WINDOW = 3     # tokens after a negation that it applies to
+NORMALIZATION_ALPHA = 15
+POSITIVE_THRESHOLD = 0.05
+NEGATIVE_THRESHOLD = -0.05
+
+LABEL_ICONS = {"Positive": "🟢", "Negative": "🔴", "Neutral": "🟡"}
+
+# Words (with "n't" folded into the word), or clause-ending punctuation
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?|[.!?;:,]")
+_CLAUSE_BREAKS = frozenset(".!?;:,")
+
+
+def load_lexicon(path):
+    """
+    Reads a tab-separated lexicon: `term<TAB>weight` per line (extra columns, as in
+    VADER's vader_lexicon.txt, are ignored). Terms may be phrases or end in `*`.
+    """
+    lexicon = {}
+    with open(path, encoding='utf-8') as fh:
+        for line in fh:
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) < 2 or not parts[0] or parts[0].startswith('#'):
+                continue
+            lexicon[parts[0].lower()] = float(parts[1])
+    return lexicon
+
+
+def _tokenize(text):
+    return [t.replace("'", "") for t in _TOKEN_RE.findall(text.lower())]
+
+
+class SentimentAnalyzer:
+    """Compiled lexicon matcher; score() for one ticket, score_batch() for many"""
+
+    def __init__(self, lexicon=None, negation_window=NEGATION_WINDOW, negation_scale=NEGATION_SCALE):
+        lexicon = DEFAULT_LEXICON if lexicon is None else lexicon
+        self.negation_window = negation_window
+
+        compiled = {}  # normalized term -> weight
+        for term, weight in lexicon.items():
+            key = " ".join(_tokenize(term.rstrip('*')))
+            if key:
+                compiled[key + ('*' if term.endswith('*') else '')] = float(weight)
+
+        self.terms = list(compiled)  # column j (plain) / j + len(terms) (negated) of the count matrix
+        self.words, self.prefixes, self.phrases = {}, {}, {}
+        for index, term in enumerate(self.terms):
+            tokens = term.rstrip('*').split()
+            if len(tokens) > 1:
+                self.phrases[tuple(tokens)] = index
+            elif term.endswith('*'):
+                self.prefixes[tokens[0]] = index
+            else:
+                self.words[tokens[0]] = index
+        weights = np.fromiter(compiled.values(), dtype=np.float64, count=len(compiled))
+        self.weights = np.concatenate([weights, weights * negation_scale])
+        self.prefix_lengths = sorted({len(p) for p in self.prefixes}, reverse=True)
+        self.phrase_lengths = sorted({len(p) for p in self.phrases}, reverse=True)
+        self.phrase_starts = {p[0] for p in self.phrases}
+
+    def _match(self, tokens, i):
+        """(term index, tokens consumed) for the lexicon entry starting at tokens[i], or (None, 1)"""
+        token = tokens[i]
+        if token in self.phrase_starts:
+            for n in self.phrase_lengths:
+                index = self.phrases.get(tuple(tokens[i:i + n]))
+                if index is not None:
+                    return index, n
+        index = self.words.get(token)
+        if index is not None:
+            return index, 1
+        for n in self.prefix_lengths:
+            if n <= len(token):
+                index = self.prefixes.get(token[:n])
+                if index is not None:
+                    return index, 1
+        return None, 1
+
+    def term_columns(self, text):
+        """Matched lexicon columns for one text (negated matches offset by the lexicon size)"""
+        tokens = _tokenize(text)
+        n_terms = len(self.terms)
+        columns = []
+        negated_until = -1
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            if token in _CLAUSE_BREAKS:
+                negated_until = -1
+                i += 1
+                continue
+            index, consumed = self._match(tokens, i)
+            if index is not None:
+                columns.append(index + n_terms if i <= negated_until else index)
+            elif token in NEGATIONS:
+                negated_until = i + self.negation_window
+            i += consumed
+        return columns
+
+    def count_matrix(self, texts):
+        """CSR matrix of lexicon matches: one row per text, 2 x lexicon-size columns"""
+        indptr, indices = [0], []
+        for text in texts:
+            indices.extend(self.term_columns(text))
+            indptr.append(len(indices))
+        data = np.ones(len(indices), dtype=np.float64)
+        return sp.csr_matrix((data, indices, indptr), shape=(len(texts), len(self.weights)))
+
+    def score_batch(self, texts):
+        """
+        Scores a batch of tickets. Returns (scores, labels): scores in [-1, 1]
+        (normalized sum of matched weights), labels Positive / Negative / Neutral.
+        """
+        raw = self.count_matrix(texts) @ self.weights
+        scores = raw / np.sqrt(raw * raw + NORMALIZATION_ALPHA)
+        labels = np.where(scores >= POSITIVE_THRESHOLD, "Positive",
+                          np.where(scores <= NEGATIVE_THRESHOLD, "Negative", "Neutral"))
+        return scores, labels.tolist()
+
+    def score(self, text):
+        """(score, label) for one ticket"""
+        raw = float(sum(self.weights[j] for j in self.term_columns(text)))
+        score = raw / math.sqrt(raw * raw + NORMALIZATION_ALPHA)
+        if score >= POSITIVE_THRESHOLD:
+            return score, "Positive"
+        if score <= NEGATIVE_THRESHOLD:
+            return score, "Negative"
+        return score, "Neutral"
+
+
+def _synthetic_lexicon(size, seed=0):
+    rng = np.random.default_rng(seed)
+    lexicon = dict(DEFAULT_LEXICON)
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    while len(lexicon) < size:
+        word = "".join(rng.choice(letters, rng.integers(5, 10)))
+        if rng.random() < 0.1:
+            word += " " + "".join(rng.choice(letters, rng.integers(4, 8)))
+        lexicon[word] = float(rng.uniform(-3, 3))
+    return lexicon
+
+
+if __name__ == "__main__":
+    from model_artifacts import _sample_texts
+
+    parser = argparse.ArgumentParser(description="Lexicon sentiment engine")
+    parser.add_argument('--benchmark', action='store_true', help="Throughput for growing lexicon sizes")
+    parser.add_argument('--lexicon', default=None, help="Tab-separated lexicon file to use instead of the default")
+    args = parser.parse_args()
+
+    texts = _sample_texts()
+    if args.benchmark:
+        for size in (len(DEFAULT_LEXICON), 1_000, 10_000, 100_000):
+            analyzer = SentimentAnalyzer(_synthetic_lexicon(size))
+            start = time.perf_counter()
+            analyzer.score_batch(texts)
+            seconds = time.perf_counter() - start
+            print(f"⏱️ {len(analyzer.terms):>7} lexicon entries: {len(texts) / seconds:,.0f} tickets/s")
+    else:
+        analyzer = SentimentAnalyzer(load_lexicon(args.lexicon) if args.lexicon else None)
+        scores, labels = analyzer.score_batch(texts)
+        for label in LABEL_ICONS:
+            print(f"{LABEL_ICONS[label]} {label}: {labels.count(label)}")
+        print(f"   mean score {float(np.mean(scores)):+.3f} over {len(texts)} tickets")
@@ -0,0 +1,210 @@
+import logging
+import os
+import threading
+import time
+
+import joblib
+import numpy as np
+import scipy.sparse as sp
+
+# Near-duplicate lookup over the TF-IDF vectors of already answered tickets.
+# If a new ticket is close enough (cosine similarity) to a past ticket routed to the
+# same department, that ticket's summary + response can be reused instead of calling the LLM.
+#
+# Vectors are kept per department as inverted indexes (terms x tickets, CSR), so a
+# lookup only touches the posting lists of the query's terms. New tickets land in a
+# small pending buffer that is folded into a "tail" index every `merge_every` inserts;
+# the tail is merged into the main index once it reaches 1/8 of its size, which keeps
+# insert cost amortized O(1) per ticket.
+#
+# Saving copies the matrices (not the data) under the lock and does the full merge and
+# dump outside it, into a temp file that replaces the index file atomically; checkpoint()
+# runs that in a background thread at most every `min_interval` seconds, so neither
+# queries nor the caller wait on it. Processes sharing an index file never see a torn
+# file, but the last one to save wins.
+
+DEFAULT_THRESHOLD = 0.9
+DEFAULT_INDEX_PATH = 'similar_tickets.pkl'
+CHECKPOINT_EVERY = 25
+CHECKPOINT_MIN_INTERVAL = 30.0
+
+log = logging.getLogger(__name__)
+
+
+def _empty_inverted(n_features):
+    return sp.csr_matrix((n_features, 0), dtype=np.float64)
+
+
+def _add_inverted_scores(inverted, vector, out):
+    """out += inverted[vector terms].T @ vector weights, gathering posting lists directly"""
+    starts = inverted.indptr[vector.indices]
+    lengths = inverted.indptr[vector.indices + 1] - starts
+    total = lengths.sum()
+    if not total:
+        return
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(total)
+    weights = inverted.data[offsets] * np.repeat(vector.data, lengths)
+    out += np.bincount(inverted.indices[offsets], weights=weights, minlength=len(out))
+
+
+class _DepartmentShard:
+    def __init__(self, n_features):
+        self.n_features = n_features
+        self.main = _empty_inverted(n_features)
+        self.tail = _empty_inverted(n_features)
+        self.pending = []
+        self._pending_matrix = None
+        self.payloads = []
+
+    def __len__(self):
+        return len(self.payloads)
+
+    def copy(self):
+        """Shallow copy for saving: the matrices are never modified in place, so sharing them is safe"""
+        shard = _DepartmentShard(self.n_features)
+        shard.main, shard.tail, shard.pending, shard.payloads = (self.main, self.tail, list(self.pending),
+                                                                 list(self.payloads))
+        return shard
+
+    def add(self, vector, payload):
+        self.pending.append(vector)
+        self._pending_matrix = None
+        self.payloads.append(payload)
+
+    def merge(self, force=False):
+        if self.pending:
+            new_rows = sp.vstack(self.pending, format='csr')
+            self.tail = sp.hstack([self.tail, new_rows.T], format='csr')
+            self.pending = []
+            self._pending_matrix = None
+        if self.tail.shape[1] and (force or self.tail.shape[1] * 8 >= max(self.main.shape[1], 1024)):
+            self.main = sp.hstack([self.main, self.tail], format='csr')
+            self.tail = _empty_inverted(self.n_features)
+
+    def scores(self, vector):
+        """Cosine similarity of `vector` (1 x n_features, L2-normalized) to every stored ticket"""
+        n_main, n_tail = self.main.shape[1], self.tail.shape[1]
+        out = np.zeros(len(self.payloads))
+        if vector.nnz:
+            _add_inverted_scores(self.main, vector, out[:n_main])
+            _add_inverted_scores(self.tail, vector, out[n_main:n_main + n_tail])
+        if self.pending:
+            if self._pending_matrix is None:
+                self._pending_matrix = sp.vstack(self.pending, format='csr')
+            out[n_main + n_tail:] = self._pending_matrix @ vector.toarray().ravel()
+        return out
+
+
+class SimilarTicketIndex:
+    """Incremental nearest-neighbour index over TF-IDF ticket vectors"""
+
+    def __init__(self, vectorizer, threshold=DEFAULT_THRESHOLD, merge_every=64, path=DEFAULT_INDEX_PATH):
+        self.vectorizer = vectorizer
+        self.path = path  # where save() / checkpoint() write by default
+        self.threshold = threshold
+        self.merge_every = merge_every
+        self.shards = {}
+        self.unsaved = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # one save at a time
+        self._last_save = time.monotonic()
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards.values())
+
+    def _vector(self, text_or_vector):
+        if isinstance(text_or_vector, str):
+            text_or_vector = self.vectorizer.transform([text_or_vector])
+        vector = sp.csr_matrix(text_or_vector, dtype=np.float64)
+        vector.sum_duplicates()
+        return vector
+
+    def add(self, ticket_text, department, summary, response, ticket_id=None, vector=None):
+        """Stores an answered ticket. `vector` can be passed to skip re-vectorizing"""
+        vector = self._vector(ticket_text if vector is None else vector)
+        payload = {
+            "ticket_id": ticket_id,
+            "ticket_text": ticket_text,
+            "summary": summary,
+            "response": response,
+        }
+        with self._lock:
+            shard = self.shards.get(department)
+            if shard is None:
+                shard = self.shards[department] = _DepartmentShard(vector.shape[1])
+            shard.add(vector, payload)
+            self.unsaved += 1
+            if len(shard.pending) >= self.merge_every:
+                shard.merge()
+
+    def query(self, text_or_vector, department, threshold=None):
+        """
+        Returns the most similar stored ticket of the same department as
+        dict(payload, similarity=...) if it passes the threshold, else None.
+        """
+        threshold = self.threshold if threshold is None else threshold
+        vector = self._vector(text_or_vector)
+        with self._lock:
+            shard = self.shards.get(department)
+            if shard is None or not len(shard):
+                return None
+            scores = shard.scores(vector)
+            best = int(np.argmax(scores))
+            similarity = float(scores[best])
+            if similarity < threshold:
+                return None
+            return dict(shard.payloads[best], similarity=round(similarity, 4))
+
+    def save(self, path=None):
+        """Writes the index to `path` (default: self.path) atomically"""
+        with self._save_lock:
+            self._write(path or self.path)
+
+    def _write(self, path):
+        with self._lock:  # only the snapshot is taken under the query lock
+            shards = {department: shard.copy() for department, shard in self.shards.items()}
+            saved = self.unsaved
+        for shard in shards.values():
+            shard.merge(force=True)
+        tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        try:
+            joblib.dump({"threshold": self.threshold, "shards": shards}, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        with self._lock:
+            self.unsaved -= saved
+            self._last_save = time.monotonic()
+
+    def checkpoint(self, path=None, every=CHECKPOINT_EVERY, min_interval=CHECKPOINT_MIN_INTERVAL):
+        """
+        Starts a background save once at least `every` tickets were added and `min_interval`
+        seconds went by since the last save. Returns at once; does nothing while a save runs.
+        """
+        if self.unsaved < every or time.monotonic() - self._last_save < min_interval:
+            return False
+        if not self._save_lock.acquire(blocking=False):
+            return False
+        threading.Thread(target=self._background_save, args=(path or self.path,), name="similar-index-save",
+                         daemon=True).start()
+        return True
+
+    def _background_save(self, path):
+        try:
+            self._write(path)
+        except Exception as e:
+            log.warning("Similar-ticket index not saved to %s: %s", path, e)
+        finally:
+            self._save_lock.release()
+
+    @classmethod
+    def load(cls, vectorizer, path=DEFAULT_INDEX_PATH, **kwargs):
+        """Loads a saved index, or returns an empty one if `path` doesn't exist"""
+        index = cls(vectorizer, path=path, **kwargs)
+        if os.path.exists(path):
+            state = joblib.load(path)
+            index.shards = state["shards"]
+            if "threshold" not in kwargs:
+                index.threshold = state["threshold"]
+        return index
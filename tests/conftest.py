@@ -0,0 +1,58 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from featurizers import build_featurizer  # noqa: E402
+
+# Synthetic tickets for the tests: the department and urgency follow keywords, so small
+# models trained on a few hundred of them are accurate and deterministic.
+
+DEPARTMENT_TERMS = {
+    "Billing": ["invoice", "refund", "charged", "payment", "billing", "subscription"],
+    "Technical": ["router", "crash", "login", "password", "wifi", "error"],
+    "Returns": ["return", "damaged", "exchange", "package", "shipping", "replacement"],
+}
+URGENT_TERMS = ["immediately", "outage", "critical", "asap"]
+FILLER = ["please", "help", "account", "today", "issue", "customer", "order", "week", "team", "support"]
+# In the feature space, but in no training ticket: what feedback can teach the models
+UNUSED_TERMS = ["zorblax", "quuxnet"]
+
+
+def make_tickets(n, seed=0, extra_terms=()):
+    """(texts, departments, urgencies) of `n` synthetic tickets, each text unique"""
+    rng = np.random.default_rng(seed)
+    departments = list(DEPARTMENT_TERMS)
+    texts, labels, urgencies = [], [], []
+    for i in range(n):
+        department = departments[rng.integers(len(departments))]
+        urgent = rng.random() < 0.35
+        words = list(rng.choice(DEPARTMENT_TERMS[department], 3)) + list(rng.choice(FILLER, 4))
+        if urgent:
+            words += list(rng.choice(URGENT_TERMS, 2))
+        words += list(extra_terms)
+        rng.shuffle(words)
+        texts.append(" ".join(words) + f" case{seed}x{i}")
+        labels.append(department)
+        urgencies.append("Urgent" if urgent else "Normal")
+    return texts, labels, urgencies
+
+
+def train_models(mode='tfidf', n=600, seed=0):
+    """(vectorizer, dept_model, urgency_model) fitted on synthetic tickets"""
+    texts, departments, urgencies = make_tickets(n, seed)
+    vectorizer = build_featurizer(mode) if mode == 'tfidf' else build_featurizer(mode, n_features=2 ** 12)
+    vectorizer.fit(texts + UNUSED_TERMS)
+    X = vectorizer.transform(texts)
+    dept_model = LogisticRegression(max_iter=1000).fit(X, departments)
+    urgency_model = LogisticRegression(max_iter=1000).fit(X, urgencies)
+    return vectorizer, dept_model, urgency_model
+
+
+@pytest.fixture(scope='session')
+def tfidf_models():
+    return train_models('tfidf')
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from sklearn.linear_model import SGDClassifier
+
+from conftest import make_tickets, train_models
+from fast_inference import FastTicketClassifier, check_parity
+from model_artifacts import export_artifacts, load_artifacts
+
+EDGE_CASES = [
+    "",
+    "the and of",                                     # stop words only
+    "ROUTER Router router!!! crash, CRASH.",          # case, punctuation, repeated terms
+    "a b c invoice",                                  # single-character tokens are ignored
+    "never-seen-before words only xyzzy",             # out of vocabulary
+    "Refund refund refund asap, my invoice was charged twice (order #12345) immediately",
+    "wifi\tlogin\nerror\r\npassword",                  # whitespace variants
+    "café naïve résumé return exchange",              # non-ASCII
+]
+
+
+@pytest.fixture(scope='module', params=['tfidf', 'hashing'])
+def models(request):
+    return train_models(request.param)
+
+
+def _texts():
+    return make_tickets(200, seed=3)[0] + EDGE_CASES
+
+
+def _assert_same_as_sklearn(models, texts):
+    engine = FastTicketClassifier(*models)
+    vectorizer, dept_model, urgency_model = models
+    X = vectorizer.transform(texts)
+    for i, text in enumerate(texts):
+        result, vector = engine.classify(text, return_vector=True)
+        np.testing.assert_allclose(vector.toarray(), X[i].toarray(), rtol=0, atol=1e-12)
+        assert result['department'] == dept_model.predict(X[i])[0]
+        assert result['urgency'] == urgency_model.predict(X[i])[0]
+        np.testing.assert_allclose(result['dept_proba'], dept_model.predict_proba(X[i])[0], rtol=0, atol=1e-10)
+        np.testing.assert_allclose(result['urgency_proba'], urgency_model.predict_proba(X[i])[0], rtol=0, atol=1e-10)
+
+
+def test_matches_sklearn(models):
+    _assert_same_as_sklearn(models, _texts())
+
+
+def test_check_parity_reports_no_differences(models):
+    mismatches, max_diff = check_parity(models, _texts())
+    assert mismatches == 0
+    assert max_diff < 1e-10
+
+
+def test_matches_sklearn_for_sgd_heads(models):
+    """SGD models (train_models.py --out-of-core) score one-vs-rest"""
+    vectorizer = models[0]
+    texts, departments, urgencies = make_tickets(600, seed=0)
+    X = vectorizer.transform(texts)
+    heads = (SGDClassifier(loss='log_loss', random_state=0).fit(X, departments),
+             SGDClassifier(loss='log_loss', random_state=0).fit(X, urgencies))
+    _assert_same_as_sklearn((vectorizer, *heads), _texts())
+
+
+def test_matches_sklearn_from_memory_mapped_artifacts(models, tmp_path):
+    export_artifacts(*models, out_dir=str(tmp_path))
+    loaded = load_artifacts(str(tmp_path), mmap=True)
+    _assert_same_as_sklearn(loaded, _texts())
+    texts = _texts()
+    original, reloaded = FastTicketClassifier(*models), FastTicketClassifier(*loaded)
+    for text in texts:
+        np.testing.assert_allclose(reloaded.classify(text)['dept_proba'], original.classify(text)['dept_proba'],
+                                   rtol=0, atol=1e-12)
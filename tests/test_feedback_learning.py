@@ -0,0 +1,177 @@
+import numpy as np
+import pytest
+from sklearn.linear_model import SGDClassifier
+
+from conftest import UNUSED_TERMS, make_tickets
+from feedback_learning import (HOLDOUT_FEEDBACK_EVERY, PROMOTED, REVERTED, ROLLED_BACK, ROLLED_BACK_RETRIES,
+                               SKIPPED, URGENT, FeedbackStore, OnlineUpdater, incremental_fit)
+from model_registry import ModelRegistry
+
+# Tickets with this term are Urgent in the feedback, although nothing else marks them urgent
+RULE_TERM = UNUSED_TERMS[0]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = FeedbackStore(str(tmp_path / 'feedback.db'))
+    texts, departments, urgencies = make_tickets(700, seed=1)
+    store.add_examples(zip(texts[:500], departments[:500], urgencies[:500]), 'replay')
+    store.add_examples(zip(texts[500:], departments[500:], urgencies[500:]), 'holdout')
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def registry(tmp_path, tfidf_models):
+    registry = ModelRegistry(str(tmp_path / 'registry'))
+    registry.publish(*tfidf_models, version='v1', promote=True)
+    return registry
+
+
+def _normal_tickets(n, seed, extra_terms=(RULE_TERM,)):
+    """Tickets without urgent terms, so the models predict Normal for them"""
+    texts, _, urgencies = make_tickets(n * 3, seed, extra_terms=extra_terms)
+    return [t for t, u in zip(texts, urgencies) if u == "Normal"][:n]
+
+
+def _record_rule(store, n, seed, label=URGENT):
+    for text in _normal_tickets(n, seed):
+        store.record(text, "urgency", label, predicted="Normal")
+
+
+def _rule_accuracy(models, seed=99):
+    vectorizer, _, urgency_model = models
+    return float(np.mean(urgency_model.predict(vectorizer.transform(_normal_tickets(50, seed))) == URGENT))
+
+
+# --- incremental_fit ---
+
+def test_incremental_fit_learns_feedback_and_leaves_the_model_alone(tfidf_models):
+    vectorizer, _, urgency_model = tfidf_models
+    coef = urgency_model.coef_.copy()
+    texts = _normal_tickets(60, seed=5)
+    replay_texts, _, replay_urgencies = make_tickets(300, seed=6)
+    X = vectorizer.transform(texts + replay_texts)
+    y = [URGENT] * len(texts) + replay_urgencies
+    weights = np.array([3.0] * len(texts) + [1.0] * len(replay_texts))
+
+    updated = incremental_fit(urgency_model, X, y, weights)
+
+    assert updated is not urgency_model
+    np.testing.assert_array_equal(urgency_model.coef_, coef)
+    assert list(updated.classes_) == list(urgency_model.classes_)
+    assert np.mean(updated.predict(vectorizer.transform(texts)) == URGENT) > \
+        np.mean(urgency_model.predict(vectorizer.transform(texts)) == URGENT)
+
+
+def test_incremental_fit_rejects_a_sample_missing_a_class(tfidf_models):
+    vectorizer, dept_model, _ = tfidf_models
+    texts, departments, _ = make_tickets(50, seed=7)
+    keep = [i for i, d in enumerate(departments) if d != "Returns"]
+    with pytest.raises(ValueError, match="every class"):
+        incremental_fit(dept_model, vectorizer.transform([texts[i] for i in keep]), [departments[i] for i in keep],
+                        np.ones(len(keep)))
+
+
+def test_incremental_fit_uses_partial_fit_for_sgd(tfidf_models):
+    vectorizer = tfidf_models[0]
+    texts, _, urgencies = make_tickets(300, seed=8)
+    X = vectorizer.transform(texts)
+    model = SGDClassifier(loss='log_loss', random_state=0).fit(X, urgencies)
+    coef = model.coef_.copy()
+
+    updated = incremental_fit(model, X[:50], urgencies[:50], np.ones(50))
+
+    np.testing.assert_array_equal(model.coef_, coef)
+    assert not np.array_equal(updated.coef_, coef)
+
+
+# --- FeedbackStore ---
+
+def test_record_keeps_one_example_per_ticket_and_head(store):
+    first = store.record("My router is down", "urgency", URGENT, predicted="Normal", ticket_id="TKT-1")
+    assert store.record("My router is down", "urgency", URGENT, predicted="Normal", ticket_id="TKT-2") == first
+    assert store.record("  my ROUTER is down ", "urgency", URGENT, ticket_id="TKT-3") == first
+    store.record("My router is down", "department", "Technical", ticket_id="TKT-1")
+
+    relabelled = store.record("My router is down", "urgency", "Normal", ticket_id="TKT-1")
+
+    rows = store.feedback()
+    assert relabelled != first
+    assert sorted((r['head'], r['label']) for r in rows) == [("department", "Technical"), ("urgency", "Normal")]
+
+
+# --- OnlineUpdater ---
+
+def test_consistent_feedback_is_promoted(registry, store):
+    _record_rule(store, 60, seed=10)
+    before = _rule_accuracy(registry.load('v1'))
+
+    report = OnlineUpdater(registry, store, min_feedback=20, seed=0).run()
+
+    assert report['status'] == PROMOTED
+    assert report['new_version'] == f"v1+fb{store.last_feedback_id()}"
+    assert registry.current_version() == report['new_version']
+    assert _rule_accuracy(registry.load(report['new_version'])) > before
+    assert store.updates(limit=1)[0]['status'] == PROMOTED
+
+
+def test_too_little_feedback_waits_for_the_next_run(registry, store):
+    _record_rule(store, 5, seed=11)
+    report = OnlineUpdater(registry, store, min_feedback=20, seed=0).run()
+    assert report['status'] == SKIPPED
+    assert store.updates() == []
+    assert registry.current_version() == 'v1'
+
+
+def _record_flipped_departments(store, n, seed):
+    """Every ticket labelled with the wrong department"""
+    texts, departments, _ = make_tickets(n, seed)
+    wrong = {"Billing": "Returns", "Technical": "Billing", "Returns": "Technical"}
+    for text, department in zip(texts, departments):
+        store.record(text, "department", wrong[department], predicted=department)
+
+
+def test_harmful_feedback_is_rolled_back_and_retried_then_dropped(registry, store):
+    updater = OnlineUpdater(registry, store, min_feedback=20, seed=0)
+    _record_flipped_departments(store, 400, seed=12)
+
+    report = updater.run()
+    assert report['status'] == ROLLED_BACK
+    assert 'department' in report['reason']
+    assert registry.current_version() == 'v1'
+    assert [v['version'] for v in registry.versions()] == ['v1']
+
+    # Nothing new: the rejected examples aren't run again on their own
+    assert updater.run()['reason'] == "no new feedback since the rolled-back update"
+
+    # New feedback: the rejected examples are retried with it, ROLLED_BACK_RETRIES times at most
+    n_rejected = report['n_feedback']
+    for retry in range(1, ROLLED_BACK_RETRIES + 1):
+        _record_flipped_departments(store, 10, seed=100 + retry)
+        report = updater.run()
+        assert report['retry'] == retry
+        assert report['n_feedback'] > n_rejected
+        assert report['status'] == ROLLED_BACK
+
+    # Given up on: only what came after the last rolled-back run is used
+    last_rejected = store.updates(limit=1)[0]['last_feedback_id']
+    _record_flipped_departments(store, 30, seed=200)
+    report = updater.run()
+    assert report['retry'] == 0
+    assert report['n_feedback'] == len(store.feedback(after_id=last_rejected, holdout=False))
+
+
+def test_promoted_update_is_reverted_when_held_out_feedback_disagrees(registry, store):
+    updater = OnlineUpdater(registry, store, min_feedback=20, seed=0)
+    _record_rule(store, 60, seed=13)
+    promoted = updater.run()['new_version']
+    assert registry.current_version() == promoted
+
+    # Agents now mark such tickets Normal: the held-out part shows the update was wrong
+    _record_rule(store, 30 * HOLDOUT_FEEDBACK_EVERY, seed=14, label="Normal")
+
+    assert updater.check_last_update() == promoted
+    assert registry.current_version() == 'v1'
+    assert store.updates(limit=1)[0]['status'] == REVERTED
+    assert updater.check_last_update() is None
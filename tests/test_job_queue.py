@@ -0,0 +1,51 @@
+import pytest
+
+from job_queue import DONE, QUEUED, RUNNING, JobQueue
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'jobs.db')
+
+
+def _expire(queue, job_id):
+    queue._conn.execute("UPDATE jobs SET lease_until = 0 WHERE id = ?", (job_id,))
+
+
+def test_claims_most_urgent_then_oldest(path):
+    queue = JobQueue(path)
+    ids = [queue.submit("draft", {"n": i}, priority=p) for i, p in enumerate([3, 1, 3, 1])]
+    assert [queue.claim()['id'] for _ in ids] == [ids[1], ids[3], ids[0], ids[2]]
+    queue.close()
+
+
+def test_stale_worker_cannot_overwrite_the_new_run(path):
+    stale_worker, new_worker = JobQueue(path), JobQueue(path)
+    job_id = stale_worker.submit("draft", {"ticket": "router down"})
+    stale = stale_worker.claim()
+    _expire(stale_worker, job_id)  # the first worker stalled past its lease
+    fresh = new_worker.claim()
+    assert fresh['id'] == job_id and fresh['lease'] != stale['lease']
+
+    stale_worker.heartbeat([(job_id, stale['lease'])])
+    assert not stale_worker.complete(job_id, stale['lease'], {"draft": "stale"})
+    assert not stale_worker.fail(job_id, stale['lease'], "timed out")
+    assert new_worker.get(job_id)['status'] == RUNNING
+
+    assert new_worker.complete(job_id, fresh['lease'], {"draft": "fresh"})
+    assert not stale_worker.fail(job_id, stale['lease'], "timed out")  # DONE stays DONE
+    job = new_worker.get(job_id)
+    assert (job['status'], job['result']) == (DONE, {"draft": "fresh"})
+    stale_worker.close()
+    new_worker.close()
+
+
+def test_heartbeat_only_renews_held_leases(path):
+    queue = JobQueue(path, lease_seconds=60)
+    job_id = queue.submit("draft", {})
+    job = queue.claim()
+    _expire(queue, job_id)
+    queue.heartbeat([(job_id, job['lease'] + 1)])
+    assert queue.requeue_expired() == 1
+    assert queue.get(job_id)['status'] == QUEUED
+    queue.close()
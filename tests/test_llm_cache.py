@@ -0,0 +1,66 @@
+import sqlite3
+
+import pytest
+
+from llm_cache import LLMCache, cached_process_ticket, make_key
+from llm_module import build_prompt, estimate_tokens
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = LLMCache(str(tmp_path / 'cache.db'), max_memory_items=2, max_disk_items=10, evict_every=5)
+    yield cache
+    cache.close()
+
+
+def _disk_rows(cache):
+    return cache._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+
+def test_opens_in_wal_mode(cache):
+    assert cache._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_evicts_least_recently_used_every_n_puts(cache):
+    for i in range(14):
+        cache.put(f"key-{i}", "value")
+    assert _disk_rows(cache) == 14  # over max_disk_items until the next eviction
+    cache.put("key-14", "value")
+    assert _disk_rows(cache) == 10
+    assert cache.get("key-0") is None
+    assert cache.get("key-14") == "value"
+
+
+def test_tokens_saved_counts_prompt_and_output(cache):
+    calls = []
+
+    def llm_fn(ticket_text, template=None):
+        calls.append(ticket_text)
+        return "SUMMARY: s\nRESPONSE: " + "r" * 400
+
+    text = "My router keeps crashing every evening"
+    first, hit = cached_process_ticket(text, cache, llm_fn=llm_fn)
+    assert not hit
+    cache._memory.clear()  # the next lookup goes to disk
+    assert cached_process_ticket(text, cache, llm_fn=llm_fn) == (first, True)
+
+    stats = cache.summary()
+    assert calls == [text]
+    assert stats["prompt_tokens_saved"] == estimate_tokens(build_prompt(text))
+    assert stats["output_tokens_saved"] == estimate_tokens(first)
+    assert stats["tokens_saved"] == stats["prompt_tokens_saved"] + stats["output_tokens_saved"]
+
+
+def test_adds_prompt_tokens_to_an_old_database(tmp_path):
+    path = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, latency REAL NOT NULL DEFAULT 0, "
+                 "created_at REAL NOT NULL, last_access REAL NOT NULL)")
+    conn.execute("INSERT INTO llm_cache VALUES (?, 'cached reply', 1.5, strftime('%s', 'now'), 0)", (make_key("hi"),))
+    conn.commit()
+    conn.close()
+
+    cache = LLMCache(path)
+    assert cache.get(make_key("hi")) == "cached reply"
+    assert cache.summary()["prompt_tokens_saved"] == 0
+    cache.close()
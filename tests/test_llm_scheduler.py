@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from llm_cache import LLMCache
+from llm_module import AsyncLLMClient
+from llm_scheduler import LLMScheduler, SimulatedClock, TokenBucket, priority_for, simulate
+from ticket_pipeline import draft_response
+
+URGENT_NEGATIVE, URGENT, NEGATIVE, NORMAL = range(4)
+
+
+class StubBackend:
+    """Records the prompts it gets, in call order"""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def generate(self, prompt, json_mode=False):
+        self.prompts.append(prompt)
+        return "SUMMARY: ok\nRESPONSE: ok"
+
+
+def test_priority_for():
+    assert priority_for("Urgent", "Negative") == URGENT_NEGATIVE
+    assert priority_for("Urgent", "Positive") == URGENT
+    assert priority_for("Normal", "Negative") == NEGATIVE
+    assert priority_for("Normal") == NORMAL
+
+
+def test_token_bucket_refills_at_the_per_minute_rate_up_to_its_capacity():
+    bucket = TokenBucket(60, now=0.0)
+    assert bucket.wait_time(60, now=0.0) == 0
+    bucket.consume(60, now=0.0)
+    assert bucket.wait_time(1, now=0.0) == pytest.approx(1.0)
+    assert bucket.wait_time(1, now=0.5) == pytest.approx(0.5)
+    assert bucket.wait_time(1, now=1000.0) == 0
+    assert bucket.level == 60  # capped
+    assert bucket.wait_time(500, now=1000.0) == 0  # larger than the capacity: a full bucket pays for it
+
+
+def test_requests_per_minute_limit():
+    scheduler, requests = simulate([(0.0, 10, NORMAL)] * 20, rpm=6, max_wait=None)
+    times = sorted(r.dispatched_at for r in requests)
+    assert times[:6] == [0.0] * 6  # a minute's worth of burst
+    assert times[6:] == pytest.approx([10.0 * i for i in range(1, 15)])  # then one every 60 / rpm seconds
+    assert scheduler.stats()['classes']['normal']['dispatched'] == 20
+
+
+def test_tokens_per_minute_limit():
+    _, requests = simulate([(0.0, 1000, NORMAL)] * 6, rpm=1000, tpm=3000, max_wait=None)
+    assert [r.dispatched_at for r in requests] == pytest.approx([0.0, 0.0, 0.0, 20.0, 40.0, 60.0])
+
+
+def test_more_urgent_classes_go_first():
+    arrivals = [(0.0, 10, NORMAL)] * 3 + [(0.0, 10, NEGATIVE), (0.0, 10, URGENT), (0.0, 10, URGENT_NEGATIVE)]
+    _, requests = simulate(arrivals, rpm=1, max_wait=None)  # one request a minute
+    order = sorted(requests, key=lambda r: r.dispatched_at)
+    assert [r.priority for r in order] == [URGENT_NEGATIVE, URGENT, NEGATIVE, NORMAL, NORMAL, NORMAL]
+    assert [r.seq for r in order[3:]] == [1, 2, 3]  # FIFO within a class
+
+
+def test_urgent_ticket_overtakes_a_backlog():
+    # A backlog of normal tickets, then an urgent one: it takes the next free slot
+    _, requests = simulate([(0.0, 10, NORMAL)] * 20 + [(25.0, 10, URGENT)], rpm=6, max_wait=None)
+    urgent = next(r for r in requests if r.priority == URGENT)
+    assert urgent.dispatched_at == pytest.approx(30.0)
+    # The burst took 6 normal tickets and the slots at 10 and 20 s two more; the rest come after it
+    assert all(r.dispatched_at > urgent.dispatched_at for r in requests if r.priority == NORMAL and r.seq > 8)
+
+
+def test_max_wait_prevents_starvation():
+    # The burst goes to urgent tickets, which keep arriving faster than the quota allows (for 10 minutes)
+    arrivals = [(0.0, 10, URGENT)] * 6 + [(0.0, 10, NORMAL)] + [(t * 5.0, 10, URGENT) for t in range(1, 120)]
+    _, starved = simulate(arrivals, rpm=6, max_wait=None)
+    _, served = simulate(arrivals, rpm=6, max_wait=30.0)
+    assert next(r for r in starved if r.priority == NORMAL).dispatched_at > 600
+    normal = next(r for r in served if r.priority == NORMAL)
+    assert normal.dispatched_at - normal.submitted_at <= 30.0 + 10.0  # max_wait + one slot
+
+
+def test_async_client_waits_for_quota_on_the_simulated_clock():
+    clock = SimulatedClock()
+    scheduler = LLMScheduler(rpm=2, tpm=1_000_000, max_wait=None, clock=clock)
+    backend = StubBackend()
+    client = AsyncLLMClient(backend=backend, concurrency=8, scheduler=scheduler)
+
+    async def run():
+        return await asyncio.gather(*[client.process(f"normal ticket {i}", priority=NORMAL) for i in range(5)],
+                                    client.process("urgent ticket", priority=URGENT))
+
+    start = time.perf_counter()
+    results = asyncio.run(run())
+    assert all(r['ok'] for r in results)
+    assert time.perf_counter() - start < 5  # simulated minutes, not real ones
+    assert clock.now() == pytest.approx(4 * 30.0)  # 2 at once, then one every 30 s
+    order = [next(t for t in ("urgent ticket", *(f"normal ticket {i}" for i in range(5))) if t in p)
+             for p in backend.prompts]
+    assert order.index("urgent ticket") <= 2  # right after the initial burst, ahead of the queued normals
+
+
+def test_blocking_front_end_serves_urgent_threads_first():
+    scheduler = LLMScheduler(rpm=120, tpm=1_000_000, max_wait=None)
+    scheduler.requests_bucket.level = 0  # exhausted: one request every 0.5 s from now on
+    order = []
+
+    def worker(name, priority):
+        scheduler.acquire_blocking(10, priority)
+        order.append(name)
+
+    threads = [threading.Thread(target=worker, args=(f"normal-{i}", NORMAL)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)  # both normal requests are queued
+    urgent = threading.Thread(target=worker, args=("urgent", URGENT))
+    urgent.start()
+    for thread in threads + [urgent]:
+        thread.join(5)
+    assert order[0] == "urgent"
+    assert sorted(order) == ["normal-0", "normal-1", "urgent"]
+
+
+def test_draft_response_charges_the_scheduler_only_for_llm_calls(tfidf_models, tmp_path):
+    cache = LLMCache(str(tmp_path / 'cache.db'))
+    scheduler = LLMScheduler(rpm=60, tpm=1_000_000)
+    vectorizer = tfidf_models[0]
+    calls = []
+
+    def llm_fn(ticket_text, template=None):
+        calls.append(ticket_text)
+        return "SUMMARY: s\nRESPONSE: r"
+
+    classification = {"department": "Billing", "urgency": "Normal", "dept_confidence": 0.5,
+                      "urgency_confidence": 0.5}
+    text = "I was charged twice for my invoice"
+    for _ in range(2):
+        draft = draft_response(text, vectorizer.transform([text]), classification, cache=cache, llm_fn=llm_fn,
+                               scheduler=scheduler, priority=URGENT)
+        assert draft['ok']
+    assert calls == [text]  # the second one is a cache hit
+    assert scheduler.stats()['classes']['urgent']['dispatched'] == 1
+    cache.close()
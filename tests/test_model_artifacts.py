@@ -0,0 +1,48 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from model_artifacts import export_artifacts, load_artifacts, verify_checksums
+
+
+@pytest.fixture
+def artifacts_dir(tfidf_models, tmp_path):
+    export_artifacts(*tfidf_models, out_dir=str(tmp_path))
+    return str(tmp_path)
+
+
+def test_manifest_records_the_estimator(artifacts_dir):
+    with open(os.path.join(artifacts_dir, 'manifest.json'), encoding='utf-8') as fh:
+        heads = json.load(fh)["heads"]
+    assert {config["estimator"] for config in heads.values()} == {"LogisticRegression"}
+
+
+def test_corrupted_or_missing_files_fail_to_load(artifacts_dir):
+    assert verify_checksums(artifacts_dir) == []
+    coef = np.load(os.path.join(artifacts_dir, 'urgency_coef.npy'))
+    np.save(os.path.join(artifacts_dir, 'urgency_coef.npy'), coef * 2)
+    os.remove(os.path.join(artifacts_dir, 'idf.npy'))
+
+    assert sorted(verify_checksums(artifacts_dir)) == ['idf.npy', 'urgency_coef.npy']
+    with pytest.raises(ValueError, match="failed their checksums: .*urgency_coef.npy"):
+        load_artifacts(artifacts_dir)
+
+
+def test_manifest_without_estimator_fails_loudly(artifacts_dir):
+    path = os.path.join(artifacts_dir, 'manifest.json')
+    with open(path, encoding='utf-8') as fh:
+        manifest = json.load(fh)
+    del manifest["heads"]["department"]["estimator"]
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh)
+
+    with pytest.raises(ValueError, match="no supported estimator for the department head"):
+        load_artifacts(artifacts_dir)
+
+
+def test_committed_artifacts_load():
+    repo_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'model_artifacts')
+    vectorizer, dept_model, _ = load_artifacts(repo_dir)
+    assert dept_model.predict(vectorizer.transform(["I was charged twice"])).shape == (1,)
@@ -0,0 +1,79 @@
+import logging
+import os
+import threading
+
+import pytest
+
+import model_registry
+from model_registry import RETRY_BASE_SECONDS, ModelRegistry, ModelServer, ShadowStats
+
+
+@pytest.fixture
+def registry(tmp_path, tfidf_models):
+    registry = ModelRegistry(str(tmp_path / 'registry'))
+    registry.publish(*tfidf_models, version='v1', promote=True)
+    return registry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def test_failed_version_is_retried_with_backoff(registry, tfidf_models, monkeypatch, caplog):
+    clock = FakeClock()
+    monkeypatch.setattr(model_registry.time, 'monotonic', clock.monotonic)
+    server = ModelServer(registry)
+    registry.publish(*tfidf_models, version='v2', promote=True)
+    coef_path = os.path.join(registry.version_dir('v2'), 'department_coef.npy')
+    with open(coef_path, 'rb') as fh:
+        intact = fh.read()
+    with open(coef_path, 'wb') as fh:  # e.g. a copy still in progress
+        fh.write(intact[:-8])
+
+    with caplog.at_level(logging.INFO, logger='model_registry'):
+        server.refresh()
+        assert server.get().version == 'v1'
+        assert "Model version v2 not loaded" in caplog.text
+
+        clock.now += RETRY_BASE_SECONDS - 1
+        server.refresh()
+        assert caplog.text.count("Model version v2 not loaded") == 1  # still backing off
+
+        clock.now += 1
+        server.refresh()
+        assert caplog.text.count("Model version v2 not loaded") == 2
+        assert server._failed['v2'] == (2, clock.now + 2 * RETRY_BASE_SECONDS)
+
+        with open(coef_path, 'wb') as fh:
+            fh.write(intact)
+        clock.now += 2 * RETRY_BASE_SECONDS
+        server.refresh()
+    assert server.get().version == 'v2'
+    assert 'v2' not in server._failed
+    assert "Now serving model version v2" in caplog.text
+
+
+def test_shadow_stats_count_concurrent_drops():
+    stats = ShadowStats('v2')
+
+    def drop():
+        for _ in range(10_000):
+            stats.record_drop()
+
+    threads = [threading.Thread(target=drop) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats.record_score({"department": "Billing", "urgency": "Normal"},
+                       {"department": "Billing", "urgency": "Urgent"}, 0.001, 0.002)
+
+    report = stats.report('v1')
+    assert report['dropped'] == 80_000
+    assert report['scored'] == 1
+    assert report['department_agreement'] == 1.0 and report['urgency_agreement'] == 0.0
+    assert report['candidate_p50_ms'] == 2.0
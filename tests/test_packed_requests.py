@@ -0,0 +1,53 @@
+import asyncio
+import json
+
+from llm_cache import LLMCache, make_key
+from llm_module import PACKED_TICKETS_END, PACKED_TICKETS_START, PROMPT_TEMPLATE, AsyncLLMClient
+from llm_scheduler import LLMScheduler
+from ticket_pipeline import process_tickets_async
+
+
+class PackedBackend:
+    """Answers packed prompts with one well-formed entry per ticket; counts its calls"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def generate(self, prompt, json_mode=False):
+        self.calls += 1
+        tickets = json.loads(prompt[prompt.index(PACKED_TICKETS_START) + len(PACKED_TICKETS_START):
+                                    prompt.index(PACKED_TICKETS_END)])
+        return json.dumps([{"id": t["id"], "summary": f"about {t['text']}", "response": "on it"} for t in tickets])
+
+
+TEXTS = ["My router keeps dropping the connection", "I was charged twice this month",
+         "The blender I ordered arrived broken"]
+
+
+def test_packed_replies_are_cached_per_ticket_under_the_standard_key(tfidf_models, tmp_path):
+    cache = LLMCache(str(tmp_path / 'cache.db'))
+    backend = PackedBackend()
+    client = AsyncLLMClient(backend=backend)
+
+    packed = asyncio.run(process_tickets_async(TEXTS, tfidf_models, client, cache=cache, packed=True))
+    assert backend.calls == 1
+    assert all(r['ok'] and r['source'] == "llm" for r in packed)
+    for text in TEXTS:
+        assert f"about {text}" in cache.get(make_key(text, PROMPT_TEMPLATE))
+
+    # A standard (unpacked) run is served from those entries
+    unpacked = asyncio.run(process_tickets_async(TEXTS, tfidf_models, client, cache=cache))
+    assert backend.calls == 1
+    assert [r['summary'] for r in unpacked] == [r['summary'] for r in packed]
+    cache.close()
+
+
+def test_packed_requests_without_priorities_get_the_default_class():
+    scheduler = LLMScheduler(rpm=1000, tpm=1_000_000)
+    client = AsyncLLMClient(backend=PackedBackend(), scheduler=scheduler)
+
+    results = asyncio.run(client.process_packed(TEXTS, max_tickets=1))
+
+    assert all(r['ok'] for r in results)
+    dispatched = {name: c['dispatched'] for name, c in scheduler.stats()['classes'].items()}
+    assert dispatched == {"urgent_negative": 0, "urgent": 0, "negative": 0, "normal": 3}
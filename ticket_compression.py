@@ -0,0 +1,319 @@
+import argparse
+import asyncio
+import os
+import re
+import time
+
+import numpy as np
+from sklearn.preprocessing import normalize
+
+import metrics
+from featurizers import featurizer_mode
+from llm_module import estimate_tokens
+
+# Pre-LLM compression of long tickets (pasted email threads, chat transcripts).
+#
+# Tickets already within the token budget go to the LLM untouched. Longer ones are
+#
+#   1. strip_boilerplate: quoted replies ("> ...", "On ... wrote:", "-----Original Message-----",
+#      forwarded headers), signatures / sign-offs, mobile footers and legal disclaimers,
+#      chat timestamps
+#   2. if the rest is still over the token budget, rank its sentences by salience (cosine
+#      with the whole ticket in the model's TF-IDF space, plus a bonus for the opening
+#      sentences and for details such as order numbers or amounts), keep the best ones that
+#      fit and put them back in their original order, "[...]" marking the gaps
+#
+# The LLM sees the compressed text; caches and the similar-ticket index stay keyed on the
+# original. Every compression adds to the llm_input_tokens_total counters (kind="original"
+# / "compressed") and the "compress" stage histogram.
+#
+# Usage:
+#   python ticket_compression.py --budget 120 --sample 200          # offline quality check
+#   python ticket_compression.py --budget 120 --sample 50 --llm     # + summaries vs the uncompressed path
+
+DEFAULT_TOKEN_BUDGET = 400
+LEAD_SENTENCES = 2     # the opening sentences usually state the problem
+LEAD_BONUS = 0.15
+DETAIL_BONUS = 0.1     # sentences with digits: order / invoice numbers, amounts, error codes
+GAP_MARKER = "[...]"
+
+# Everything from the first match on is a quoted earlier message or a footer
+_CUT_PATTERNS = [re.compile(p, re.IGNORECASE | re.MULTILINE) for p in (
+    r"^\s*On\b[^\n]{0,200}(?:\n[^\n]{0,200})?\bwrote:\s*$",
+    r"^\s*-{2,}\s*(?:Original|Forwarded) Message\s*-{2,}",
+    r"^\s*Begin forwarded message:",
+    r"^\s*From:[^\n]*\n\s*(?:Sent|Date):",
+    r"^\s*--\s*$",
+    r"^\s*(?:this (?:e-?mail|message)|the information (?:contained|in this))[^\n]{0,200}"
+    r"(?:confidential|intended (?:solely )?for)",
+)]
+# A sign-off ends the message only if what follows looks like a signature: a few short
+# lines that aren't sentences (name, title, company, phone)
+_SIGN_OFF = re.compile(r"^\s*(?:(?:best|kind|warm)(?:est)? regards|regards|thanks(?: again)?|thank you|cheers|"
+                       r"sincerely|best wishes|all the best|best)[,.!]?\s*$", re.IGNORECASE)
+SIGN_OFF_TAIL_LINES = 8
+SIGNATURE_LINE_CHARS = 60
+# A greeting line is a salutation and at most a name ("Hi John,", "Dear Support Team,"), so
+# "Hi, my laptop won't turn on!" stays: the name words must be capitalized (case-sensitive)
+_GREETING = re.compile(r"^\s*(?i:hi|hello|hey|dear|greetings|good (?:morning|afternoon|evening))[,!]?"
+                       r"(?:\s+(?:(?i:there|all|everyone|folks|support|team|sir or madam|sir/madam)"
+                       r"|[A-Z][\w.'-]*)){0,3}"
+                       r"\s*[,!:]?\s*$")
+_DROP_LINES = [_GREETING] + [re.compile(p, re.IGNORECASE) for p in (
+    r"^\s*>",                                                  # quoted line
+    r"^\s*sent from my \w+",
+    r"^\s*get outlook for \w+",
+    r"^\s*(?:to|cc|subject|date):\s",                          # leftover headers
+)]
+_CHAT_TIMESTAMP = re.compile(r"^\s*\[?\d{1,2}:\d{2}(?::\d{2})?\s*(?:[AP]M)?\]?\s*[-–]?\s*", re.IGNORECASE)
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?\w)|\n+")
+_DIGITS = re.compile(r"\d")
+
+
+def _is_signature_line(line):
+    line = line.strip()
+    return len(line) <= SIGNATURE_LINE_CHARS and not line.endswith(('.', '?', '!'))
+
+
+def strip_boilerplate(ticket_text):
+    """The ticket without quoted replies, signatures, footers and chat timestamps (the original if nothing is left)"""
+    text = ticket_text.replace("\r\n", "\n")
+    cut = min((m.start() for p in _CUT_PATTERNS if (m := p.search(text)) and m.start() > 0), default=len(text))
+    lines = text[:cut].rstrip().split("\n")
+    for i in range(max(1, len(lines) - SIGN_OFF_TAIL_LINES - 1), len(lines)):
+        if _SIGN_OFF.match(lines[i]) and all(_is_signature_line(line) for line in lines[i + 1:]):
+            lines = lines[:i]
+            break
+    kept = [_CHAT_TIMESTAMP.sub("", line).strip() for line in lines
+            if not any(p.match(line) for p in _DROP_LINES)]
+    stripped = "\n".join(line for line in kept if line)
+    return stripped or ticket_text.strip()
+
+
+def split_sentences(text):
+    return [s.strip() for s in _SENTENCE_END.split(text) if s and s.strip()]
+
+
+def _seen_features(vectorizer):
+    """
+    Mask of the hashing featurizer's columns seen in training (None: all are). Unseen
+    terms get the highest IDF although nothing is known about them, so that's what
+    identifies them (the document frequencies aren't kept in the model artifacts).
+    """
+    if featurizer_mode(vectorizer) != 'hashing' or getattr(vectorizer, 'idf_', None) is None:
+        return None
+    return (vectorizer.idf_ < vectorizer.idf_.max()).astype(np.float64)
+
+
+def sentence_salience(sentences, vectorizer=None):
+    """
+    Salience per sentence: cosine with the whole text in the vectorizer's TF-IDF space
+    (terms seen in training only), plus the lead / detail bonuses. Without a vectorizer,
+    bonuses only.
+    """
+    scores = np.zeros(len(sentences))
+    if vectorizer is not None:
+        X = vectorizer.transform(sentences + [" ".join(sentences)])
+        seen = _seen_features(vectorizer)
+        if seen is not None:
+            X = normalize(X.multiply(seen).tocsr())
+        scores += np.asarray((X[:-1] @ X[-1].T).todense()).ravel()
+    scores[:LEAD_SENTENCES] += LEAD_BONUS
+    scores += [DETAIL_BONUS if _DIGITS.search(s) else 0.0 for s in sentences]
+    return scores
+
+
+def select_sentences(sentences, scores, budget):
+    """Indexes of the highest-scoring sentences whose tokens fit `budget`, in original order"""
+    costs = [estimate_tokens(s) for s in sentences]
+    gap_cost = estimate_tokens(f" {GAP_MARKER} ")
+    chosen, used = [], 0
+    for i in np.argsort(-scores, kind='stable'):
+        cost = costs[i] + gap_cost
+        if used + cost <= budget:
+            chosen.append(int(i))
+            used += cost
+    return sorted(chosen)
+
+
+def join_sentences(sentences, chosen):
+    parts, previous = [], -1
+    for i in chosen:
+        if i != previous + 1:
+            parts.append(GAP_MARKER)
+        parts.append(sentences[i])
+        previous = i
+    if chosen and chosen[-1] != len(sentences) - 1:
+        parts.append(GAP_MARKER)
+    return " ".join(parts)
+
+
+class TicketCompressor:
+    """Fits ticket text under `budget` tokens (estimate_tokens) before it goes into a prompt"""
+
+    def __init__(self, vectorizer=None, budget=DEFAULT_TOKEN_BUDGET):
+        self.vectorizer = vectorizer
+        self.budget = budget
+
+    def compress(self, ticket_text):
+        """
+        Returns (text for the prompt, {"original_tokens", "compressed_tokens", "sentences_kept", "sentences"}).
+        A ticket within the budget is returned as is.
+        """
+        with metrics.span("compress"):
+            text = ticket_text
+            if estimate_tokens(ticket_text) > self.budget:
+                text = strip_boilerplate(ticket_text)
+            sentences = split_sentences(text)
+            kept = len(sentences)
+            if estimate_tokens(text) > self.budget and sentences:
+                scores = sentence_salience(sentences, self.vectorizer)
+                chosen = select_sentences(sentences, scores, self.budget)
+                if chosen:
+                    text, kept = join_sentences(sentences, chosen), len(chosen)
+                else:  # even the best sentence is over the budget: its first words
+                    best = sentences[int(np.argmax(scores))]
+                    text, kept = best[:self.budget * 4].rsplit(" ", 1)[0] + f" {GAP_MARKER}", 1
+        info = {
+            "original_tokens": estimate_tokens(ticket_text),
+            "compressed_tokens": estimate_tokens(text),
+            "sentences_kept": kept,
+            "sentences": len(sentences),
+        }
+        metrics.REGISTRY.inc('llm_input_tokens_total', info['original_tokens'], kind="original")
+        metrics.REGISTRY.inc('llm_input_tokens_total', info['compressed_tokens'], kind="compressed")
+        return text, info
+
+    def wrap(self, llm_fn, log=None):
+        """
+        llm_fn(ticket_text, template=...) that sends the compressed text instead; each
+        call's token counts are appended to `log` (a list) if given.
+        """
+        def call(ticket_text, **kwargs):
+            text, info = self.compress(ticket_text)
+            if log is not None:
+                log.append(info)
+            return llm_fn(text, **kwargs)
+        return call
+
+
+# --- Offline quality check ---
+
+FILLER = ("I have been a loyal customer for many years and never had an issue like this before.",
+          "I would really appreciate it if somebody could look into this as soon as possible.",
+          "Please let me know if you need any more information from my side.")
+SIGNATURE = ("\n\nBest regards,\nJordan Miles\nOperations Manager | Northwind Traders\n+1 555 0100\n"
+             "Sent from my iPhone\n\nThis email and any attachments are confidential and intended solely "
+             "for the addressee.")
+
+
+def make_thread(ticket_text, earlier_text):
+    """A long email-style ticket around `ticket_text`: filler, signature, disclaimer and a quoted earlier message"""
+    quoted = "\n".join(f"> {line}" for line in (earlier_text + "\n" + FILLER[0]).split("\n"))
+    return (f"Hi support team,\n\n{FILLER[0]} {ticket_text}\n\n{FILLER[1]} {FILLER[2]}{SIGNATURE}\n\n"
+            f"On Mon, Mar 3, 2025 at 9:14 AM Support <support@example.com> wrote:\n{quoted}")
+
+
+def _words(text):
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def _unigram_f1(a, b):
+    """ROUGE-1 style overlap of two texts' lower-cased word sets"""
+    a, b = _words(a), _words(b)
+    if not a or not b:
+        return 0.0
+    overlap = len(a & b)
+    return 2 * overlap / (len(a) + len(b))
+
+
+def evaluate(tickets, models, budget=DEFAULT_TOKEN_BUDGET, llm_client=None):
+    """
+    Compresses synthetic threads built from `tickets` and compares them with the plain
+    tickets and with the uncompressed threads: token reduction, routing agreement of
+    the ML models and, with an AsyncLLMClient, similarity of the LLM summaries.
+    """
+    from ticket_pipeline import classify_texts
+
+    vectorizer = models[0]
+    compressor = TicketCompressor(vectorizer, budget)
+    threads = [make_thread(t, tickets[(i + 1) % len(tickets)]) for i, t in enumerate(tickets)]
+    compressed, infos, times = [], [], []
+    for thread in threads:
+        start = time.perf_counter()
+        text, info = compressor.compress(thread)
+        times.append((time.perf_counter() - start) * 1000)
+        compressed.append(text)
+        infos.append(info)
+
+    _, plain = classify_texts(tickets, models)
+    _, full = classify_texts(threads, models)
+    _, short = classify_texts(compressed, models)
+    original_tokens = sum(i['original_tokens'] for i in infos)
+    compressed_tokens = sum(i['compressed_tokens'] for i in infos)
+    report = {
+        "tickets": len(tickets),
+        "budget": budget,
+        "original_tokens_mean": original_tokens / len(infos),
+        "compressed_tokens_mean": compressed_tokens / len(infos),
+        "token_reduction": 1 - compressed_tokens / original_tokens,
+        "compress_p50_ms": float(np.percentile(times, 50)),
+        # Word overlap with the ticket the thread was built around (its content should survive)
+        "ticket_recall": float(np.mean([len(_words(t) & _words(c)) / max(1, len(_words(t)))
+                                        for t, c in zip(tickets, compressed)])),
+    }
+    for head in ("department", "urgency"):
+        report[f"{head}_agreement_vs_ticket"] = float(np.mean([a[head] == b[head] for a, b in zip(plain, short)]))
+        report[f"{head}_agreement_uncompressed_vs_ticket"] = float(np.mean([a[head] == b[head]
+                                                                            for a, b in zip(plain, full)]))
+
+    if llm_client is not None:
+        async def _summaries():
+            return (await llm_client.process_many(threads), await llm_client.process_many(compressed))
+
+        full_out, short_out = asyncio.run(_summaries())
+        pairs = [(a['summary'], b['summary']) for a, b in zip(full_out, short_out) if a['ok'] and b['ok']]
+        report["llm_pairs"] = len(pairs)
+        report["summary_overlap_f1"] = float(np.mean([_unigram_f1(a, b) for a, b in pairs])) if pairs else None
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check ticket compression on a local sample")
+    parser.add_argument('--data', default=None, help="tickets.parquet / tickets.csv (default: whichever exists)")
+    parser.add_argument('--sample', type=int, default=200, help="Tickets to build threads from")
+    parser.add_argument('--budget', type=int, default=DEFAULT_TOKEN_BUDGET, help="Token budget of the ticket text")
+    parser.add_argument('--llm', action='store_true',
+                        help="Also compare LLM summaries of compressed vs uncompressed threads "
+                             "(LLM_BACKEND_URL for a stub / other endpoint, Gemini otherwise)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from llm_module import AsyncLLMClient, HTTPBackend
+    from ticket_data import read_tickets
+    from model_registry import load_current_models
+
+    df = read_tickets(args.data, columns=['ticket_text']).dropna()
+    tickets = df['ticket_text'].astype(str).sample(min(args.sample, len(df)), random_state=args.seed).tolist()
+    client = None
+    if args.llm:
+        url = os.environ.get("LLM_BACKEND_URL")
+        client = AsyncLLMClient(backend=HTTPBackend(url) if url else None)
+    report = evaluate(tickets, load_current_models()[1], args.budget, client)
+
+    print(f"🗜️ {report['tickets']} threads | budget {report['budget']} tokens | "
+          f"{report['original_tokens_mean']:.0f} -> {report['compressed_tokens_mean']:.0f} tokens on average "
+          f"(-{report['token_reduction'] * 100:.0f}%) | {report['compress_p50_ms']:.2f} ms p50")
+    print(f"   Ticket words kept: {report['ticket_recall'] * 100:.1f}%")
+    for head in ("department", "urgency"):
+        print(f"   {head.capitalize()} routing = plain ticket: compressed "
+              f"{report[f'{head}_agreement_vs_ticket'] * 100:.1f}% vs uncompressed "
+              f"{report[f'{head}_agreement_uncompressed_vs_ticket'] * 100:.1f}%")
+    if args.llm:
+        overlap = report['summary_overlap_f1']
+        print(f"   LLM summaries (compressed vs uncompressed, {report['llm_pairs']} pairs): "
+              f"word overlap F1 {overlap:.2f}" if overlap is not None else "   ❌ No successful LLM pairs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import os
+
+import pandas as pd
+
+# Readers for the clean ticket dataset written by clean_data.py.
+# The dataset is tickets.parquet (columnar, compressed: only the requested columns are
+# read) or, for older exports, tickets.csv. Callers pass the columns they need.
+
+PARQUET_PATH = 'tickets.parquet'
+CSV_PATH = 'tickets.csv'
+
+
+def default_tickets_path():
+    """tickets.parquet if clean_data.py has produced it, otherwise tickets.csv"""
+    return PARQUET_PATH if os.path.exists(PARQUET_PATH) else CSV_PATH
+
+
+def is_parquet(path):
+    return str(path).endswith(('.parquet', '.pq'))
+
+
+def read_columns(path):
+    """Column names without reading any rows"""
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        return list(pq.read_schema(path).names)
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def read_tickets(path=None, columns=None, nrows=None):
+    """The dataset (or just `columns` of it) as a DataFrame"""
+    path = path or default_tickets_path()
+    if is_parquet(path):
+        if nrows is None:
+            return pd.read_parquet(path, columns=columns)
+        return next(iter_tickets(path, columns, chunk_size=nrows), pd.DataFrame(columns=columns))
+    return pd.read_csv(path, usecols=columns, nrows=nrows)
+
+
+def iter_tickets(path=None, columns=None, chunk_size=100_000):
+    """Yields DataFrames of at most `chunk_size` rows, reading only `columns`"""
+    path = path or default_tickets_path()
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_size)
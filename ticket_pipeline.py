@@ -0,0 +1,335 @@
+import asyncio
+import datetime
+import json
+import os
+import time
+
+import joblib
+
+import metrics
+from llm_cache import cached_process_ticket, make_key
+from llm_scheduler import priority_for
+from model_artifacts import DEFAULT_ARTIFACTS_DIR, load_artifacts
+from llm_module import (DEEP_PROMPT_TEMPLATE, OUTPUT_TOKENS_PER_TICKET, PACKED_PROMPT_TEMPLATE, PROMPT_TEMPLATE,
+                        build_prompt, estimate_tokens, parse_llm_output, process_ticket_with_llm)
+
+# The hybrid pipeline (ML routing + LLM drafting) without any UI code,
+# shared by app.py, batch_classify.py and inference_service.py.
+
+VECTORIZER_PATH = 'tfidf_vectorizer.pkl'
+DEPT_MODEL_PATH = 'model_department.pkl'
+URGENCY_MODEL_PATH = 'model_urgency.pkl'
+
+LLM_ERROR_PREFIX = "Error connecting to AI"
+
+# Processing modes (the "Mode" radio in app.py)
+STANDARD = "Standard"          # one LLM call (after the similar-ticket / cache lookups)
+FAST_TRACK = "Fast Track"      # skip the LLM when both classifiers are confident
+DEEP_ANALYSIS = "Deep Analysis"  # always a fresh, more thorough LLM analysis
+PROCESSING_MODES = (STANDARD, FAST_TRACK, DEEP_ANALYSIS)
+
+# Fast Track skips the LLM when min(department, urgency) confidence reaches this
+FAST_TRACK_THRESHOLD = 0.7
+
+
+def load_pickled_models():
+    """Load the vectorizer and both classifiers from the joblib pickles"""
+    vect = joblib.load(VECTORIZER_PATH)
+    model_dept = joblib.load(DEPT_MODEL_PATH)
+    model_urgency = joblib.load(URGENCY_MODEL_PATH)
+    return vect, model_dept, model_urgency
+
+
+def load_models(artifacts_dir=DEFAULT_ARTIFACTS_DIR):
+    """
+    Load the vectorizer and both classifiers saved by train_models.py, preferring the
+    memory-mapped artifacts (model_artifacts.py) and falling back to the pickles.
+    """
+    if os.path.exists(os.path.join(artifacts_dir, 'manifest.json')):
+        return load_artifacts(artifacts_dir)
+    return load_pickled_models()
+
+
+def _predict_with_confidence(model, X):
+    """Labels and their predicted probabilities from a single predict_proba call"""
+    proba = model.predict_proba(X)
+    best = proba.argmax(axis=1)
+    return model.classes_[best], proba[range(len(best)), best]
+
+
+def classify_texts(texts, models):
+    """
+    Vectorizes `texts` once and runs both classifiers on the shared matrix.
+    Returns (X, [{"department", "urgency", "dept_confidence", "urgency_confidence"}, ...]),
+    confidences being the models' probabilities for the predicted labels (0-1).
+    """
+    vectorizer, dept_model, urgency_model = models
+    with metrics.span("vectorize"):
+        X = vectorizer.transform(texts)
+    with metrics.span("dept_predict"):
+        departments, dept_conf = _predict_with_confidence(dept_model, X)
+    with metrics.span("urgency_predict"):
+        urgencies, urgency_conf = _predict_with_confidence(urgency_model, X)
+    return X, [
+        {
+            "department": str(d),
+            "urgency": str(u),
+            "dept_confidence": round(float(dc), 4),
+            "urgency_confidence": round(float(uc), 4),
+        }
+        for d, u, dc, uc in zip(departments, urgencies, dept_conf, urgency_conf)
+    ]
+
+
+def is_confident(classification, threshold=FAST_TRACK_THRESHOLD):
+    return min(classification['dept_confidence'], classification['urgency_confidence']) >= threshold
+
+
+def ml_only_draft(classification):
+    """Placeholder draft for tickets the Fast Track answers with ML alone"""
+    confidence = min(classification['dept_confidence'], classification['urgency_confidence'])
+    return {
+        "summary": (f"Fast-tracked: routed to {classification['department']} ({classification['urgency']}) "
+                    f"with {confidence:.0%} ML confidence. No AI draft was requested."),
+        "response": "",
+        "source": "ml",
+        "ok": True,
+    }
+
+
+def find_similar_draft(vector, department, similar_index=None):
+    """Summary/response of a near-duplicate past ticket, or None"""
+    if similar_index is None:
+        return None
+    match = similar_index.query(vector, department)
+    if match is None:
+        return None
+    return {
+        "summary": match['summary'],
+        "response": match['response'],
+        "source": "similar",
+        "ok": True,
+        "similar_match": match,
+    }
+
+
+def remember_draft(ticket_text, vector, department, summary, response, similar_index=None, ticket_id=None):
+    if similar_index is not None:
+        similar_index.add(ticket_text, department, summary, response, ticket_id=ticket_id, vector=vector)
+        similar_index.checkpoint()
+
+
+def _instrumented(llm_fn):
+    """llm_fn wrapper recording the call's latency and whether it failed"""
+    def call(ticket_text, template=PROMPT_TEMPLATE):
+        with metrics.span("llm_call"):
+            ai_output = llm_fn(ticket_text, template=template)
+        metrics.record_llm(ok=not ai_output.startswith(LLM_ERROR_PREFIX))
+        return ai_output
+    return call
+
+
+def _scheduled(llm_fn, scheduler, priority=None):
+    """llm_fn that first waits for quota in `scheduler` (llm_scheduler.LLMScheduler), by priority"""
+    def call(ticket_text, template=PROMPT_TEMPLATE):
+        tokens = estimate_tokens(build_prompt(ticket_text, template)) + OUTPUT_TOKENS_PER_TICKET
+        scheduler.acquire_blocking(tokens, priority)
+        return llm_fn(ticket_text, template=template)
+    return call
+
+
+def _cached_draft(ticket_text, cache, template=PROMPT_TEMPLATE):
+    if cache is None:
+        return None
+    cached = cache.get(make_key(ticket_text, template))
+    if cached is None:
+        return None
+    summary, response = parse_llm_output(cached)
+    return {"summary": summary, "response": response, "source": "cache", "ok": True}
+
+
+def draft_response(ticket_text, vector, classification, mode=STANDARD, cache=None, similar_index=None,
+                   llm_fn=process_ticket_with_llm, ticket_id=None, fast_track_threshold=FAST_TRACK_THRESHOLD,
+                   compressor=None, scheduler=None, priority=None):
+    """
+    Summary + response for one ticket according to the processing mode:
+
+    - Standard: a near-duplicate's answer if there is one, otherwise the (cached) LLM output
+    - Fast Track: like Standard, but if both classifiers are confident only the cheap lookups
+      are tried and the LLM is skipped
+    - Deep Analysis: always asks the LLM, with the more thorough prompt
+
+    `llm_fn(ticket_text, template=...)` returns the raw LLM text. With a compressor
+    (ticket_compression.TicketCompressor) the LLM gets the compressed ticket, and the
+    draft reports original_tokens / compressed_tokens. With a scheduler
+    (llm_scheduler.LLMScheduler) the LLM call first waits for RPM / TPM quota, more urgent
+    `priority` classes (llm_scheduler.priority_for) first; cache and near-duplicate hits
+    don't use any.
+    """
+    department = classification['department']
+    template = DEEP_PROMPT_TEMPLATE if mode == DEEP_ANALYSIS else PROMPT_TEMPLATE
+
+    if mode != DEEP_ANALYSIS:
+        draft = find_similar_draft(vector, department, similar_index)
+        if draft is not None:
+            return draft
+
+    if mode == FAST_TRACK and is_confident(classification, fast_track_threshold):
+        return _cached_draft(ticket_text, cache) or ml_only_draft(classification)
+
+    token_log = []
+    llm_fn = _instrumented(llm_fn)  # the LLM call alone: not the quota wait or the compression
+    if scheduler is not None:
+        llm_fn = _scheduled(llm_fn, scheduler, priority)
+    if compressor is not None:  # the scheduler is charged for the compressed ticket
+        llm_fn = compressor.wrap(llm_fn, log=token_log)
+    if cache is not None:
+        ai_output, cache_hit = cached_process_ticket(ticket_text, cache, llm_fn=llm_fn, template=template)
+    else:
+        ai_output, cache_hit = llm_fn(ticket_text, template=template), False
+
+    with metrics.span("parse_output"):
+        summary, response = parse_llm_output(ai_output)
+    ok = not ai_output.startswith(LLM_ERROR_PREFIX)
+    if ok and not cache_hit and mode != DEEP_ANALYSIS:
+        remember_draft(ticket_text, vector, department, summary, response, similar_index, ticket_id)
+    draft = {
+        "summary": summary,
+        "response": response,
+        "source": "cache" if cache_hit else "llm",
+        "ok": ok,
+    }
+    if token_log:
+        draft.update(original_tokens=token_log[0]['original_tokens'],
+                     compressed_tokens=token_log[0]['compressed_tokens'])
+    return draft
+
+
+def process_ticket(ticket_text, models, mode=STANDARD, cache=None, similar_index=None,
+                   llm_fn=process_ticket_with_llm, ticket_id=None, compressor=None):
+    """Runs the full hybrid pipeline on one ticket"""
+    start = time.perf_counter()
+    X, (classification,) = classify_texts([ticket_text], models)
+    draft = draft_response(ticket_text, X, classification, mode=mode, cache=cache,
+                           similar_index=similar_index, llm_fn=llm_fn, ticket_id=ticket_id, compressor=compressor)
+    result = dict(classification, **draft)
+    result["mode"] = mode
+    result["latency"] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def _prepare_batch(ticket_texts, models, mode, cache, similar_index, fast_track_threshold, sentiment_analyzer,
+                   compressor):
+    """
+    The CPU / SQLite part of process_tickets_async before the LLM calls: classification,
+    sentiment, near-duplicate / cache / Fast Track answers and compression.
+    Returns (X, results, template, pending indexes, texts to send for them, priorities); `template`
+    is the single-ticket prompt, which also keys the cache when the LLM calls are packed.
+    """
+    X, results = classify_texts(ticket_texts, models)
+    if sentiment_analyzer is not None:
+        with metrics.span("sentiment"):
+            scores, labels = sentiment_analyzer.score_batch(ticket_texts)
+        for result, score, label in zip(results, scores, labels):
+            result.update(sentiment=label, sentiment_score=round(float(score), 3))
+    template = DEEP_PROMPT_TEMPLATE if mode == DEEP_ANALYSIS else PROMPT_TEMPLATE
+
+    pending = []
+    for i, (text, result) in enumerate(zip(ticket_texts, results)):
+        result["mode"] = mode
+        draft = None
+        if mode != DEEP_ANALYSIS:
+            draft = find_similar_draft(X[i], result['department'], similar_index)
+        if draft is None:
+            draft = _cached_draft(text, cache, template)
+        if draft is None and mode == FAST_TRACK and is_confident(result, fast_track_threshold):
+            draft = ml_only_draft(result)
+        if draft is None:
+            pending.append(i)
+        else:
+            result.update(draft)
+
+    pending_texts = [ticket_texts[i] for i in pending]
+    if compressor is not None:
+        for n, i in enumerate(pending):
+            pending_texts[n], info = compressor.compress(ticket_texts[i])
+            results[i].update(original_tokens=info['original_tokens'], compressed_tokens=info['compressed_tokens'])
+    priorities = [priority_for(results[i]['urgency'], results[i].get('sentiment')) for i in pending]
+    return X, results, template, pending, pending_texts, priorities
+
+
+def _store_llm_results(ticket_texts, X, results, template, pending, pending_texts, llm_results, mode, cache,
+                       similar_index):
+    """Caches and remembers the LLM drafts of process_tickets_async and copies them into the results"""
+    for i, sent_text, llm_result in zip(pending, pending_texts, llm_results):
+        result = results[i]
+        if llm_result['ok']:
+            if cache is not None:
+                cache.put(make_key(ticket_texts[i], template), llm_result['text'], latency=llm_result['latency'],
+                          prompt_tokens=estimate_tokens(build_prompt(sent_text, template)))
+            if mode != DEEP_ANALYSIS:
+                remember_draft(ticket_texts[i], X[i], result['department'], llm_result['summary'],
+                               llm_result['response'], similar_index)
+            result.update(summary=llm_result['summary'], response=llm_result['response'],
+                          source="llm", ok=True)
+        else:
+            result.update(summary=None, response=None, source="llm", ok=False, error=llm_result['error'])
+
+
+async def process_tickets_async(ticket_texts, models, client, mode=STANDARD, cache=None, similar_index=None,
+                                fast_track_threshold=FAST_TRACK_THRESHOLD, packed=False, sentiment_analyzer=None,
+                                compressor=None):
+    """
+    Batch variant of process_ticket: classification runs once over the whole batch,
+    and the remaining LLM calls go out concurrently through an AsyncLLMClient.
+    With packed=True those tickets share a few multi-ticket JSON requests instead
+    (not in Deep Analysis, which keeps one thorough prompt per ticket).
+    With a sentiment_analyzer the results get sentiment / sentiment_score, and Negative
+    tickets rank higher in the client's scheduler (if it has one), after Urgent ones.
+    With a compressor the LLM gets compressed tickets (cache keys stay on the originals).
+    The blocking work before and after the LLM calls runs in a worker thread, so the
+    event loop keeps serving other requests meanwhile.
+    """
+    packed = packed and mode != DEEP_ANALYSIS
+    X, results, template, pending, pending_texts, priorities = await asyncio.to_thread(
+        _prepare_batch, ticket_texts, models, mode, cache, similar_index, fast_track_threshold, sentiment_analyzer,
+        compressor)
+    if packed and pending:
+        stats = {}
+        # Packed replies are rebuilt in the single-ticket format, so they are cached under `template`
+        llm_results = await client.process_packed(pending_texts, template=PACKED_PROMPT_TEMPLATE, stats=stats,
+                                                  priorities=priorities)
+        request_log = stats['request_log']
+    else:
+        llm_results = await client.process_many(pending_texts, template=template, priorities=priorities)
+        request_log = [(r['latency'], r['ok']) for r in llm_results]
+    for latency, ok in request_log:
+        metrics.observe("llm_call", latency)
+        metrics.record_llm(ok=ok)
+
+    await asyncio.to_thread(_store_llm_results, ticket_texts, X, results, template, pending, pending_texts,
+                            llm_results, mode, cache, similar_index)
+    return results
+
+
+def export_to_json(result):
+    """Export ticket analysis (the app's result dict) as JSON"""
+    export_data = {
+        "timestamp": datetime.datetime.now().isoformat(),
+        "ticket_id": result.get('ticket_id') or f"TKT-{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}",
+        "classification": {
+            "department": result['dept'],
+            "urgency": result['urgency'],
+            "confidence": result.get('confidence', 0),
+            "urgency_confidence": result.get('urgency_confidence', 0)
+        },
+        "processing_mode": result.get('mode', STANDARD),
+        "sentiment": result.get('sentiment', 'Unknown'),
+        "sentiment_score": result.get('sentiment_score'),
+        "analysis": {
+            "summary": result['summary'],
+            "proposed_response": result['response']
+        },
+        "original_ticket": result['original_text']
+    }
+    return json.dumps(export_data, indent=2)
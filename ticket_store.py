@@ -0,0 +1,266 @@
+import atexit
+import datetime
+import hashlib
+import secrets
+import sqlite3
+import threading
+import time
+
+from llm_cache import normalize_ticket
+
+# Durable store for processed tickets, shared by all app sessions, agents and service workers.
+#
+#   tickets          one row per processed ticket (text, sentiment, mode, timestamp)
+#   classifications  department / urgency + confidences, keyed by the ticket's row id
+#   llm_outputs      summary / response and where they came from (llm, cache, similar, ml)
+#
+# SQLite in WAL mode lets readers page through history while writers append. Writes are
+# buffered and committed in batches; reads use keyset pagination on the row id (newest
+# first), so a page costs the same whether the table holds a thousand or millions of rows.
+
+DEFAULT_DB_PATH = 'tickets.db'
+PAGE_SIZE = 50
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS tickets (
+        id INTEGER PRIMARY KEY,
+        ticket_id TEXT NOT NULL UNIQUE,
+        created_at REAL NOT NULL,
+        ticket_text TEXT NOT NULL,
+        text_hash TEXT NOT NULL,
+        sentiment TEXT,
+        mode TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_tickets_created_at ON tickets (created_at);
+    CREATE INDEX IF NOT EXISTS idx_tickets_text_hash ON tickets (text_hash);
+
+    CREATE TABLE IF NOT EXISTS classifications (
+        id INTEGER PRIMARY KEY REFERENCES tickets (id) ON DELETE CASCADE,
+        department TEXT NOT NULL,
+        urgency TEXT NOT NULL,
+        dept_confidence REAL,
+        urgency_confidence REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_classifications_department ON classifications (department);
+    CREATE INDEX IF NOT EXISTS idx_classifications_urgency ON classifications (urgency);
+    CREATE INDEX IF NOT EXISTS idx_classifications_department_urgency ON classifications (department, urgency);
+
+    CREATE TABLE IF NOT EXISTS llm_outputs (
+        id INTEGER PRIMARY KEY REFERENCES tickets (id) ON DELETE CASCADE,
+        summary TEXT,
+        response TEXT,
+        source TEXT,
+        ok INTEGER NOT NULL DEFAULT 1,
+        updated_at REAL
+    );
+"""
+
+COLUMNS = ("id", "ticket_id", "created_at", "ticket_text", "sentiment", "mode", "department", "urgency",
+           "dept_confidence", "urgency_confidence", "summary", "response", "source", "ok")
+
+_SELECT = """
+    SELECT t.id, t.ticket_id, t.created_at, t.ticket_text, t.sentiment, t.mode, c.department, c.urgency,
+           c.dept_confidence, c.urgency_confidence, o.summary, o.response, o.source, o.ok
+    FROM tickets t
+    JOIN classifications c ON c.id = t.id
+    LEFT JOIN llm_outputs o ON o.id = t.id
+"""
+
+
+def new_ticket_id(now=None):
+    """TKT-<timestamp>-<64-bit random suffix>, unique across concurrent sessions and batches"""
+    now = now or datetime.datetime.now()
+    return f"TKT-{now.strftime('%Y%m%d%H%M%S')}-{secrets.token_hex(8).upper()}"
+
+
+def text_hash(ticket_text):
+    return hashlib.sha256(normalize_ticket(ticket_text).encode('utf-8')).hexdigest()
+
+
+class TicketStore:
+    """
+    Buffered writer + paginated reader over the ticket database.
+    Pending records are flushed every `batch_size` records, after `flush_interval`
+    seconds, before every read and at interpreter exit.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, batch_size=100, flush_interval=2.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        atexit.register(self.flush)
+
+    # --- Writes ---
+
+    def add(self, record):
+        """
+        Queues one processed ticket. `record` needs ticket_id, ticket_text, department and
+        urgency; created_at (epoch seconds), sentiment, mode, the confidences, summary,
+        response, source and ok are optional.
+        """
+        self.add_many([record])
+
+    def add_many(self, records):
+        with self._lock:
+            self._pending.extend(records)
+            if (len(self._pending) >= self.batch_size
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        records, self._pending = self._pending, []
+        now = time.time()
+        # One IMMEDIATE transaction per batch: row ids are allocated up front, under the
+        # write lock, so the three tables can be filled with executemany
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            records = self._dedupe_ids(records)
+            first_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM tickets").fetchone()[0]
+            ids = range(first_id, first_id + len(records))
+            self._conn.executemany(
+                "INSERT INTO tickets (id, ticket_id, created_at, ticket_text, text_hash, sentiment, mode) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(i, r['ticket_id'], r.get('created_at', now), r['ticket_text'], text_hash(r['ticket_text']),
+                  r.get('sentiment'), r.get('mode')) for i, r in zip(ids, records)],
+            )
+            self._conn.executemany(
+                "INSERT INTO classifications (id, department, urgency, dept_confidence, urgency_confidence) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(i, r['department'], r['urgency'], r.get('dept_confidence'), r.get('urgency_confidence'))
+                 for i, r in zip(ids, records)],
+            )
+            self._conn.executemany(
+                "INSERT INTO llm_outputs (id, summary, response, source, ok, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [(i, r.get('summary'), r.get('response'), r.get('source'), int(r.get('ok', True)), now)
+                 for i, r in zip(ids, records)],
+            )
+            self._conn.commit()
+        except BaseException:
+            self._conn.rollback()
+            # Keep the batch for the next flush rather than losing it (and the LLM work in it)
+            self._pending[:0] = records
+            raise
+
+    def _dedupe_ids(self, records):
+        """
+        Drops re-adds of a stored ticket (same ticket_id and text) and gives a fresh id to a
+        different ticket whose id is already taken, so one clash can't fail the whole batch.
+        """
+        batch_ids = [r['ticket_id'] for r in records]
+        stored = {}
+        for start in range(0, len(batch_ids), 500):
+            chunk = batch_ids[start:start + 500]
+            stored.update(self._conn.execute(
+                f"SELECT ticket_id, text_hash FROM tickets WHERE ticket_id IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall())
+        kept = []
+        for record in records:
+            digest = text_hash(record['ticket_text'])
+            if record['ticket_id'] in stored:
+                if stored[record['ticket_id']] == digest:
+                    continue
+                record['ticket_id'] = new_ticket_id()
+            stored[record['ticket_id']] = digest
+            kept.append(record)
+        return kept
+
+    def update_response(self, ticket_id, response):
+        """Stores an agent-edited response; returns False if the ticket is unknown"""
+        with self._lock:
+            self._flush_locked()
+            row = self._conn.execute("SELECT id FROM tickets WHERE ticket_id = ?", (ticket_id,)).fetchone()
+            if row is None:
+                return False
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO llm_outputs (id, response, source, updated_at) VALUES (?, ?, 'agent', ?) "
+                    "ON CONFLICT (id) DO UPDATE SET response = excluded.response, source = 'agent', "
+                    "updated_at = excluded.updated_at",
+                    (row[0], response, time.time()),
+                )
+            return True
+
+    def set_draft(self, ticket_id, summary, response, source, ok=True):
+        """Stores the LLM output of a ticket drafted after it was added; returns False if unknown"""
+        with self._lock:
+            self._flush_locked()
+            row = self._conn.execute("SELECT id FROM tickets WHERE ticket_id = ?", (ticket_id,)).fetchone()
+            if row is None:
+                return False
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO llm_outputs (id, summary, response, source, ok, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (id) DO UPDATE SET summary = excluded.summary, response = excluded.response, "
+                    "source = excluded.source, ok = excluded.ok, updated_at = excluded.updated_at",
+                    (row[0], summary, response, source, int(ok), time.time()),
+                )
+            return True
+
+    # --- Reads ---
+
+    def _query(self, sql, params):
+        with self._lock:
+            self._flush_locked()
+            rows = self._conn.execute(sql, params).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def get(self, ticket_id):
+        rows = self._query(_SELECT + " WHERE t.ticket_id = ?", (ticket_id,))
+        return rows[0] if rows else None
+
+    def page(self, limit=PAGE_SIZE, before=None, department=None, urgency=None, since=None, until=None):
+        """
+        Newest-first page of at most `limit` tickets, optionally filtered.
+        Returns (rows, cursor): pass `cursor` as `before` for the next page (None at the end).
+        Ordering on classifications.id lets SQLite walk the department / urgency index
+        (which carries the row id) instead of sorting the matches.
+        """
+        where, params = [], []
+        if before is not None:
+            where.append("c.id < ?")
+            params.append(before)
+        if department is not None:
+            where.append("c.department = ?")
+            params.append(department)
+        if urgency is not None:
+            where.append("c.urgency = ?")
+            params.append(urgency)
+        if since is not None:
+            where.append("t.created_at >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("t.created_at < ?")
+            params.append(until)
+        sql = _SELECT + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY c.id DESC LIMIT ?"
+        rows = self._query(sql, (*params, limit + 1))
+        if len(rows) > limit:
+            return rows[:limit], rows[limit - 1]['id']
+        return rows, None
+
+    def history_for(self, ticket_text, limit=5):
+        """Earlier tickets with the same normalized text, newest first"""
+        return self._query(_SELECT + " WHERE t.text_hash = ? ORDER BY t.id DESC LIMIT ?",
+                           (text_hash(ticket_text), limit))
+
+    def close(self):
+        self.flush()
+        atexit.unregister(self.flush)
+        self._conn.close()
@@ -1,56 +1,223 @@
-import pandas as pd
+import argparse
+import json
+import numpy as np
 import joblib
-from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.metrics import accuracy_score
+from featurizers import FEATURIZERS, build_featurizer, featurizer_mode
+from model_artifacts import DEFAULT_ARTIFACTS_DIR, export_artifacts
+from model_registry import DEFAULT_REGISTRY_DIR, ModelRegistry
+from model_search import build_classifier, run_search, select_best
+from ticket_data import default_tickets_path, iter_tickets, read_tickets
 
-# 1. Load the clean data
-print("⏳ Loading data...")
-try:
-    df = pd.read_csv('tickets.csv')
-except FileNotFoundError:
-    print("❌ Error: tickets.csv not found. Run clean_data.py first.")
-    exit()
-
-# --- FIX: HANDLE MISSING VALUES ---
-print(f"   Original rows: {len(df)}")
-# Drop rows where urgency or department is empty (NaN)
-df = df.dropna(subset=['urgency', 'department', 'ticket_text'])
-print(f"   Rows after cleaning NaNs: {len(df)}")
-# ----------------------------------
-
-# 2. Convert Text to Numbers (Vectorization)
-print("⏳ Vectorizing text...")
-vectorizer = TfidfVectorizer(max_features=5000, stop_words='english')
-X = vectorizer.fit_transform(df['ticket_text'])
-
-# 3. Train Model 1: Department Classifier
-print("⏳ Training Department Model...")
-y_dept = df['department']
-X_train_d, X_test_d, y_train_d, y_test_d = train_test_split(X, y_dept, test_size=0.2, random_state=42)
-
-model_dept = LogisticRegression(max_iter=1000)
-model_dept.fit(X_train_d, y_train_d)
-
-pred_dept = model_dept.predict(X_test_d)
-print(f"✅ Department Model Accuracy: {accuracy_score(y_test_d, pred_dept):.2f}")
-
-# 4. Train Model 2: Urgency Classifier
-print("⏳ Training Urgency Model...")
-y_urgency = df['urgency']
-X_train_u, X_test_u, y_train_u, y_test_u = train_test_split(X, y_urgency, test_size=0.2, random_state=42)
-
-model_urgency = LogisticRegression(max_iter=1000)
-model_urgency.fit(X_train_u, y_train_u)
-
-pred_urgency = model_urgency.predict(X_test_u)
-print(f"✅ Urgency Model Accuracy: {accuracy_score(y_test_u, pred_urgency):.2f}")
-
-# 5. Save the Models
-print("⏳ Saving models...")
-joblib.dump(vectorizer, 'tfidf_vectorizer.pkl')
-joblib.dump(model_dept, 'model_department.pkl')
-joblib.dump(model_urgency, 'model_urgency.pkl')
-
-print("\n🎉 Success! Models saved successfully.")
+
+LABELS = ('department', 'urgency')
+HOLDOUT_EVERY = 5  # out-of-core mode holds out every 5th row (20%), like test_size=0.2
+
+
+def load_training_data(path=None):
+    """Loads the text + label columns of the clean tickets and drops rows with missing values"""
+    path = path or default_tickets_path()
+    print("⏳ Loading data...")
+    try:
+        df = read_tickets(path, columns=['ticket_text', *LABELS])
+    except FileNotFoundError:
+        print(f"❌ Error: {path} not found. Run clean_data.py first.")
+        exit()
+
+    # --- FIX: HANDLE MISSING VALUES ---
+    print(f"   Original rows: {len(df)}")
+    # Drop rows where urgency or department is empty (NaN)
+    df = df.dropna(subset=['urgency', 'department', 'ticket_text'])
+    print(f"   Rows after cleaning NaNs: {len(df)}")
+    # ----------------------------------
+    return df
+
+
+def train_classifier(X, y, name, model=None, refit=False):
+    """
+    Fits `model` (default LogisticRegression) on an 80/20 split and prints its held-out accuracy.
+    With refit=True the model is then fitted again on all of X (the accuracy stays the held-out one).
+    """
+    print(f"⏳ Training {name} Model...")
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    model = model if model is not None else LogisticRegression(max_iter=1000)
+    model.fit(X_train, y_train)
+
+    accuracy = accuracy_score(y_test, model.predict(X_test))
+    print(f"✅ {name} Model Accuracy: {accuracy:.2f}")
+    if refit:
+        print(f"⏳ Refitting {name} Model on all {X.shape[0]} tickets...")
+        model.fit(X, y)
+    return model, accuracy
+
+
+def iter_training_chunks(path, chunk_size):
+    """
+    Yields (chunk, is_holdout) with rows missing text or labels dropped. The
+    holdout flag depends only on the row's position in the file, so every pass
+    over the data sees the same split.
+    """
+    offset = 0
+    for chunk in iter_tickets(path, columns=['ticket_text', *LABELS], chunk_size=chunk_size):
+        is_holdout = (np.arange(offset, offset + len(chunk)) % HOLDOUT_EVERY) == 0
+        offset += len(chunk)
+        keep = chunk[['ticket_text', *LABELS]].notna().all(axis=1).to_numpy()
+        yield chunk[keep], is_holdout[keep]
+
+
+def train_out_of_core(path, featurizer, chunk_size=50_000, epochs=1, random_state=42):
+    """
+    Trains both heads without ever loading the whole file: peak memory is bounded
+    by `chunk_size`. Needs a stateless featurizer (hashing); its IDF weights are
+    accumulated in a first pass, then SGD logistic-regression models are updated
+    chunk by chunk with partial_fit and evaluated on the streamed holdout rows.
+    """
+    if not hasattr(featurizer, 'partial_fit'):
+        print("❌ Error: out-of-core training needs a streaming featurizer (use --featurizer hashing).")
+        exit()
+    rng = np.random.default_rng(random_state)
+
+    # Pass 1: document frequencies + the set of labels
+    print("⏳ Pass 1: collecting IDF statistics and labels...")
+    classes = {label: set() for label in LABELS}
+    n_rows = 0
+    for chunk, is_holdout in iter_training_chunks(path, chunk_size):
+        featurizer.partial_fit(chunk['ticket_text'][~is_holdout].astype(str))
+        for label in LABELS:
+            classes[label].update(chunk[label].unique())
+        n_rows += len(chunk)
+    featurizer.finalize()
+    classes = {label: np.array(sorted(values), dtype=object) for label, values in classes.items()}
+    print(f"   Rows: {n_rows}")
+
+    # Pass 2: incremental training
+    models = {
+        label: SGDClassifier(loss='log_loss', alpha=1e-5, random_state=random_state) for label in LABELS
+    }
+    for epoch in range(epochs):
+        print(f"⏳ Pass 2: training epoch {epoch + 1}/{epochs}...")
+        for chunk, is_holdout in iter_training_chunks(path, chunk_size):
+            train = chunk[~is_holdout]
+            if train.empty:
+                continue
+            train = train.iloc[rng.permutation(len(train))]
+            X = featurizer.transform(train['ticket_text'].astype(str))
+            for label, model in models.items():
+                model.partial_fit(X, train[label].to_numpy(), classes=classes[label])
+
+    # Pass 3: streamed held-out evaluation
+    print("⏳ Pass 3: evaluating on held-out rows...")
+    correct = {label: 0 for label in LABELS}
+    n_test = 0
+    for chunk, is_holdout in iter_training_chunks(path, chunk_size):
+        test = chunk[is_holdout]
+        if test.empty:
+            continue
+        X = featurizer.transform(test['ticket_text'].astype(str))
+        for label, model in models.items():
+            correct[label] += int((model.predict(X) == test[label].to_numpy()).sum())
+        n_test += len(test)
+
+    accuracies = {label: correct[label] / max(n_test, 1) for label in LABELS}
+    for label in LABELS:
+        print(f"✅ {label.capitalize()} Model Accuracy: {accuracies[label]:.2f}")
+    return models['department'], models['urgency'], accuracies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the department and urgency classifiers.")
+    parser.add_argument('--data', default=None,
+                        help="Clean tickets file from clean_data.py (default: tickets.parquet, else tickets.csv)")
+    parser.add_argument('--featurizer', choices=FEATURIZERS, default='tfidf',
+                        help="tfidf (vocabulary, default) or hashing (stateless feature hashing + IDF)")
+    parser.add_argument('--out-of-core', action='store_true',
+                        help="Stream the data in chunks and train incrementally (requires --featurizer hashing)")
+    parser.add_argument('--chunk-size', type=int, default=50_000, help="Rows per chunk in --out-of-core mode")
+    parser.add_argument('--epochs', type=int, default=1, help="Passes over the data in --out-of-core mode")
+    parser.add_argument('--search', action='store_true',
+                        help="Grid/random search over featurizer + classifier settings in a process pool")
+    parser.add_argument('--n-iter', type=int, default=None, help="Random search: number of candidates to try")
+    parser.add_argument('--n-jobs', type=int, default=None, help="Worker processes for --search (default: all cores)")
+    parser.add_argument('--latency-budget-ms', type=float, default=None,
+                        help="--search: only pick candidates whose per-ticket latency is within this budget")
+    parser.add_argument('--search-report', default='model_search.json', help="--search: where to write all results")
+    parser.add_argument('--registry', nargs='?', const=DEFAULT_REGISTRY_DIR, default=None,
+                        help="Also publish the models as a new version in the model registry (model_registry.py)")
+    parser.add_argument('--version', default=None, help="--registry: version name (default: a timestamp)")
+    parser.add_argument('--promote', action='store_true',
+                        help="--registry: serve the new version right away (running servers hot-swap to it)")
+    args = parser.parse_args()
+    args.data = args.data or default_tickets_path()
+    if args.search and args.out_of_core:
+        parser.error("--search and --out-of-core can't be combined")
+
+    vectorizer = build_featurizer(args.featurizer)
+    classifiers = {}
+    if args.search:
+        # 0. Pick the featurizer + classifier settings
+        df = load_training_data(args.data)
+        results = run_search(df, n_jobs=args.n_jobs, n_iter=args.n_iter, latency_budget_ms=args.latency_budget_ms)
+        with open(args.search_report, 'w', encoding='utf-8') as fh:
+            json.dump(results, fh, indent=2)
+        best = select_best(results, args.latency_budget_ms)
+        if best is None:
+            print(f"❌ Error: no candidate fits the {args.latency_budget_ms} ms latency budget "
+                  f"(see {args.search_report}).")
+            exit()
+        print(f"🏆 Selected {best['featurizer']} + {best['classifier']}: macro-F1 {best['macro_f1']:.3f}, "
+              f"{best['latency_ms']:.3f} ms/ticket")
+        featurizer_params = {k: v for k, v in best['featurizer'].items() if k != 'mode'}
+        vectorizer = build_featurizer(best['featurizer']['mode'], **featurizer_params)
+        classifiers = {label: build_classifier(best['classifier']) for label in LABELS}
+
+    if args.out_of_core:
+        # 1-4. Stream, vectorize and train chunk by chunk
+        model_dept, model_urgency, accuracies = train_out_of_core(args.data, vectorizer, chunk_size=args.chunk_size,
+                                                                  epochs=args.epochs)
+    else:
+        # 1. Load the clean data
+        if not args.search:
+            df = load_training_data(args.data)
+
+        # 2. Convert Text to Numbers (Vectorization)
+        print(f"⏳ Vectorizing text ({featurizer_mode(vectorizer)})...")
+        X = vectorizer.fit_transform(df['ticket_text'])
+
+        # 3. Train Model 1: Department Classifier
+        # (the --search winner was chosen on the held-out split, so it's refitted on all the data)
+        model_dept, dept_accuracy = train_classifier(X, df['department'], "Department", classifiers.get('department'),
+                                                     refit=args.search)
+
+        # 4. Train Model 2: Urgency Classifier
+        model_urgency, urgency_accuracy = train_classifier(X, df['urgency'], "Urgency", classifiers.get('urgency'),
+                                                           refit=args.search)
+        accuracies = {'department': dept_accuracy, 'urgency': urgency_accuracy}
+
+    # 5. Save the Models (the vectorizer file keeps its name whichever featurizer is used)
+    print("⏳ Saving models...")
+    joblib.dump(vectorizer, 'tfidf_vectorizer.pkl')
+    joblib.dump(model_dept, 'model_department.pkl')
+    joblib.dump(model_urgency, 'model_urgency.pkl')
+
+    # 6. Export the memory-mappable artifacts (loaded by app.py / the service, see model_artifacts.py)
+    print("⏳ Exporting model artifacts...")
+    manifest = export_artifacts(vectorizer, model_dept, model_urgency, out_dir=DEFAULT_ARTIFACTS_DIR)
+    print(f"   Model version {manifest['model_version']} ({manifest['featurizer']}) written to '{DEFAULT_ARTIFACTS_DIR}/'")
+
+    # 7. Publish to the registry (servers watching it load the version when it's promoted)
+    if args.registry:
+        version = ModelRegistry(args.registry).publish(
+            vectorizer, model_dept, model_urgency, version=args.version or manifest['model_version'],
+            metrics={f"{label}_accuracy": float(accuracy) for label, accuracy in accuracies.items()},
+            promote=args.promote,
+        )
+        print(f"   Published as version {version} in '{args.registry}/'" + (" (now serving)" if args.promote else ""))
+
+    print("\n🎉 Success! Models saved successfully.")
+
+
+if __name__ == "__main__":
+    main()